@@ -0,0 +1,26 @@
+"""
+Shared parameter file cache
+Every controller loads the same JSON config; it is parsed once per
+(path, modification time) for all modules and handed out read-only
+"""
+
+import functools
+import json
+import os
+import types
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_params(config_path, mtime):
+    """Parse a config file once per (path, modification time)"""
+    with open(config_path, 'r') as f:
+        return types.MappingProxyType(json.load(f))
+
+
+def load_params(config_path):
+    """
+    Return the read-only parameter mapping for a config file
+    The file is only re-read when its modification time changes
+    """
+    config_path = os.path.abspath(config_path)
+    return _parse_params(config_path, os.path.getmtime(config_path))
@@ -0,0 +1,19 @@
+"""
+Plot decimation shared by the visualization views
+Long sample histories are reduced to a few points per pixel column
+before they are handed to matplotlib
+"""
+
+import numpy as np
+
+
+def minmax_decimate(columns, n_buckets):
+    """
+    Reduce (k, n) sample columns to n_buckets buckets of two points each, the
+    bucket minimum and maximum, so short transients stay visible when plotted
+    """
+    starts = np.arange(n_buckets) * columns.shape[1] // n_buckets
+    out = np.empty((columns.shape[0], 2 * n_buckets), dtype=columns.dtype)
+    out[:, 0::2] = np.minimum.reduceat(columns, starts, axis=1)
+    out[:, 1::2] = np.maximum.reduceat(columns, starts, axis=1)
+    return out
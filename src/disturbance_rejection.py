@@ -1,23 +1,74 @@
 import numpy as np
-import json
 import os
+import math
 from collections import deque
 
+from numba_compat import njit
+from config_cache import load_params
+
+
+def _push_sliding_max(queue, n, value, window):
+    """
+    Push sample n into a monotonic (sample number, value) queue
+    The front of the queue is the maximum over the last `window` samples
+    """
+    while queue and queue[-1][1] <= value:
+        queue.pop()
+    queue.append((n, value))
+    if queue[0][0] <= n - window:
+        queue.popleft()
+
+
+@njit(cache=True, fastmath=True)
+def _dob_step(speed_estimate, disturbance_estimate, Te, wr, B, J, K, Ts):
+    """One disturbance observer step, returns (speed_estimate, disturbance_estimate)"""
+    speed_error = speed_estimate - wr
+    disturbance_estimate += K * speed_error * Ts
+    speed_estimate += ((Te - B * wr - disturbance_estimate) / J) * Ts
+    return speed_estimate, disturbance_estimate
+
+
+@njit(cache=True, fastmath=True)
+def _dob_batch(speed_estimate, disturbance_estimate, Te, wr, B, J, K, Ts, out):
+    """Run the observer over whole trajectories, writing estimates into out"""
+    for k in range(Te.shape[0]):
+        speed_estimate, disturbance_estimate = _dob_step(
+            speed_estimate, disturbance_estimate, Te[k], wr[k], B, J, K, Ts)
+        out[k] = disturbance_estimate
+    return speed_estimate, disturbance_estimate
+
+
+@njit(cache=True, fastmath=True)
+def _smc_step(error, error_dot, disturbance_estimate, lambda_smc, gain, boundary_layer):
+    """One sliding mode control step, returns (sliding_surface, control_output)"""
+    s = error_dot + lambda_smc * error
+    # Saturation function: linear inside the boundary layer, sign(s) outside
+    sat = s / boundary_layer
+    if sat > 1.0:
+        sat = 1.0
+    elif sat < -1.0:
+        sat = -1.0
+    return s, -error_dot - lambda_smc * error - gain * sat - disturbance_estimate
+
+
 class DisturbanceObserver:
     """
     Disturbance Observer for estimating and compensating external disturbances
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    __slots__ = ('J', 'B', 'poles', 'sample_time', 'observer_bandwidth', 'observer_gain',
+                 'disturbance_estimate', 'speed_estimate', 'observed_torque')
+    
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize disturbance observer"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.initialize_observer()
         self.reset()
         
-    def load_parameters(self, config_file):
-        """Load motor parameters from config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load motor parameters from config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.J = params['J']
         self.B = params['B']
@@ -48,19 +99,41 @@ class DisturbanceObserver:
         wr_actual: Actual mechanical speed
         load_torque_estimate: Initial estimate of load torque
         """
-        # Calculate speed error
-        speed_error = self.speed_estimate - wr_actual
-        
-        # Update disturbance estimate
-        self.disturbance_estimate += self.observer_gain * speed_error * self.sample_time
-        
-        # Update speed estimate
-        self.speed_estimate += ((Te - self.B * wr_actual - self.disturbance_estimate) / self.J) * self.sample_time
+        # Update speed and disturbance estimates
+        self.speed_estimate, self.disturbance_estimate = _dob_step(
+            self.speed_estimate, self.disturbance_estimate, Te, wr_actual,
+            self.B, self.J, self.observer_gain, self.sample_time)
         
         # Calculate observed total disturbance torque
         self.observed_torque = self.disturbance_estimate + load_torque_estimate
         
         return self.observed_torque
+    
+    def update_batch(self, Te, wr_actual, load_torque_estimate=0.0):
+        """
+        Run the observer over a whole recorded trajectory (offline analysis)
+        Te, wr_actual: Arrays of electromagnetic torque and mechanical speed
+        Same coefficients as update(), the observer state continues from and
+        is left at the last sample. Returns the observed disturbance array
+        """
+        Te = np.ascontiguousarray(Te, dtype=np.float64)
+        wr_actual = np.ascontiguousarray(wr_actual, dtype=np.float64)
+        if Te.shape != wr_actual.shape or Te.ndim != 1:
+            raise ValueError("Te and wr_actual must be 1-D arrays of equal length")
+        
+        observed = np.empty_like(Te)
+        self.speed_estimate, self.disturbance_estimate = _dob_batch(
+            self.speed_estimate, self.disturbance_estimate, Te, wr_actual,
+            self.B, self.J, self.observer_gain, self.sample_time, observed)
+        
+        observed += load_torque_estimate
+        if observed.size:
+            self.observed_torque = observed[-1]
+        return observed
+
+
+# Indices into AdaptiveController._gains
+ID_KP, ID_KI, IQ_KP, IQ_KI, SPEED_KP, SPEED_KI = range(6)
 
 
 class AdaptiveController:
@@ -68,16 +141,20 @@ class AdaptiveController:
     Adaptive Controller for adjusting control parameters based on operating conditions
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    __slots__ = ('Rs', 'Ld', 'Lq', 'flux_linkage', 'J', 'B', 'sample_time', 'adaptation_rate',
+                 'min_gain', 'max_gain', '_gains', '_gain_pairs', '_gains_dict',
+                 '_gains_dirty', '_err_integrals', '_err_thresholds', '_decay_step')
+    
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize adaptive controller"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.initialize_controller()
         self.reset()
         
-    def load_parameters(self, config_file):
-        """Load motor parameters from config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load motor parameters from config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.Rs = params['Rs']
         self.Ld = params['Ld']
@@ -94,81 +171,69 @@ class AdaptiveController:
         
     def initialize_controller(self):
         """Initialize adaptive controller parameters"""
-        # Adaptive gains
-        self.id_kp_adaptive = 2.0 * self.Ld
-        self.id_ki_adaptive = self.Rs
-        self.iq_kp_adaptive = 2.0 * self.Lq
-        self.iq_ki_adaptive = self.Rs
-        self.speed_kp_adaptive = 0.5
-        self.speed_ki_adaptive = 5.0
-        
-        # Performance metrics
-        self.id_error_integral = 0.0
-        self.iq_error_integral = 0.0
-        self.speed_error_integral = 0.0
+        # Adaptive gains, indexed by ID_KP ... SPEED_KI
+        self._gains = np.array([2.0 * self.Ld, self.Rs,   # d-axis current kp, ki
+                                2.0 * self.Lq, self.Rs,   # q-axis current kp, ki
+                                0.5, 5.0])                # speed kp, ki
+        # (kp, ki) pairs per loop, a view sharing memory with _gains
+        self._gain_pairs = self._gains.reshape(3, 2)
+        # Dict view of the gains, refreshed in place when the gains change
+        self._gains_dict = {}
+        self._gains_dirty = True
+        
+        # Performance metrics: squared error integrals of the id, iq and speed loops
+        self._err_integrals = np.zeros(3)
+        self._err_thresholds = np.array([0.1, 0.1, 1.0])
+        self._decay_step = 0  # Steps since the last integral decay
         
     def reset(self):
         """Reset adaptive controller"""
-        self.id_error_integral = 0.0
-        self.iq_error_integral = 0.0
-        self.speed_error_integral = 0.0
+        self._err_integrals[:] = 0.0
+        self._decay_step = 0
         
     def update_gains(self, id_error, iq_error, speed_error, wr):
         """
         Update controller gains based on performance metrics
         """
         # Update error integrals
-        self.id_error_integral += id_error**2 * self.sample_time
-        self.iq_error_integral += iq_error**2 * self.sample_time
-        self.speed_error_integral += speed_error**2 * self.sample_time
+        err = self._err_integrals
+        Ts = self.sample_time
+        err[0] += id_error * id_error * Ts
+        err[1] += iq_error * iq_error * Ts
+        err[2] += speed_error * speed_error * Ts
         
         # Adapt gains based on performance
         # Increase gains if performance is poor, decrease if good
-        if self.id_error_integral > 0.1:
-            self.id_kp_adaptive *= (1 + self.adaptation_rate)
-            self.id_ki_adaptive *= (1 + self.adaptation_rate)
-        else:
-            self.id_kp_adaptive *= (1 - self.adaptation_rate * 0.5)
-            self.id_ki_adaptive *= (1 - self.adaptation_rate * 0.5)
-        
-        if self.iq_error_integral > 0.1:
-            self.iq_kp_adaptive *= (1 + self.adaptation_rate)
-            self.iq_ki_adaptive *= (1 + self.adaptation_rate)
-        else:
-            self.iq_kp_adaptive *= (1 - self.adaptation_rate * 0.5)
-            self.iq_ki_adaptive *= (1 - self.adaptation_rate * 0.5)
-        
-        if self.speed_error_integral > 1.0:
-            self.speed_kp_adaptive *= (1 + self.adaptation_rate)
-            self.speed_ki_adaptive *= (1 + self.adaptation_rate)
-        else:
-            self.speed_kp_adaptive *= (1 - self.adaptation_rate * 0.5)
-            self.speed_ki_adaptive *= (1 - self.adaptation_rate * 0.5)
+        scale = np.where(err > self._err_thresholds,
+                         1 + self.adaptation_rate, 1 - self.adaptation_rate * 0.5)
+        self._gain_pairs *= scale[:, np.newaxis]
         
         # Apply gain limits
-        self.id_kp_adaptive = np.clip(self.id_kp_adaptive, self.min_gain, self.max_gain)
-        self.id_ki_adaptive = np.clip(self.id_ki_adaptive, self.min_gain, self.max_gain)
-        self.iq_kp_adaptive = np.clip(self.iq_kp_adaptive, self.min_gain, self.max_gain)
-        self.iq_ki_adaptive = np.clip(self.iq_ki_adaptive, self.min_gain, self.max_gain)
-        self.speed_kp_adaptive = np.clip(self.speed_kp_adaptive, self.min_gain, self.max_gain)
-        self.speed_ki_adaptive = np.clip(self.speed_ki_adaptive, self.min_gain, self.max_gain)
-        
-        # Reset integrals periodically
-        if int(wr) % 100 == 0:
-            self.id_error_integral *= 0.9
-            self.iq_error_integral *= 0.9
-            self.speed_error_integral *= 0.9
+        np.clip(self._gains, self.min_gain, self.max_gain, out=self._gains)
+        self._gains_dirty = True
+        
+        # Decay integrals every 100 steps
+        self._decay_step += 1
+        if self._decay_step >= 100:
+            self._decay_step = 0
+            err *= 0.9
     
     def get_adaptive_gains(self):
-        """Return current adaptive gains"""
-        return {
-            'id_kp': self.id_kp_adaptive,
-            'id_ki': self.id_ki_adaptive,
-            'iq_kp': self.iq_kp_adaptive,
-            'iq_ki': self.iq_ki_adaptive,
-            'speed_kp': self.speed_kp_adaptive,
-            'speed_ki': self.speed_ki_adaptive
-        }
+        """
+        Return current adaptive gains
+        The same dict is returned on every call and updated in place
+        """
+        d = self._gains_dict
+        if self._gains_dirty:
+            g = self._gains
+            d['id_kp'] = float(g[ID_KP])
+            d['id_ki'] = float(g[ID_KI])
+            d['iq_kp'] = float(g[IQ_KP])
+            d['iq_ki'] = float(g[IQ_KI])
+            d['speed_kp'] = float(g[SPEED_KP])
+            d['speed_ki'] = float(g[SPEED_KI])
+            self._gains_dirty = False
+        return d
 
 
 class RobustController:
@@ -176,16 +241,20 @@ class RobustController:
     Robust Controller with H-infinity and sliding mode control techniques
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    __slots__ = ('Rs', 'Ld', 'Lq', 'flux_linkage', 'J', 'B', 'sample_time', 'sliding_gain',
+                 'boundary_layer', 'h_infinity_gamma', 'sliding_surface',
+                 'sliding_surface_prev', 'control_output_prev', 'hinf_state0', 'hinf_state1', '_K0', '_K1')
+    
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize robust controller"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.initialize_controller()
         self.reset()
         
-    def load_parameters(self, config_file):
-        """Load motor parameters from config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load motor parameters from config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.Rs = params['Rs']
         self.Ld = params['Ld']
@@ -208,14 +277,18 @@ class RobustController:
         self.control_output_prev = 0.0
         
         # H-infinity controller state
-        self.hinf_state = np.zeros((2, 1))  # State vector for H-infinity controller
+        self.hinf_state0 = 0.0  # H-infinity controller state [position, velocity]
+        self.hinf_state1 = 0.0
+        # State feedback gains (would be calculated using H-infinity synthesis)
+        self._K0, self._K1 = 5.0, 2.0
         
     def reset(self):
         """Reset robust controller"""
         self.sliding_surface = 0.0
         self.sliding_surface_prev = 0.0
         self.control_output_prev = 0.0
-        self.hinf_state = np.zeros((2, 1))
+        self.hinf_state0 = 0.0
+        self.hinf_state1 = 0.0
         
     def sliding_mode_control(self, error, error_dot, disturbance_estimate=0.0):
         """
@@ -226,18 +299,11 @@ class RobustController:
         """
         # Define sliding surface: s = error_dot + lambda * error
         lambda_smc = 10.0  # Sliding surface parameter
-        self.sliding_surface = error_dot + lambda_smc * error
         
-        # Calculate control law with disturbance compensation
-        equivalent_control = -error_dot - lambda_smc * error
-        switching_control = -self.sliding_gain * np.sign(self.sliding_surface)
-        
-        # Add boundary layer to reduce chattering
-        if abs(self.sliding_surface) < self.boundary_layer:
-            switching_control = -self.sliding_gain * self.sliding_surface / self.boundary_layer
-        
-        # Total control with disturbance compensation
-        control_output = equivalent_control + switching_control - disturbance_estimate
+        # Equivalent + switching control with disturbance compensation
+        self.sliding_surface, control_output = _smc_step(
+            error, error_dot, disturbance_estimate, lambda_smc,
+            self.sliding_gain, self.boundary_layer)
         
         return control_output
     
@@ -251,14 +317,14 @@ class RobustController:
         # Simplified H-infinity state feedback controller
         # In practice, this would be designed using proper H-infinity synthesis methods
         
-        # State feedback gains (would be calculated using H-infinity synthesis)
-        K = np.array([[5.0, 2.0]])  # State feedback gain matrix
-        
-        # Calculate control input
-        error = reference - state[1]  # Speed error
-        control_output = K @ state + 10.0 * error
+        # Accept a (position, velocity) tuple of floats, or any 2-element array
+        if isinstance(state, tuple):
+            position, velocity = state
+        else:
+            position, velocity = np.ravel(state)
         
-        return float(control_output)
+        # Calculate control input: K @ state + 10 * speed error
+        return float(self._K0 * position + self._K1 * velocity + 10.0 * (reference - velocity))
 
 
 class DisturbanceRejectionController:
@@ -267,26 +333,75 @@ class DisturbanceRejectionController:
     Integrates disturbance observer, adaptive control, and robust control techniques
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    __slots__ = ('disturbance_observer', 'adaptive_controller', 'robust_controller', 'poles',
+                 'flux_linkage', '_torque_to_iq', 'control_mode', '_mode_updates',
+                 '_update_mode', 'metrics_enabled', 'metrics_period', 'performance_metrics',
+                 'buffer_size', 'speed_error_buffer', 'torque_buffer', 'disturbance_buffer', 'buffer_index',
+                 'buffer_fill', '_sample_count', '_sumsq_speed', '_sum_abs_torque',
+                 '_torque_max_q', '_torque_min_q', '_disturbance_max_q')
+    
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize disturbance rejection controller"""
-        self.disturbance_observer = DisturbanceObserver(config_file)
-        self.adaptive_controller = AdaptiveController(config_file)
-        self.robust_controller = RobustController(config_file)
-        
-        # Control mode selection
-        self.control_mode = 'observer'  # 'observer', 'adaptive', 'robust', 'combined'
+        # Parse the config once and share it with all sub-controllers
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
+        self.disturbance_observer = DisturbanceObserver(config_file, params)
+        self.adaptive_controller = AdaptiveController(config_file, params)
+        self.robust_controller = RobustController(config_file, params)
+        self._update_torque_to_iq()
+        
+        # Control mode selection (change it with set_control_mode)
+        # Each mode has its own specialized update, bound once when the mode is set
+        self._mode_updates = {
+            'observer': self._update_observer,
+            'adaptive': self._update_adaptive,
+            'robust': self._update_robust,
+            'combined': self._update_combined
+        }
+        self.set_control_mode('observer')  # 'observer', 'adaptive', 'robust', 'combined'
         
-        # Performance monitoring
+        # Performance monitoring (off by default, see set_metrics)
+        self.metrics_enabled = False
+        self.metrics_period = 100  # Control steps between metric updates
         self.performance_metrics = {
             'speed_error_rms': 0.0,
             'torque_ripple': 0.0,
             'disturbance_rejection_ratio': 0.0
         }
         
-        # Data buffers for performance analysis
-        self.speed_error_buffer = deque(maxlen=1000)
-        self.torque_buffer = deque(maxlen=1000)
-        self.disturbance_buffer = deque(maxlen=1000)
+        # Preallocated ring buffers for performance analysis
+        self.buffer_size = 1000
+        self.speed_error_buffer = np.zeros(self.buffer_size)
+        self.torque_buffer = np.zeros(self.buffer_size)
+        self.disturbance_buffer = np.zeros(self.buffer_size)
+        self.buffer_index = 0  # Next write position
+        self.buffer_fill = 0  # Number of valid samples
+        self._reset_window_stats()
+        
+    def load_parameters(self, config_file, params=None):
+        """Reload all sub-controllers from a config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
+        self.disturbance_observer.load_parameters(config_file, params)
+        self.adaptive_controller.load_parameters(config_file, params)
+        self.robust_controller.load_parameters(config_file, params)
+        self._update_torque_to_iq()
+        
+    def _update_torque_to_iq(self):
+        """Disturbance torque -> q-axis current feedforward factor, from the sub-controllers' parameters"""
+        self.poles = self.disturbance_observer.poles
+        self.flux_linkage = self.adaptive_controller.flux_linkage
+        self._torque_to_iq = 1.0 / (1.5 * self.poles * self.flux_linkage)
+        
+    def _reset_window_stats(self):
+        """Clear the incremental statistics over the ring buffers"""
+        self._sample_count = 0
+        self._sumsq_speed = 0.0
+        self._sum_abs_torque = 0.0
+        # Monotonic queues for sliding max(Te), max(-Te) and max|d|
+        self._torque_max_q = deque()
+        self._torque_min_q = deque()
+        self._disturbance_max_q = deque()
         
     def reset(self):
         """Reset all controllers"""
@@ -294,66 +409,83 @@ class DisturbanceRejectionController:
         self.adaptive_controller.reset()
         self.robust_controller.reset()
         
-        # Clear data buffers
-        self.speed_error_buffer.clear()
-        self.torque_buffer.clear()
-        self.disturbance_buffer.clear()
+        # Clear data buffers (no reallocation, just forget the samples)
+        self.buffer_index = 0
+        self.buffer_fill = 0
+        self._reset_window_stats()
         
     def set_control_mode(self, mode):
         """Set control mode"""
-        if mode in ['observer', 'adaptive', 'robust', 'combined']:
+        if mode in self._mode_updates:
             self.control_mode = mode
+            self._update_mode = self._mode_updates[mode]
         else:
             raise ValueError("Invalid control mode. Use 'observer', 'adaptive', 'robust', or 'combined'")
     
+    def set_metrics(self, enabled, period=None):
+        """
+        Enable or disable performance metric computation
+        When enabled, performance_metrics is refreshed every `period` control steps
+        """
+        self.metrics_enabled = bool(enabled)
+        if period is not None:
+            if period < 1:
+                raise ValueError("Metrics period must be at least 1 step")
+            self.metrics_period = int(period)
+    
     def update(self, Te, wr_actual, wr_ref, id_actual, iq_actual, id_ref, iq_ref):
         """
         Update disturbance rejection controller
         Returns modified current references or voltage references
         """
-        # Calculate errors
-        speed_error = wr_ref - wr_actual
-        id_error = id_ref - id_actual
-        iq_error = iq_ref - iq_actual
-        
-        # Update disturbance observer
+        return self._update_mode(Te, wr_actual, wr_ref, id_actual, iq_actual, id_ref, iq_ref)
+    
+    def _update_observer(self, Te, wr_actual, wr_ref, id_actual, iq_actual, id_ref, iq_ref):
+        """Use disturbance observer for feedforward compensation"""
         disturbance_torque = self.disturbance_observer.update(Te, wr_actual)
+        self._record_sample(wr_ref - wr_actual, Te, disturbance_torque)
         
-        # Store data for performance analysis
-        self.speed_error_buffer.append(speed_error)
-        self.torque_buffer.append(Te)
-        self.disturbance_buffer.append(disturbance_torque)
+        iq_ref_modified = iq_ref + disturbance_torque * self._torque_to_iq
+        return self._result(id_ref, iq_ref_modified, disturbance_torque)
+    
+    def _update_adaptive(self, Te, wr_actual, wr_ref, id_actual, iq_actual, id_ref, iq_ref):
+        """Use adaptive controller to adjust gains"""
+        speed_error = wr_ref - wr_actual
+        disturbance_torque = self.disturbance_observer.update(Te, wr_actual)
+        self._record_sample(speed_error, Te, disturbance_torque)
         
-        # Calculate control action based on selected mode
-        if self.control_mode == 'observer':
-            # Use disturbance observer for feedforward compensation
-            compensation = disturbance_torque / (1.5 * self.poles * self.flux_linkage)
-            iq_ref_modified = iq_ref + compensation
-            
-        elif self.control_mode == 'adaptive':
-            # Use adaptive controller to adjust gains
-            self.adaptive_controller.update_gains(id_error, iq_error, speed_error, wr_actual)
-            iq_ref_modified = iq_ref  # Gains are modified, not references
-            
-        elif self.control_mode == 'robust':
-            # Use sliding mode control for robust disturbance rejection
-            speed_error_dot = 0.0  # Would need proper calculation
-            compensation = self.robust_controller.sliding_mode_control(speed_error, speed_error_dot, disturbance_torque)
-            iq_ref_modified = iq_ref + compensation / 10.0  # Scale factor
-            
-        elif self.control_mode == 'combined':
-            # Combine all techniques
-            compensation = disturbance_torque / (1.5 * self.poles * self.flux_linkage)
-            self.adaptive_controller.update_gains(id_error, iq_error, speed_error, wr_actual)
-            speed_error_dot = 0.0  # Would need proper calculation
-            robust_compensation = self.robust_controller.sliding_mode_control(speed_error, speed_error_dot, disturbance_torque)
-            iq_ref_modified = iq_ref + compensation + robust_compensation / 20.0
-            
-        else:
-            iq_ref_modified = iq_ref
+        self.adaptive_controller.update_gains(id_ref - id_actual, iq_ref - iq_actual, speed_error, wr_actual)
+        return self._result(id_ref, iq_ref, disturbance_torque)  # Gains are modified, not references
+    
+    def _update_robust(self, Te, wr_actual, wr_ref, id_actual, iq_actual, id_ref, iq_ref):
+        """Use sliding mode control for robust disturbance rejection"""
+        speed_error = wr_ref - wr_actual
+        disturbance_torque = self.disturbance_observer.update(Te, wr_actual)
+        self._record_sample(speed_error, Te, disturbance_torque)
         
-        # Update performance metrics
-        self.update_performance_metrics()
+        speed_error_dot = 0.0  # Would need proper calculation
+        compensation = self.robust_controller.sliding_mode_control(speed_error, speed_error_dot, disturbance_torque)
+        iq_ref_modified = iq_ref + compensation / 10.0  # Scale factor
+        return self._result(id_ref, iq_ref_modified, disturbance_torque)
+    
+    def _update_combined(self, Te, wr_actual, wr_ref, id_actual, iq_actual, id_ref, iq_ref):
+        """Combine all techniques"""
+        speed_error = wr_ref - wr_actual
+        disturbance_torque = self.disturbance_observer.update(Te, wr_actual)
+        self._record_sample(speed_error, Te, disturbance_torque)
+        
+        compensation = disturbance_torque * self._torque_to_iq
+        self.adaptive_controller.update_gains(id_ref - id_actual, iq_ref - iq_actual, speed_error, wr_actual)
+        speed_error_dot = 0.0  # Would need proper calculation
+        robust_compensation = self.robust_controller.sliding_mode_control(speed_error, speed_error_dot, disturbance_torque)
+        iq_ref_modified = iq_ref + compensation + robust_compensation / 20.0
+        return self._result(id_ref, iq_ref_modified, disturbance_torque)
+    
+    def _result(self, id_ref, iq_ref_modified, disturbance_torque):
+        """Refresh the (optional) metrics and build the update result"""
+        # Update performance metrics only when monitoring is enabled
+        if self.metrics_enabled and self._sample_count % self.metrics_period == 0:
+            self.update_performance_metrics()
         
         return {
             'id_ref_modified': id_ref,
@@ -363,21 +495,53 @@ class DisturbanceRejectionController:
             'performance_metrics': self.performance_metrics
         }
     
+    def _record_sample(self, speed_error, Te, disturbance):
+        """Store one sample in the ring buffers and update the running statistics"""
+        i = self.buffer_index
+        size = self.buffer_size
+        
+        # Running sums: add the new sample, subtract the one being evicted
+        if self.buffer_fill == size:
+            old_error = self.speed_error_buffer[i]
+            self._sumsq_speed -= old_error * old_error
+            self._sum_abs_torque -= abs(self.torque_buffer[i])
+        else:
+            self.buffer_fill += 1
+        self._sumsq_speed += speed_error * speed_error
+        self._sum_abs_torque += abs(Te)
+        
+        self.speed_error_buffer[i] = speed_error
+        self.torque_buffer[i] = Te
+        self.disturbance_buffer[i] = disturbance
+        self.buffer_index = (i + 1) % size
+        
+        # Sliding-window extrema
+        n = self._sample_count
+        _push_sliding_max(self._torque_max_q, n, Te, size)
+        _push_sliding_max(self._torque_min_q, n, -Te, size)
+        _push_sliding_max(self._disturbance_max_q, n, abs(disturbance), size)
+        self._sample_count = n + 1
+        
+        # Resynchronise the running sums once per wrap to stop float drift
+        if self.buffer_index == 0:
+            self._sumsq_speed = float(np.dot(self.speed_error_buffer, self.speed_error_buffer))
+            self._sum_abs_torque = float(np.sum(np.abs(self.torque_buffer)))
+    
     def update_performance_metrics(self):
-        """Update performance metrics"""
-        if len(self.speed_error_buffer) > 10:
+        """Update performance metrics (O(1) from the running window statistics)"""
+        n = self.buffer_fill
+        if n > 10:
             # RMS speed error
-            speed_errors = np.array(list(self.speed_error_buffer))
-            self.performance_metrics['speed_error_rms'] = np.sqrt(np.mean(speed_errors**2))
+            self.performance_metrics['speed_error_rms'] = math.sqrt(max(self._sumsq_speed, 0.0) / n)
             
             # Torque ripple (peak-to-peak / average)
-            torques = np.array(list(self.torque_buffer))
-            if len(torques) > 0 and np.mean(np.abs(torques)) > 0:
-                torque_ripple = (np.max(torques) - np.min(torques)) / (2 * np.mean(np.abs(torques)))
-                self.performance_metrics['torque_ripple'] = torque_ripple
+            mean_abs_torque = self._sum_abs_torque / n
+            if mean_abs_torque > 0:
+                torque_ptp = self._torque_max_q[0][1] + self._torque_min_q[0][1]
+                self.performance_metrics['torque_ripple'] = torque_ptp / (2 * mean_abs_torque)
             
             # Disturbance rejection ratio
-            disturbances = np.array(list(self.disturbance_buffer))
-            if len(disturbances) > 0 and np.max(np.abs(disturbances)) > 0:
-                rejection_ratio = self.performance_metrics['speed_error_rms'] / np.max(np.abs(disturbances))
-                self.performance_metrics['disturbance_rejection_ratio'] = rejection_ratio
\ No newline at end of file
+            max_disturbance = self._disturbance_max_q[0][1]
+            if max_disturbance > 0:
+                rejection_ratio = self.performance_metrics['speed_error_rms'] / max_disturbance
+                self.performance_metrics['disturbance_rejection_ratio'] = rejection_ratio
@@ -1,6 +1,11 @@
 import numpy as np
-import json
 import os
+import math
+
+from numba_compat import njit
+from config_cache import load_params
+from foc_control import PIController
+
 
 class FluxWeakeningController:
     """
@@ -8,16 +13,23 @@ class FluxWeakeningController:
     Implements flux weakening control to extend the speed range beyond base speed
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    __slots__ = ('poles', 'Rs', 'Ld', 'Lq', 'flux_linkage', 'max_current', 'max_voltage',
+                 'dc_bus_voltage', 'sample_time', '_v_max', '_neg_flux_over_Ld',
+                 '_vmax_over_Ld', '_vmax_over_Lq', '_Lq_over_Ld', '_pole_pairs', 'base_speed',
+                 'fw_kp', 'fw_ki', 'voltage_margin', '_v_limit', 'fw_controller',
+                 '_id_fw_table', '_lut_wr0', '_lut_inv_dwr', '_lut_iq0', '_lut_inv_diq',
+                 'id_fw', 'in_flux_weakening')
+    
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize flux weakening controller with parameters"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.initialize_controller()
         self.reset()
         
-    def load_parameters(self, config_file):
-        """Load controller parameters from config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load controller parameters from config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.poles = params['poles']
         self.Rs = params['Rs']
@@ -29,18 +41,30 @@ class FluxWeakeningController:
         self.dc_bus_voltage = params['dc_bus_voltage']
         self.sample_time = params['sample_time']
         
+        # Constants derived from the parameters (cached for the control loop)
+        self._v_max = self.dc_bus_voltage / math.sqrt(3)  # Max phase voltage with SVM
+        self._neg_flux_over_Ld = -self.flux_linkage / self.Ld  # Voltage ellipse d-axis center
+        self._vmax_over_Ld = self._v_max / self.Ld  # Voltage ellipse radii times wr
+        self._vmax_over_Lq = self._v_max / self.Lq
+        self._Lq_over_Ld = self.Lq / self.Ld
+        self._pole_pairs = self.poles / 2
+        
         # Flux weakening parameters
         self.base_speed = self.calculate_base_speed()
         self.fw_kp = 0.5  # Flux weakening proportional gain
         self.fw_ki = 10.0  # Flux weakening integral gain
         self.voltage_margin = 0.95  # Voltage margin for flux weakening (0-1)
+        self._v_limit = self._v_max * self.voltage_margin
+        
+        # 2-D (wr, iq_ref) -> id_ref table for lookup-table flux weakening,
+        # built on the first lookup so it always matches the current parameters
+        self._id_fw_table = None
         
     def calculate_base_speed(self):
         """Calculate the base speed (no-load speed at rated voltage)"""
         # Base speed occurs when back-EMF equals maximum available voltage
-        v_max = self.dc_bus_voltage / np.sqrt(3)
-        base_speed_e = v_max / self.flux_linkage  # Electrical angular velocity
-        base_speed_m = base_speed_e / (self.poles / 2)  # Mechanical angular velocity
+        base_speed_e = self._v_max / self.flux_linkage  # Electrical angular velocity
+        base_speed_m = base_speed_e / self._pole_pairs  # Mechanical angular velocity
         return base_speed_m
     
     def initialize_controller(self):
@@ -49,6 +73,25 @@ class FluxWeakeningController:
         current_limit = [-self.max_current, 0]  # Only negative d-axis current for flux weakening
         self.fw_controller = PIController(self.fw_kp, self.fw_ki, current_limit)
         
+    def build_lookup_table(self, wr_max=None, n_wr=81, n_iq=41):
+        """
+        Precompute the d-axis current table used by lookup_table_flux_weakening
+        Grid: wr in [0, wr_max] (default 4x base speed), iq_ref in [-Imax, Imax]
+        """
+        if wr_max is None:
+            wr_max = 4.0 * self.base_speed
+        wr_grid = np.linspace(0.0, wr_max, n_wr)
+        iq_grid = np.linspace(-self.max_current, self.max_current, n_iq)
+        torque_grid = 1.5 * self.poles * self.flux_linkage * iq_grid
+        id_table, _ = self.get_optimal_current_references_batch(
+            wr_grid[:, np.newaxis], torque_grid[np.newaxis, :])
+        
+        self._id_fw_table = np.ascontiguousarray(id_table)
+        self._lut_wr0 = wr_grid[0]
+        self._lut_inv_dwr = (n_wr - 1) / (wr_grid[-1] - wr_grid[0])
+        self._lut_iq0 = iq_grid[0]
+        self._lut_inv_diq = (n_iq - 1) / (iq_grid[-1] - iq_grid[0])
+        
     def reset(self):
         """Reset flux weakening controller"""
         self.fw_controller.reset()
@@ -60,21 +103,13 @@ class FluxWeakeningController:
         Calculate voltage limit ellipse parameters
         Returns the maximum d-q currents for a given speed
         """
-        v_max = self.dc_bus_voltage / np.sqrt(3)
-        
         # Voltage limit equation: (Rs*id - wr*Lq*iq)^2 + (Rs*iq + wr*Ld*id + wr*flux)^2 <= v_max^2
         
         # For simplicity, ignore resistance at high speeds
         if wr > 10:  # High speed approximation
-            # Voltage limit ellipse center
-            id_center = -self.flux_linkage / self.Ld
-            iq_center = 0
-            
-            # Voltage limit ellipse radii
-            a = v_max / (wr * self.Ld)  # d-axis radius
-            b = v_max / (wr * self.Lq)  # q-axis radius
-            
-            return id_center, iq_center, a, b
+            # Ellipse center (-flux/Ld, 0), radii v_max/(wr*Ld) and v_max/(wr*Lq)
+            inv_wr = 1.0 / wr
+            return self._neg_flux_over_Ld, 0, self._vmax_over_Ld * inv_wr, self._vmax_over_Lq * inv_wr
         else:
             # Low speed: no flux weakening needed
             return 0, 0, self.max_current, self.max_current
@@ -93,13 +128,10 @@ class FluxWeakeningController:
         Adjusts d-axis current based on voltage error
         """
         # Calculate voltage magnitude
-        v_mag = np.sqrt(vd**2 + vq**2)
+        v_mag = math.hypot(vd, vq)
         
-        # Voltage limit with margin
-        v_limit = self.dc_bus_voltage / np.sqrt(3) * self.voltage_margin
-        
-        # Voltage error
-        v_error = v_mag - v_limit
+        # Voltage error against the limit with margin
+        v_error = v_mag - self._v_limit
         
         # Only apply flux weakening if voltage exceeds limit
         if v_error > 0:
@@ -127,10 +159,10 @@ class FluxWeakeningController:
             
             # Calculate required d-axis current for flux weakening
             # Using simplified equation: id = -(flux + Lq*iq) / Ld
-            id_fw = -(self.flux_linkage + self.Lq * iq_ref) / self.Ld
+            id_fw = self._neg_flux_over_Ld - self._Lq_over_Ld * iq_ref
             
             # Apply current limits
-            id_fw = np.clip(id_fw, -self.max_current, 0)
+            id_fw = min(max(id_fw, -self.max_current), 0.0)
             
             self.id_fw = id_fw
         else:
@@ -143,33 +175,25 @@ class FluxWeakeningController:
     def lookup_table_flux_weakening(self, wr, iq_ref):
         """
         Lookup table-based flux weakening control
-        Uses pre-calculated lookup table for optimal d-axis current
+        Bilinear interpolation in the precomputed (wr, iq_ref) -> id_ref table
+        Inputs outside the table are clamped to its edges
         """
-        # This would typically use a 2D lookup table (wr, iq_ref) -> id_ref
-        # For simplicity, we'll use a simplified calculation
-        
-        # Speed ratio (normalized to base speed)
-        speed_ratio = wr / self.base_speed
-        
-        if speed_ratio <= 1.0:
-            # Below base speed: no flux weakening
-            return 0.0
-        else:
-            # Above base speed: apply flux weakening
-            # Simplified calculation
-            over_speed_factor = speed_ratio - 1.0
-            
-            # Calculate required d-axis current
-            id_fw = -over_speed_factor * self.flux_linkage / self.Ld
-            
-            # Consider q-axis current effect
-            id_fw -= self.Lq * iq_ref / self.Ld
-            
-            # Apply current limits
-            id_fw = np.clip(id_fw, -self.max_current, 0)
-            
-            return id_fw
+        if self._id_fw_table is None:
+            self.build_lookup_table()
+        return _bilinear(self._id_fw_table, self._lut_wr0, self._lut_inv_dwr,
+                         self._lut_iq0, self._lut_inv_diq, float(wr), float(iq_ref))
     
+    def _mtpa_saliency(self):
+        """
+        Saliency Lq - Ld used by the interior PMSM MTPA equations
+        Reverse saliency (Ld > Lq) has no real MTPA solution in this form
+        """
+        dL = self.Lq - self.Ld
+        if dL <= 0:
+            raise ValueError(
+                f"MTPA needs an interior PMSM with Ld < Lq, got Ld={self.Ld}, Lq={self.Lq}")
+        return dL
+        
     def get_optimal_current_references(self, wr, torque_ref):
         """
         Calculate optimal d-q current references for maximum torque per ampere (MTPA)
@@ -187,14 +211,15 @@ class FluxWeakeningController:
                 id_ref = self.speed_based_flux_weakening(wr, torque_ref / (1.5 * self.poles * self.flux_linkage))
                 iq_ref = torque_ref / (1.5 * self.poles * (self.flux_linkage + self.Ld * id_ref))
         else:
-            # Interior PMSM with saliency (Ld != Lq)
+            # Interior PMSM with saliency (Ld < Lq)
             # MTPA calculation for interior PMSM
             if wr <= self.base_speed:
                 # MTPA operation
-                # Simplified MTPA calculation
-                iq_ref = np.sqrt(abs(torque_ref) / (1.5 * self.poles * (self.Ld - self.Lq)))
-                id_ref = -self.flux_linkage / (2 * (self.Ld - self.Lq)) - np.sqrt(
-                    (self.flux_linkage / (2 * (self.Ld - self.Lq)))**2 + iq_ref**2
+                # Simplified MTPA calculation, in terms of the saliency Lq - Ld > 0
+                dL = self._mtpa_saliency()
+                iq_ref = math.sqrt(abs(torque_ref) / (1.5 * self.poles * dL))
+                id_ref = self.flux_linkage / (2 * dL) - math.sqrt(
+                    (self.flux_linkage / (2 * dL))**2 + iq_ref**2
                 )
             else:
                 # Flux weakening operation
@@ -204,7 +229,7 @@ class FluxWeakeningController:
                 id_ref = self.speed_based_flux_weakening(wr, iq_ref)
         
         # Apply current limits
-        i_mag = np.sqrt(id_ref**2 + iq_ref**2)
+        i_mag = math.hypot(id_ref, iq_ref)
         if i_mag > self.max_current:
             scale = self.max_current / i_mag
             id_ref *= scale
@@ -212,6 +237,55 @@ class FluxWeakeningController:
         
         return id_ref, iq_ref
     
+    def get_optimal_current_references_batch(self, wr, torque_ref):
+        """
+        Vectorized get_optimal_current_references over broadcast arrays of
+        speed and torque reference (e.g. a (nW, nT) lookup grid)
+        Unlike the scalar method this does not touch the controller state
+        Returns (id_ref, iq_ref) arrays of the broadcast shape
+        """
+        wr, torque_ref = np.broadcast_arrays(np.asarray(wr, dtype=np.float64),
+                                             np.asarray(torque_ref, dtype=np.float64))
+        above_base = wr > self.base_speed
+        iq_pm = torque_ref / (1.5 * self.poles * self.flux_linkage)
+        
+        # Speed-based flux weakening current for the points above base speed
+        id_fw = self._neg_flux_over_Ld - self._Lq_over_Ld * iq_pm
+        np.clip(id_fw, -self.max_current, 0.0, out=id_fw)
+        
+        if abs(self.Ld - self.Lq) < 1e-6:
+            # Surface-mounted PMSM: MTPA is id = 0, flux weakening reduces the PM flux
+            id_ref = np.where(above_base, id_fw, 0.0)
+            iq_ref = torque_ref / (1.5 * self.poles * (self.flux_linkage + self.Ld * id_ref))
+        else:
+            # Interior PMSM: simplified MTPA below base speed
+            dL = self._mtpa_saliency()
+            iq_mtpa = np.sqrt(np.abs(torque_ref) / (1.5 * self.poles * dL))
+            id_mtpa = self.flux_linkage / (2 * dL) - np.sqrt((self.flux_linkage / (2 * dL))**2 + iq_mtpa**2)
+            id_ref = np.where(above_base, id_fw, id_mtpa)
+            iq_ref = np.where(above_base, iq_pm, iq_mtpa)
+        
+        # Apply current limits
+        i_mag = np.hypot(id_ref, iq_ref)
+        with np.errstate(divide='ignore'):
+            scale = np.minimum(1.0, self.max_current / i_mag)
+        id_ref = id_ref * scale
+        iq_ref = iq_ref * scale
+        
+        return id_ref, iq_ref
+    
+    def export_lookup_table(self, filename, wr_grid, torque_grid):
+        """
+        Precompute optimal current references over a (speed, torque) grid
+        and save them as a .npz file (wr, torque_ref, id_ref, iq_ref)
+        """
+        wr_grid = np.asarray(wr_grid, dtype=np.float64)
+        torque_grid = np.asarray(torque_grid, dtype=np.float64)
+        id_ref, iq_ref = self.get_optimal_current_references_batch(
+            wr_grid[:, np.newaxis], torque_grid[np.newaxis, :])
+        np.savez(filename, wr=wr_grid, torque_ref=torque_grid, id_ref=id_ref, iq_ref=iq_ref)
+        return id_ref, iq_ref
+    
     def update(self, wr, vd, vq, iq_ref, method='voltage'):
         """
         Update flux weakening controller
@@ -227,44 +301,16 @@ class FluxWeakeningController:
             return 0.0
 
 
-class PIController:
-    """PI Controller implementation (duplicate from foc_control.py for standalone use)"""
-    
-    def __init__(self, kp, ki, output_limit=None):
-        self.kp = kp  # Proportional gain
-        self.ki = ki  # Integral gain
-        self.output_limit = output_limit  # Output saturation limits
-        self.integral = 0.0
-        self.prev_error = 0.0
-        
-    def reset(self):
-        """Reset controller state"""
-        self.integral = 0.0
-        self.prev_error = 0.0
-        
-    def update(self, error, dt):
-        """Update PI controller"""
-        # Proportional term
-        p_term = self.kp * error
-        
-        # Integral term with anti-windup
-        self.integral += error * dt
-        i_term = self.ki * self.integral
-        
-        # Calculate output
-        output = p_term + i_term
-        
-        # Apply output limits if specified
-        if self.output_limit is not None:
-            if output > self.output_limit[1]:
-                output = self.output_limit[1]
-                # Anti-windup: prevent integral from growing further
-                if error > 0:
-                    self.integral -= error * dt
-            elif output < self.output_limit[0]:
-                output = self.output_limit[0]
-                # Anti-windup: prevent integral from growing further
-                if error < 0:
-                    self.integral -= error * dt
-        
-        return output
\ No newline at end of file
+@njit(cache=True, fastmath=True)
+def _bilinear(table, x0, inv_dx, y0, inv_dy, x, y):
+    """Bilinear interpolation on a uniform grid, clamped to the grid edges"""
+    nx, ny = table.shape
+    gx = min(max((x - x0) * inv_dx, 0.0), nx - 1.0)
+    gy = min(max((y - y0) * inv_dy, 0.0), ny - 1.0)
+    i = min(int(gx), nx - 2)
+    j = min(int(gy), ny - 2)
+    fx = gx - i
+    fy = gy - j
+    top = table[i, j] + fy * (table[i, j + 1] - table[i, j])
+    bottom = table[i + 1, j] + fy * (table[i + 1, j + 1] - table[i + 1, j])
+    return top + fx * (bottom - top)
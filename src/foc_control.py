@@ -1,10 +1,81 @@
 import numpy as np
-import json
 import os
+import math
+from typing import NamedTuple
+
+from numba_compat import njit
+from config_cache import load_params
+
+# sqrt(3) related constants
+_SQRT3 = 1.7320508075688772
+_INV_SQRT3 = 0.5773502691896258
+
+
+@njit(cache=True)
+def _pi_step(kp, ki, integral, error, dt, lo, hi):
+    """One PI step with conditional integration anti-windup, returns (output, integral)"""
+    candidate = integral + error * dt
+    out = kp * error + ki * candidate
+    # Anti-windup: while saturated, only integrate errors that pull away from the limit
+    if out > hi:
+        return hi, (candidate if error < 0 else integral)
+    if out < lo:
+        return lo, (candidate if error > 0 else integral)
+    return out, candidate
+
+
+@njit(cache=True)
+def _foc_step(ia, ib, c, s, speed_error, id_ref, dt, v_max,
+              speed_kp, speed_ki, speed_int, speed_lo, speed_hi,
+              id_kp, id_ki, id_int, id_lo, id_hi,
+              iq_kp, iq_ki, iq_int, iq_lo, iq_hi):
+    """
+    Numeric core of one FOC tick: abc -> dq, speed and current PI loops,
+    voltage limit and inverse Park. c, s = cos/sin of the rotor angle
+    Returns (id, iq, iq_ref, vd, vq, v_alpha, v_beta, speed_int, id_int, iq_int)
+    """
+    # Clarke + Park transformation
+    id_actual = (c + _INV_SQRT3 * s) * ia + (2 * _INV_SQRT3 * s) * ib
+    iq_actual = (_INV_SQRT3 * c - s) * ia + (2 * _INV_SQRT3 * c) * ib
+    
+    # Speed control (generates iq reference)
+    iq_ref, speed_int = _pi_step(speed_kp, speed_ki, speed_int, speed_error, dt, speed_lo, speed_hi)
+    
+    # Current control (generates vd, vq)
+    vd, id_int = _pi_step(id_kp, id_ki, id_int, id_ref - id_actual, dt, id_lo, id_hi)
+    vq, iq_int = _pi_step(iq_kp, iq_ki, iq_int, iq_ref - iq_actual, dt, iq_lo, iq_hi)
+    
+    # Apply voltage limits
+    v_mag = math.hypot(vd, vq)
+    if v_mag > v_max:
+        scale = v_max / v_mag
+        vd *= scale
+        vq *= scale
+    
+    # Inverse Park transformation
+    v_alpha = vd * c - vq * s
+    v_beta = vd * s + vq * c
+    return id_actual, iq_actual, iq_ref, vd, vq, v_alpha, v_beta, speed_int, id_int, iq_int
+
+
+class FOCResult(NamedTuple):
+    """Outputs of one FOCController.update tick"""
+    duty_a: float
+    duty_b: float
+    duty_c: float
+    id_actual: float
+    iq_actual: float
+    id_ref: float
+    iq_ref: float
+    vd: float
+    vq: float
+
 
 class PIController:
     """PI Controller implementation"""
     
+    __slots__ = ('kp', 'ki', '_output_limit', '_lo', '_hi', 'integral', 'prev_error')
+    
     def __init__(self, kp, ki, output_limit=None):
         self.kp = kp  # Proportional gain
         self.ki = ki  # Integral gain
@@ -12,6 +83,20 @@ class PIController:
         self.integral = 0.0
         self.prev_error = 0.0
         
+    @property
+    def output_limit(self):
+        """Output saturation limits [lower, upper], or None for no limit"""
+        return self._output_limit
+    
+    @output_limit.setter
+    def output_limit(self, output_limit):
+        self._output_limit = output_limit
+        # Cache the bounds as floats for update()
+        if output_limit is None:
+            self._lo, self._hi = -math.inf, math.inf
+        else:
+            self._lo, self._hi = float(output_limit[0]), float(output_limit[1])
+        
     def reset(self):
         """Reset controller state"""
         self.integral = 0.0
@@ -19,47 +104,57 @@ class PIController:
         
     def update(self, error, dt):
         """Update PI controller"""
-        # Proportional term
-        p_term = self.kp * error
-        
-        # Integral term with anti-windup
-        self.integral += error * dt
-        i_term = self.ki * self.integral
-        
-        # Calculate output
-        output = p_term + i_term
-        
-        # Apply output limits if specified
-        if self.output_limit is not None:
-            if output > self.output_limit[1]:
-                output = self.output_limit[1]
-                # Anti-windup: prevent integral from growing further
-                if error > 0:
-                    self.integral -= error * dt
-            elif output < self.output_limit[0]:
-                output = self.output_limit[0]
-                # Anti-windup: prevent integral from growing further
-                if error < 0:
-                    self.integral -= error * dt
-        
+        if self._output_limit is None:
+            # No saturation: skip the clamping and anti-windup altogether
+            self.integral += error * dt
+            return self.kp * error + self.ki * self.integral
+        output, self.integral = _pi_step(self.kp, self.ki, self.integral, error, dt, self._lo, self._hi)
         return output
 
+
 class FOCController:
     """
     Field-Oriented Control (FOC) Controller for PMSM
     Implements the complete FOC algorithm including Clarke and Park transformations
+    The transforms accept scalars or equally shaped arrays (e.g. whole recorded episodes)
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    # SVM sector indexed by the sign pattern N of (U1, U2, U3), see get_sector
+    # N = 0 only happens for the zero vector, which maps to sector 1
+    _SECTOR_LUT = np.array([1, 2, 6, 1, 4, 3, 5])
+    
+    # Per-sector SVM coefficients, indexed by sector (row 0 unused)
+    # (t1, t2) = rows . (v_alpha, v_beta)
+    _T12_COEF = (
+        None,
+        ((-1.0, _SQRT3), (2.0, 0.0)),
+        ((1.0, _SQRT3), (1.0, -_SQRT3)),
+        ((0.0, 2.0), (-1.0, -_SQRT3)),
+        ((-1.0, -_SQRT3), (-2.0, 0.0)),
+        ((1.0, -_SQRT3), (1.0, _SQRT3)),
+        ((0.0, -2.0), (-1.0, _SQRT3)),
+    )
+    # (duty_a, duty_b, duty_c) = rows . (t1, t2, t0)
+    _DUTY_COEF = (
+        None,
+        ((1, 1, 1), (0, 1, 1), (0, 0, 1)),
+        ((1, 0, 1), (1, 1, 1), (0, 0, 1)),
+        ((0, 0, 1), (1, 1, 1), (0, 1, 1)),
+        ((0, 0, 1), (1, 0, 1), (1, 1, 1)),
+        ((0, 1, 1), (0, 0, 1), (1, 1, 1)),
+        ((1, 1, 1), (0, 0, 1), (1, 0, 1)),
+    )
+    
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize FOC controller with parameters"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.initialize_controllers()
         self.reset()
         
-    def load_parameters(self, config_file):
-        """Load controller parameters from config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load controller parameters from config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.poles = params['poles']
         self.Rs = params['Rs']
@@ -70,6 +165,7 @@ class FOCController:
         self.max_voltage = params['max_voltage']
         self.dc_bus_voltage = params['dc_bus_voltage']
         self.sample_time = params['sample_time']
+        self._v_max = self.dc_bus_voltage * _INV_SQRT3  # Max phase voltage with SVM
         
         # Controller gains (can be tuned)
         self.id_kp = 2.0 * self.Ld
@@ -108,28 +204,57 @@ class FOCController:
     def clarke_transform(self, ia, ib, ic):
         """Clarke transformation: three-phase to alpha-beta"""
         i_alpha = ia
-        i_beta = (ia + 2 * ib) / np.sqrt(3)
+        i_beta = (ia + 2 * ib) * _INV_SQRT3
         return i_alpha, i_beta
     
     def inverse_clarke_transform(self, v_alpha, v_beta):
         """Inverse Clarke transformation: alpha-beta to three-phase"""
         va = v_alpha
-        vb = (-v_alpha + np.sqrt(3) * v_beta) / 2
-        vc = (-v_alpha - np.sqrt(3) * v_beta) / 2
+        vb = (-v_alpha + _SQRT3 * v_beta) / 2
+        vc = (-v_alpha - _SQRT3 * v_beta) / 2
         return va, vb, vc
     
     def park_transform(self, i_alpha, i_beta, theta_e):
         """Park transformation: alpha-beta to d-q"""
-        id = i_alpha * np.cos(theta_e) + i_beta * np.sin(theta_e)
-        iq = -i_alpha * np.sin(theta_e) + i_beta * np.cos(theta_e)
-        return id, iq
+        return self._park(i_alpha, i_beta, np.cos(theta_e), np.sin(theta_e))
     
     def inverse_park_transform(self, vd, vq, theta_e):
         """Inverse Park transformation: d-q to alpha-beta"""
-        v_alpha = vd * np.cos(theta_e) - vq * np.sin(theta_e)
-        v_beta = vd * np.sin(theta_e) + vq * np.cos(theta_e)
+        return self._ipark(vd, vq, np.cos(theta_e), np.sin(theta_e))
+    
+    def _park(self, i_alpha, i_beta, c, s):
+        """Park transformation with precomputed c = cos(theta_e), s = sin(theta_e)"""
+        id = i_alpha * c + i_beta * s
+        iq = -i_alpha * s + i_beta * c
+        return id, iq
+    
+    def _ipark(self, vd, vq, c, s):
+        """Inverse Park transformation with precomputed c = cos(theta_e), s = sin(theta_e)"""
+        v_alpha = vd * c - vq * s
+        v_beta = vd * s + vq * c
         return v_alpha, v_beta
     
+    def _abc_to_dq(self, ia, ib, c, s):
+        """
+        Clarke + Park fused into one 2x3 matrix with precomputed
+        c = cos(theta_e), s = sin(theta_e); ic drops out as in clarke_transform
+        """
+        id = (c + _INV_SQRT3 * s) * ia + (2 * _INV_SQRT3 * s) * ib
+        iq = (_INV_SQRT3 * c - s) * ia + (2 * _INV_SQRT3 * c) * ib
+        return id, iq
+    
+    def abc_to_dq(self, ia, ib, ic, theta_e):
+        """
+        Three-phase to d-q in one pass, also over whole arrays of samples
+        (e.g. to post-process recorded phase currents); returns (id, iq)
+        """
+        ia = np.asarray(ia, dtype=np.float64)
+        ib = np.asarray(ib, dtype=np.float64)
+        theta_e = np.asarray(theta_e, dtype=np.float64)
+        id, iq = self._abc_to_dq(ia, ib, np.cos(theta_e), np.sin(theta_e))
+        # 0-d inputs give plain scalars back
+        return id[()], iq[()]
+    
     def space_vector_modulation(self, v_alpha, v_beta):
         """
         Space Vector PWM modulation
@@ -137,74 +262,35 @@ class FOCController:
         """
         # Sector determination
         sector = self.get_sector(v_alpha, v_beta)
+        (a11, a12), (a21, a22) = self._T12_COEF[sector]
         
-        # Calculate duty cycles based on sector
-        if sector == 1:
-            t1 = np.sqrt(3) * v_beta - v_alpha
-            t2 = 2 * v_alpha
-        elif sector == 2:
-            t1 = np.sqrt(3) * v_beta + v_alpha
-            t2 = -np.sqrt(3) * v_beta + v_alpha
-        elif sector == 3:
-            t1 = 2 * v_beta
-            t2 = -np.sqrt(3) * v_beta - v_alpha
-        elif sector == 4:
-            t1 = -np.sqrt(3) * v_beta - v_alpha
-            t2 = -2 * v_alpha
-        elif sector == 5:
-            t1 = -np.sqrt(3) * v_beta + v_alpha
-            t2 = np.sqrt(3) * v_beta + v_alpha
-        else:  # sector == 6
-            t1 = -2 * v_beta
-            t2 = np.sqrt(3) * v_beta - v_alpha
-        
-        # Normalize to DC bus voltage
+        # Active vector times, normalized to DC bus voltage
         v_dc = self.dc_bus_voltage
-        t1 = t1 / v_dc
-        t2 = t2 / v_dc
+        t1 = (a11 * v_alpha + a12 * v_beta) / v_dc
+        t2 = (a21 * v_alpha + a22 * v_beta) / v_dc
         
-        # Calculate duty cycles
+        # Zero vector time
         t0 = (1 - t1 - t2) / 2
         
-        # Generate three-phase duty cycles based on sector
-        if sector == 1:
-            duty_a = t1 + t2 + t0
-            duty_b = t2 + t0
-            duty_c = t0
-        elif sector == 2:
-            duty_a = t1 + t0
-            duty_b = t1 + t2 + t0
-            duty_c = t0
-        elif sector == 3:
-            duty_a = t0
-            duty_b = t1 + t2 + t0
-            duty_c = t2 + t0
-        elif sector == 4:
-            duty_a = t0
-            duty_b = t1 + t0
-            duty_c = t1 + t2 + t0
-        elif sector == 5:
-            duty_a = t2 + t0
-            duty_b = t0
-            duty_c = t1 + t2 + t0
-        else:  # sector == 6
-            duty_a = t1 + t2 + t0
-            duty_b = t0
-            duty_c = t1 + t0
+        # Three-phase duty cycles: per-sector combination of t1, t2, t0
+        (pa1, pa2, pa0), (pb1, pb2, pb0), (pc1, pc2, pc0) = self._DUTY_COEF[sector]
+        duty_a = pa1 * t1 + pa2 * t2 + pa0 * t0
+        duty_b = pb1 * t1 + pb2 * t2 + pb0 * t0
+        duty_c = pc1 * t1 + pc2 * t2 + pc0 * t0
         
         return duty_a, duty_b, duty_c
     
     def get_sector(self, v_alpha, v_beta):
-        """Determine the sector of the reference voltage vector"""
-        angle = np.arctan2(v_beta, v_alpha)
-        if angle < 0:
-            angle += 2 * np.pi
-        
-        sector = int(angle / (np.pi / 3)) + 1
-        if sector > 6:
-            sector = 6
-            
-        return sector
+        """
+        Determine the sector of the reference voltage vector
+        Sign tests on U1 = vb, U2 = (sqrt3*va - vb)/2, U3 = -(sqrt3*va + vb)/2
+        instead of an arctan2; also works element-wise on arrays
+        """
+        u2 = 0.5 * (_SQRT3 * v_alpha - v_beta)
+        u3 = -0.5 * (_SQRT3 * v_alpha + v_beta)
+        # The positive alpha axis (vb == 0) starts sector 1
+        u1_pos = (v_beta > 0) | ((v_beta == 0) & (v_alpha > 0))
+        return self._SECTOR_LUT[u1_pos + 2 * (u2 > 0) + 4 * (u3 > 0)]
     
     def speed_control(self, speed_ref, speed_actual):
         """Speed control loop"""
@@ -223,8 +309,8 @@ class FOCController:
         self.vq = self.iq_controller.update(iq_error, self.sample_time)
         
         # Apply voltage limits
-        v_mag = np.sqrt(self.vd**2 + self.vq**2)
-        v_max = self.dc_bus_voltage / np.sqrt(3)
+        v_mag = math.hypot(self.vd, self.vq)
+        v_max = self._v_max
         
         if v_mag > v_max:
             scale = v_max / v_mag
@@ -238,40 +324,25 @@ class FOCController:
         Complete FOC control update
         Returns three-phase duty cycles for inverter control
         """
-        # Clarke transformation
-        i_alpha, i_beta = self.clarke_transform(ia, ib, ic)
-        
-        # Park transformation
-        id_actual, iq_actual = self.park_transform(i_alpha, i_beta, theta_e)
-        
-        # Speed control (generates iq reference)
-        self.iq_ref = self.speed_control(speed_ref, speed_actual)
-        
-        # Current control (generates vd, vq)
-        self.vd, self.vq = self.current_control(self.id_ref, self.iq_ref, 
-                                                id_actual, iq_actual, theta_e)
-        
-        # Inverse Park transformation
-        v_alpha, v_beta = self.inverse_park_transform(self.vd, self.vq, theta_e)
+        # Control loops in one compiled call, PI states passed in and out
+        spd, d, q = self.speed_controller, self.id_controller, self.iq_controller
+        (id_actual, iq_actual, self.iq_ref, self.vd, self.vq, v_alpha, v_beta,
+         spd.integral, d.integral, q.integral) = _foc_step(
+            ia, ib, math.cos(theta_e), math.sin(theta_e),
+            speed_ref - speed_actual, self.id_ref, self.sample_time, self._v_max,
+            spd.kp, spd.ki, spd.integral, spd._lo, spd._hi,
+            d.kp, d.ki, d.integral, d._lo, d._hi,
+            q.kp, q.ki, q.integral, q._lo, q._hi)
         
         # Space vector modulation
         duty_a, duty_b, duty_c = self.space_vector_modulation(v_alpha, v_beta)
         
-        return {
-            'duty_a': duty_a,
-            'duty_b': duty_b,
-            'duty_c': duty_c,
-            'id_actual': id_actual,
-            'iq_actual': iq_actual,
-            'id_ref': self.id_ref,
-            'iq_ref': self.iq_ref,
-            'vd': self.vd,
-            'vq': self.vq
-        }
+        return FOCResult(duty_a, duty_b, duty_c, id_actual, iq_actual,
+                         self.id_ref, self.iq_ref, self.vd, self.vq)
     
     def set_id_reference(self, id_ref):
         """Set d-axis current reference"""
-        self.id_ref = np.clip(id_ref, -self.max_current, self.max_current)
+        self.id_ref = min(max(id_ref, -self.max_current), self.max_current)
     
     def set_speed_reference(self, speed_ref):
         """Set speed reference in rad/s"""
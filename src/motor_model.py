@@ -1,7 +1,104 @@
 import numpy as np
-import json
-from scipy.integrate import odeint
 import os
+import math
+from typing import NamedTuple
+
+from numba_compat import njit
+from config_cache import load_params
+
+# sqrt(3) related constants
+_SQRT3_OVER_2 = 0.8660254037844386
+_INV_SQRT3 = 0.5773502691896258
+
+
+def _limit_magnitude(x, y, limit):
+    """
+    Scale the vector (x, y) down to magnitude <= limit
+    Scalars take a single hypot + conditional multiply, arrays are clamped element-wise
+    """
+    if np.ndim(x) == 0 and np.ndim(y) == 0:
+        mag = math.hypot(x, y)
+        scale = limit / mag if mag > limit else 1.0
+    else:
+        scale = np.minimum(1.0, limit / np.maximum(np.hypot(x, y), 1e-12))
+    return x * scale, y * scale
+
+
+@njit(cache=True, fastmath=True)
+def _pmsm_rhs_scaled(id, iq, wr, vd, vq, load_torque, Rs, Ld, Lq, flux, kt, B, inv_Ld, inv_Lq, inv_J):
+    """PMSM state derivatives with the divisions folded into kt = 1.5*poles, 1/Ld, 1/Lq, 1/J"""
+    did_dt = (vd - Rs * id + wr * Lq * iq) * inv_Ld
+    diq_dt = (vq - Rs * iq - wr * Ld * id - wr * flux) * inv_Lq
+    Te = kt * (flux * iq + (Ld - Lq) * id * iq)
+    dwr_dt = (Te - load_torque - B * wr) * inv_J
+    return did_dt, diq_dt, dwr_dt, wr
+
+
+@njit(cache=True, fastmath=True)
+def _pmsm_rhs(id, iq, wr, vd, vq, load_torque, Rs, Ld, Lq, flux, poles, B, J):
+    """PMSM state derivatives (did, diq, dwr, dtheta) in the d-q frame"""
+    return _pmsm_rhs_scaled(id, iq, wr, vd, vq, load_torque, Rs, Ld, Lq, flux,
+                            1.5 * poles, B, 1.0 / Ld, 1.0 / Lq, 1.0 / J)
+
+
+@njit(cache=True, fastmath=True)
+def _pmsm_rk4_step(id, iq, wr, theta_e, vd, vq, load_torque, h, Rs, Ld, Lq, flux, poles, B, J):
+    """One classical RK4 step of length h, returns (id, iq, wr, theta_e)"""
+    # Per-step constants, shared by the four stages
+    kt = 1.5 * poles
+    inv_Ld = 1.0 / Ld
+    inv_Lq = 1.0 / Lq
+    inv_J = 1.0 / J
+    half_h = 0.5 * h
+    k1_id, k1_iq, k1_wr, k1_th = _pmsm_rhs_scaled(id, iq, wr, vd, vq, load_torque,
+                                                  Rs, Ld, Lq, flux, kt, B, inv_Ld, inv_Lq, inv_J)
+    k2_id, k2_iq, k2_wr, k2_th = _pmsm_rhs_scaled(id + half_h * k1_id, iq + half_h * k1_iq, wr + half_h * k1_wr,
+                                                  vd, vq, load_torque, Rs, Ld, Lq, flux, kt, B,
+                                                  inv_Ld, inv_Lq, inv_J)
+    k3_id, k3_iq, k3_wr, k3_th = _pmsm_rhs_scaled(id + half_h * k2_id, iq + half_h * k2_iq, wr + half_h * k2_wr,
+                                                  vd, vq, load_torque, Rs, Ld, Lq, flux, kt, B,
+                                                  inv_Ld, inv_Lq, inv_J)
+    k4_id, k4_iq, k4_wr, k4_th = _pmsm_rhs_scaled(id + h * k3_id, iq + h * k3_iq, wr + h * k3_wr,
+                                                  vd, vq, load_torque, Rs, Ld, Lq, flux, kt, B,
+                                                  inv_Ld, inv_Lq, inv_J)
+    h6 = h / 6.0
+    return (id + h6 * (k1_id + 2 * k2_id + 2 * k3_id + k4_id),
+            iq + h6 * (k1_iq + 2 * k2_iq + 2 * k3_iq + k4_iq),
+            wr + h6 * (k1_wr + 2 * k2_wr + 2 * k3_wr + k4_wr),
+            theta_e + h6 * (k1_th + 2 * k2_th + 2 * k3_th + k4_th))
+
+
+@njit(cache=True)
+def _pmsm_step(id, iq, wr, theta_e, vd, vq, load_torque, h, Rs, Ld, Lq, flux, poles, B, J):
+    """RK4 step, angle wrap and torque in one call, returns (id, iq, wr, theta_e, Te)"""
+    id, iq, wr, theta_e = _pmsm_rk4_step(id, iq, wr, theta_e, vd, vq, load_torque, h,
+                                         Rs, Ld, Lq, flux, poles, B, J)
+    theta_e = theta_e % (2 * math.pi)
+    Te = 1.5 * poles * (flux * iq + (Ld - Lq) * id * iq)
+    return id, iq, wr, theta_e, Te
+
+
+@njit(cache=True)
+def _dq_to_abc(id, iq, theta_e):
+    """Inverse Park and Clarke of the d-q currents, returns (ia, ib, ic)"""
+    c = math.cos(theta_e)
+    s = math.sin(theta_e)
+    i_alpha = id * c - iq * s
+    i_beta = id * s + iq * c
+    ib = -0.5 * i_alpha + _SQRT3_OVER_2 * i_beta
+    ic = -0.5 * i_alpha - _SQRT3_OVER_2 * i_beta
+    return i_alpha, ib, ic
+
+
+class MotorState(NamedTuple):
+    """Motor state after one PMSMModel.update step"""
+    id: float
+    iq: float
+    wr: float
+    theta_e: float
+    Te: float
+    speed_rpm: float
+
 
 class PMSMModel:
     """
@@ -9,15 +106,15 @@ class PMSMModel:
     Implements the mathematical model of a PMSM motor in d-q reference frame
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize motor model with parameters from config file"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.reset_state()
         
-    def load_parameters(self, config_file):
-        """Load motor parameters from JSON config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load motor parameters from JSON config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.poles = params['poles']
         self.Rs = params['Rs']  # Stator resistance (Ohm)
@@ -38,6 +135,7 @@ class PMSMModel:
         self.wr = 0.0  # Electrical angular velocity (rad/s)
         self.theta_e = 0.0  # Electrical angle (rad)
         self.load_torque = 0.0  # Load torque (N.m)
+        self.Te = 0.0  # Electromagnetic torque (N.m)
         
     def electrical_dynamics(self, state, t, vd, vq, load_torque):
         """
@@ -45,21 +143,8 @@ class PMSMModel:
         state = [id, iq, wr, theta_e]
         """
         id, iq, wr, theta_e = state
-        
-        # Voltage equations in d-q reference frame
-        did_dt = (vd - self.Rs * id + wr * self.Lq * iq) / self.Ld
-        diq_dt = (vq - self.Rs * iq - wr * self.Ld * id - wr * self.flux_linkage) / self.Lq
-        
-        # Electromagnetic torque
-        Te = 1.5 * self.poles * (self.flux_linkage * iq + (self.Ld - self.Lq) * id * iq)
-        
-        # Mechanical dynamics
-        dwr_dt = (Te - load_torque - self.B * wr) / self.J
-        
-        # Electrical angle
-        dtheta_dt = wr
-        
-        return [did_dt, diq_dt, dwr_dt, dtheta_dt]
+        return list(_pmsm_rhs(id, iq, wr, vd, vq, load_torque, self.Rs, self.Ld, self.Lq,
+                              self.flux_linkage, self.poles, self.B, self.J))
     
     def update(self, vd, vq, load_torque=0.0):
         """
@@ -67,51 +152,20 @@ class PMSMModel:
         vd, vq: d-q axis voltages
         load_torque: External load torque
         """
-        # Current state
-        state = [self.id, self.iq, self.wr, self.theta_e]
-        
-        # Time points for integration
-        t = [0, self.sample_time]
-        
-        # Solve ODE for one time step
-        solution = odeint(self.electrical_dynamics, state, t, args=(vd, vq, load_torque))
-        
-        # Update state
-        self.id = solution[-1, 0]
-        self.iq = solution[-1, 1]
-        self.wr = solution[-1, 2]
-        self.theta_e = solution[-1, 3]
-        
-        # Keep electrical angle in [0, 2*pi]
-        self.theta_e = self.theta_e % (2 * np.pi)
+        # RK4 step of sample_time, angle kept in [0, 2*pi], electromagnetic torque
+        self.id, self.iq, self.wr, self.theta_e, self.Te = _pmsm_step(
+            self.id, self.iq, self.wr, self.theta_e, vd, vq, load_torque, self.sample_time,
+            self.Rs, self.Ld, self.Lq, self.flux_linkage, self.poles, self.B, self.J)
         
         # Store load torque
         self.load_torque = load_torque
         
-        # Calculate electromagnetic torque
-        Te = 1.5 * self.poles * (self.flux_linkage * self.iq + (self.Ld - self.Lq) * self.id * self.iq)
-        
-        return {
-            'id': self.id,
-            'iq': self.iq,
-            'wr': self.wr,
-            'theta_e': self.theta_e,
-            'Te': Te,
-            'speed_rpm': self.wr * 60 / (2 * np.pi * self.poles / 2)
-        }
+        return MotorState(self.id, self.iq, self.wr, self.theta_e, self.Te,
+                          self.wr * 60 / (math.pi * self.poles))
     
     def get_three_phase_currents(self):
         """Convert d-q currents to three-phase currents"""
-        # Clarke transformation (d-q to alpha-beta)
-        i_alpha = self.id * np.cos(self.theta_e) - self.iq * np.sin(self.theta_e)
-        i_beta =  self.id * np.sin(self.theta_e) + self.iq * np.cos(self.theta_e)
-        
-        # Park transformation (alpha-beta to three-phase)
-        ia = i_alpha
-        ib = -0.5 * i_alpha + np.sqrt(3)/2 * i_beta
-        ic = -0.5 * i_alpha - np.sqrt(3)/2 * i_beta
-        
-        return ia, ib, ic
+        return _dq_to_abc(self.id, self.iq, self.theta_e)
     
     def get_dc_bus_current(self):
         """Calculate DC bus current from three-phase currents"""
@@ -121,29 +175,10 @@ class PMSMModel:
     
     def apply_voltage_limits(self, vd, vq):
         """Apply voltage limits based on DC bus voltage"""
-        # Calculate voltage magnitude
-        v_mag = np.sqrt(vd**2 + vq**2)
-        
         # Maximum available voltage (considering modulation index)
-        v_max = self.dc_bus_voltage / np.sqrt(3)
-        
-        if v_mag > v_max:
-            # Scale voltages to fit within limit
-            scale = v_max / v_mag
-            vd *= scale
-            vq *= scale
-            
-        return vd, vq
+        v_max = self.dc_bus_voltage * _INV_SQRT3
+        return _limit_magnitude(vd, vq, v_max)
     
     def apply_current_limits(self, id_ref, iq_ref):
         """Apply current limits"""
-        # Calculate current magnitude
-        i_mag = np.sqrt(id_ref**2 + iq_ref**2)
-        
-        if i_mag > self.max_current:
-            # Scale currents to fit within limit
-            scale = self.max_current / i_mag
-            id_ref *= scale
-            iq_ref *= scale
-            
-        return id_ref, iq_ref
\ No newline at end of file
+        return _limit_magnitude(id_ref, iq_ref, self.max_current)
\ No newline at end of file
@@ -0,0 +1,20 @@
+"""
+Optional Numba support
+When numba is not installed, njit falls back to a no-op decorator so the
+kernels run as plain Python with identical results
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op replacement for numba.njit (supports @njit and @njit(...))"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
@@ -1,8 +1,42 @@
 import numpy as np
 import json
 import os
-from collections import deque
-import pickle
+
+from numba_compat import njit
+from config_cache import load_params
+
+
+@njit(cache=True)
+def _rls_1d(theta, P, lam, phi, y):
+    """Scalar RLS step, returns (theta, P, error)"""
+    P_phi = P * phi
+    denominator = lam + phi * P_phi
+    K = P_phi / denominator if abs(denominator) > 1e-10 else 0.0
+    error = y - phi * theta
+    return theta + K * error, (P - K * P_phi) / lam, error
+
+
+@njit(cache=True)
+def _rls_2d(t0, t1, p00, p01, p10, p11, lam, f0, f1, y):
+    """Two-parameter RLS step written out element-wise, returns (t0, t1, p00, p01, p10, p11, error)"""
+    # P @ phi and phi.T @ P (P is kept general, not assumed symmetric)
+    Pf0 = p00 * f0 + p01 * f1
+    Pf1 = p10 * f0 + p11 * f1
+    fP0 = f0 * p00 + f1 * p10
+    fP1 = f0 * p01 + f1 * p11
+    denominator = lam + fP0 * f0 + fP1 * f1
+    if abs(denominator) > 1e-10:
+        K0 = Pf0 / denominator
+        K1 = Pf1 / denominator
+    else:
+        K0 = 0.0
+        K1 = 0.0
+    error = y - (f0 * t0 + f1 * t1)
+    return (t0 + K0 * error, t1 + K1 * error,
+            (p00 - K0 * fP0) / lam, (p01 - K0 * fP1) / lam,
+            (p10 - K1 * fP0) / lam, (p11 - K1 * fP1) / lam,
+            error)
+
 
 class MotorParameterIdentification:
     """
@@ -10,16 +44,16 @@ class MotorParameterIdentification:
     Implements online parameter estimation for PMSM motors
     """
     
-    def __init__(self, config_file="../config/motor_params.json"):
+    def __init__(self, config_file="../config/motor_params.json", params=None):
         """Initialize parameter identification system"""
-        self.load_parameters(config_file)
+        self.load_parameters(config_file, params)
         self.initialize_estimators()
         self.reset()
         
-    def load_parameters(self, config_file):
-        """Load initial motor parameters from config file"""
-        with open(os.path.join(os.path.dirname(__file__), config_file), 'r') as f:
-            params = json.load(f)
+    def load_parameters(self, config_file, params=None):
+        """Load initial motor parameters from config file (or an already parsed params dict)"""
+        if params is None:
+            params = load_params(os.path.join(os.path.dirname(__file__), config_file))
             
         self.poles = params['poles']
         self.Rs_nominal = params['Rs']
@@ -71,11 +105,16 @@ class MotorParameterIdentification:
         """Reset all estimators and data buffers"""
         self.initialize_estimators()
         
-        # Data buffers for offline analysis
-        self.voltage_buffer = deque(maxlen=self.data_buffer_size)
-        self.current_buffer = deque(maxlen=self.data_buffer_size)
-        self.speed_buffer = deque(maxlen=self.data_buffer_size)
-        self.torque_buffer = deque(maxlen=self.data_buffer_size)
+        # Preallocated ring buffers for offline analysis
+        N = self.data_buffer_size
+        self.voltage_buffer = np.empty((N, 2))  # (vd, vq)
+        self.current_buffer = np.empty((N, 2))  # (id, iq)
+        self.speed_buffer = np.empty(N)
+        self.torque_buffer = np.empty(N)
+        self.buffer_index = 0  # Next write position (voltage/current/speed)
+        self.buffer_fill = 0  # Number of valid samples
+        self.torque_index = 0  # Torque is only recorded when provided
+        self.torque_fill = 0
         
         # Identified parameters
         self.Rs_identified = self.Rs_nominal
@@ -120,6 +159,24 @@ class MotorParameterIdentification:
         
         return estimator, error
     
+    def _rls_update_1d(self, estimator, phi, y):
+        """rls_update for a one-parameter estimator with a scalar regressor"""
+        theta, P, error = _rls_1d(estimator['theta'][0], estimator['P'][0, 0],
+                                  estimator['lambda'], phi, y)
+        estimator['theta'] = np.array([theta])
+        estimator['P'] = np.array([[P]])
+        return estimator, error
+    
+    def _rls_update_2d(self, estimator, phi0, phi1, y):
+        """rls_update for a two-parameter estimator with regressor (phi0, phi1)"""
+        theta = estimator['theta']
+        P = estimator['P']
+        t0, t1, p00, p01, p10, p11, error = _rls_2d(theta[0], theta[1], P[0, 0], P[0, 1], P[1, 0], P[1, 1],
+                                                    estimator['lambda'], phi0, phi1, y)
+        estimator['theta'] = np.array([t0, t1])
+        estimator['P'] = np.array([[p00, p01], [p10, p11]])
+        return estimator, error
+    
     def identify_resistance(self, vd, id, vq, iq, wr):
         """
         Identify stator resistance using stationary tests
@@ -131,16 +188,12 @@ class MotorParameterIdentification:
             
             # Use d-axis for identification
             if abs(id) > 0.1:  # Avoid division by very small current
-                phi = np.array([id])
-                y = vd
-                self.Rs_estimator, error = self.rls_update(self.Rs_estimator, phi, y)
+                self.Rs_estimator, error = self._rls_update_1d(self.Rs_estimator, id, vd)
                 self.Rs_identified = self.Rs_estimator['theta'][0]
                 
             # Use q-axis for identification
             elif abs(iq) > 0.1:
-                phi = np.array([iq])
-                y = vq
-                self.Rs_estimator, error = self.rls_update(self.Rs_estimator, phi, y)
+                self.Rs_estimator, error = self._rls_update_1d(self.Rs_estimator, iq, vq)
                 self.Rs_identified = self.Rs_estimator['theta'][0]
     
     def identify_inductance(self, vd, id, vq, iq, wr, did_dt, diq_dt):
@@ -156,19 +209,17 @@ class MotorParameterIdentification:
             # Rearrange for Ld and Lq identification
             # For Ld: use q-axis equation
             if abs(diq_dt) > 1e-6:
-                phi_Ld = np.array([wr * id, diq_dt])
                 y_Ld = vq - self.Rs_identified * iq - wr * self.flux_identified
                 self.L_estimator['theta'][0] = self.Ld_identified
-                self.L_estimator, error_Ld = self.rls_update(self.L_estimator, phi_Ld, y_Ld)
+                self.L_estimator, error_Ld = self._rls_update_2d(self.L_estimator, wr * id, diq_dt, y_Ld)
                 self.Ld_identified = self.L_estimator['theta'][0]
             
             # For Lq: use d-axis equation
             if abs(did_dt) > 1e-6:
-                phi_Lq = np.array([-wr * iq, did_dt])
                 y_Lq = vd - self.Rs_identified * id
                 temp_theta = np.array([self.Lq_identified, self.Ld_identified])
                 temp_estimator = {'theta': temp_theta, 'P': self.L_estimator['P'], 'lambda': self.L_estimator['lambda']}
-                temp_estimator, error_Lq = self.rls_update(temp_estimator, phi_Lq, y_Lq)
+                temp_estimator, error_Lq = self._rls_update_2d(temp_estimator, -wr * iq, did_dt, y_Lq)
                 self.Lq_identified = temp_estimator['theta'][0]
     
     def identify_flux_linkage(self, vd, id, vq, iq, wr):
@@ -181,9 +232,8 @@ class MotorParameterIdentification:
             # vq = Rs*iq + wr*Ld*id + wr*flux + Lq*diq/dt
             
             # Assuming diq/dt ≈ 0 for steady-state operation
-            phi_flux = np.array([wr])
             y_flux = vq - self.Rs_identified * iq - wr * self.Ld_identified * id
-            self.flux_estimator, error = self.rls_update(self.flux_estimator, phi_flux, y_flux)
+            self.flux_estimator, error = self._rls_update_1d(self.flux_estimator, wr, y_flux)
             self.flux_identified = self.flux_estimator['theta'][0]
     
     def identify_mechanical_parameters(self, Te, wr, dwr_dt):
@@ -197,9 +247,8 @@ class MotorParameterIdentification:
         # Assuming load torque TL is known or can be estimated
         
         if abs(dwr_dt) > 1e-6:
-            phi_mech = np.array([dwr_dt, wr])
             y_mech = Te  # Assuming no load torque for simplicity
-            self.mech_estimator, error = self.rls_update(self.mech_estimator, phi_mech, y_mech)
+            self.mech_estimator, error = self._rls_update_2d(self.mech_estimator, dwr_dt, wr, y_mech)
             self.J_identified = self.mech_estimator['theta'][0]
             self.B_identified = self.mech_estimator['theta'][1]
     
@@ -210,24 +259,22 @@ class MotorParameterIdentification:
         amplitude: Signal amplitude
         frequency: Signal frequency in Hz
         """
+        # One phase array shared by the sin/cos components
         t = np.arange(0, 1, self.sample_time)
+        phase = (2 * np.pi * frequency) * t
         
         if signal_type == 'current':
-            # Inject small AC current perturbation
-            id_test = amplitude * np.sin(2 * np.pi * frequency * t)
-            iq_test = amplitude * np.cos(2 * np.pi * frequency * t)
-            return id_test, iq_test
+            # Small AC current perturbation, generated directly in the d-q frame
+            # (no Clarke/Park round-trip needed)
+            return amplitude * np.sin(phase), amplitude * np.cos(phase)
         
         elif signal_type == 'voltage':
             # Inject small AC voltage perturbation
-            vd_test = amplitude * np.sin(2 * np.pi * frequency * t)
-            vq_test = amplitude * np.cos(2 * np.pi * frequency * t)
-            return vd_test, vq_test
+            return amplitude * np.sin(phase), amplitude * np.cos(phase)
         
         elif signal_type == 'speed':
             # Speed reference perturbation
-            speed_test = amplitude * np.sin(2 * np.pi * frequency * t)
-            return speed_test
+            return amplitude * np.sin(phase)
         
         return None
     
@@ -239,28 +286,32 @@ class MotorParameterIdentification:
         if not self.identification_enabled:
             return
         
-        # Store data in buffers
-        self.voltage_buffer.append((vd, vq))
-        self.current_buffer.append((id, iq))
-        self.speed_buffer.append(wr)
-        if Te is not None:
-            self.torque_buffer.append(Te)
-        
-        # Calculate derivatives using finite differences
-        if len(self.current_buffer) >= 2:
-            id_prev, iq_prev = self.current_buffer[-2]
+        # Calculate derivatives using finite differences against the previous sample
+        N = self.data_buffer_size
+        i = self.buffer_index
+        if self.buffer_fill > 0:
+            id_prev, iq_prev = self.current_buffer[i - 1]
             did_dt = (id - id_prev) / self.sample_time
             diq_dt = (iq - iq_prev) / self.sample_time
+            dwr_dt = (wr - self.speed_buffer[i - 1]) / self.sample_time
         else:
             did_dt = 0.0
             diq_dt = 0.0
-        
-        if len(self.speed_buffer) >= 2:
-            wr_prev = self.speed_buffer[-2]
-            dwr_dt = (wr - wr_prev) / self.sample_time
-        else:
             dwr_dt = 0.0
         
+        # Store data in buffers
+        self.voltage_buffer[i] = vd, vq
+        self.current_buffer[i] = id, iq
+        self.speed_buffer[i] = wr
+        self.buffer_index = (i + 1) % N
+        if self.buffer_fill < N:
+            self.buffer_fill += 1
+        if Te is not None:
+            self.torque_buffer[self.torque_index] = Te
+            self.torque_index = (self.torque_index + 1) % N
+            if self.torque_fill < N:
+                self.torque_fill += 1
+        
         # Perform parameter identification
         self.identify_resistance(vd, id, vq, iq, wr)
         self.identify_inductance(vd, id, vq, iq, wr, did_dt, diq_dt)
@@ -275,6 +326,67 @@ class MotorParameterIdentification:
         if self.identification_count > 100:
             self.identification_complete = True
     
+    def _ring_write(self, buffer, index, values):
+        """Write a block of samples into a ring buffer from index on, returns the next index"""
+        N = len(buffer)
+        n = len(values)
+        positions = (index + np.arange(max(n - N, 0), n)) % N
+        buffer[positions] = values[-N:]
+        return (index + n) % N
+    
+    def update_batch(self, vd, id, vq, iq, wr, Te=None):
+        """
+        Update parameter identification over a block of recorded samples
+        Same result as calling update() per sample, but the finite-difference
+        derivatives and buffer writes are done in single NumPy passes
+        """
+        if not self.identification_enabled:
+            return
+        
+        vd, id, vq, iq, wr = (np.asarray(x, dtype=np.float64) for x in (vd, id, vq, iq, wr))
+        n = len(id)
+        if n == 0:
+            return
+        
+        # Finite differences, the first sample against the last buffered one
+        if self.buffer_fill > 0:
+            i = self.buffer_index - 1
+            (id_prev, iq_prev), wr_prev = self.current_buffer[i], self.speed_buffer[i]
+        else:
+            id_prev, iq_prev, wr_prev = id[0], iq[0], wr[0]
+        did_dt = np.diff(id, prepend=id_prev) / self.sample_time
+        diq_dt = np.diff(iq, prepend=iq_prev) / self.sample_time
+        dwr_dt = np.diff(wr, prepend=wr_prev) / self.sample_time
+        
+        # Store data in buffers
+        N = self.data_buffer_size
+        self._ring_write(self.voltage_buffer, self.buffer_index, np.column_stack((vd, vq)))
+        self._ring_write(self.current_buffer, self.buffer_index, np.column_stack((id, iq)))
+        self.buffer_index = self._ring_write(self.speed_buffer, self.buffer_index, wr)
+        self.buffer_fill = min(self.buffer_fill + n, N)
+        if Te is not None:
+            Te = np.asarray(Te, dtype=np.float64)
+            self.torque_index = self._ring_write(self.torque_buffer, self.torque_index, Te)
+            self.torque_fill = min(self.torque_fill + n, N)
+        
+        # The RLS recursions are sequential, run them over plain floats
+        columns = (vd.tolist(), id.tolist(), vq.tolist(), iq.tolist(), wr.tolist(),
+                   did_dt.tolist(), diq_dt.tolist())
+        for vd_k, id_k, vq_k, iq_k, wr_k, did_k, diq_k in zip(*columns):
+            self.identify_resistance(vd_k, id_k, vq_k, iq_k, wr_k)
+            self.identify_inductance(vd_k, id_k, vq_k, iq_k, wr_k, did_k, diq_k)
+            self.identify_flux_linkage(vd_k, id_k, vq_k, iq_k, wr_k)
+        
+        if Te is not None:
+            for Te_k, wr_k, dwr_k in zip(Te.tolist(), wr.tolist(), dwr_dt.tolist()):
+                self.identify_mechanical_parameters(Te_k, wr_k, dwr_k)
+        
+        self.identification_count += n
+        
+        # Check if identification is complete (based on number of samples)
+        if self.identification_count > 100:
+            self.identification_complete = True
+    
     def get_identified_parameters(self):
         """Return the identified motor parameters"""
         return {
@@ -313,18 +425,25 @@ class MotorParameterIdentification:
         except FileNotFoundError:
             return False
     
-    def export_data_for_analysis(self, filename="identification_data.pkl"):
-        """Export collected data for offline analysis"""
-        data = {
-            'voltage': list(self.voltage_buffer),
-            'current': list(self.current_buffer),
-            'speed': list(self.speed_buffer),
-            'torque': list(self.torque_buffer),
-            'parameters': self.get_identified_parameters()
-        }
-        
-        with open(os.path.join(os.path.dirname(__file__), "../data/" + filename), 'wb') as f:
-            pickle.dump(data, f)
+    def _chronological(self, buffer, index, fill):
+        """Copy of the valid part of a ring buffer, oldest sample first"""
+        if fill < len(buffer):
+            return buffer[:fill].copy()
+        return np.roll(buffer, -index, axis=0)
+    
+    def export_data_for_analysis(self, filename="identification_data.npz"):
+        """
+        Export collected data for offline analysis
+        Saved as compressed float64 arrays (np.load) plus the identified parameters
+        """
+        fill, index = self.buffer_fill, self.buffer_index
+        np.savez_compressed(os.path.join(os.path.dirname(__file__), "../data/" + filename),
+                            voltage=self._chronological(self.voltage_buffer, index, fill),
+                            current=self._chronological(self.current_buffer, index, fill),
+                            speed=self._chronological(self.speed_buffer, index, fill),
+                            torque=self._chronological(self.torque_buffer, self.torque_index,
+                                                       self.torque_fill),
+                            **self.get_identified_parameters())
     
     def enable_identification(self):
         """Enable parameter identification"""
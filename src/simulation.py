@@ -3,9 +3,10 @@ import matplotlib.pyplot as plt
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import time
-import threading
 import json
 import os
+import math
+from typing import NamedTuple
 
 # Import our modules
 from motor_model import PMSMModel
@@ -16,13 +17,49 @@ from disturbance_rejection import DisturbanceRejectionController
 from visualization import MotorControlVisualization, ParameterVisualization
 from visualization_optimized import OptimizedMotorControlVisualization
 
+# Speed unit conversions
+_RPM2RADS = 2 * math.pi / 60.0
+_RADS2RPM = 60.0 / (2 * math.pi)
+
+class StepSample(NamedTuple):
+    """One recorded simulation step, also the column layout of the history buffer"""
+    time: float
+    id: float
+    iq: float
+    id_ref: float
+    iq_ref: float
+    speed: float
+    speed_ref: float
+    torque: float
+    vd: float
+    vq: float
+    dc_bus_voltage: float
+    dc_bus_current: float
+    theta_e: float
+
 class MotorControlSimulation:
     """
     Main simulation class that integrates all motor control components
     """
     
-    def __init__(self):
-        """Initialize simulation"""
+    # Motor parameter display, filled from the motor model's attributes
+    _PARAM_FMT = (
+        "极对数: {poles}\n"
+        "定子电阻: {Rs:.3f} Ω\n"
+        "d轴电感: {Ld:.4f} H\n"
+        "q轴电感: {Lq:.4f} H\n"
+        "磁链: {flux_linkage:.3f} Wb\n"
+        "转动惯量: {J:.4f} kg.m²\n"
+        "摩擦系数: {B:.4f} N.m.s\n"
+        "母线电压: {dc_bus_voltage:.1f} V\n"
+        "最大电流: {max_current:.1f} A"
+    )
+    
+    def __init__(self, history_time=100.0):
+        """
+        Initialize simulation
+        history_time: seconds of samples kept for plotting and CSV export
+        """
         # Initialize components
         self.motor = PMSMModel()
         self.foc_controller = FOCController()
@@ -35,10 +72,12 @@ class MotorControlSimulation:
         self.sample_time = self.motor.sample_time
         self.is_running = False
         self.simulation_speed = 1.0  # Real-time factor
+        self.batch_steps = 128  # Samples per simulation loop iteration
         
         # Control references
         self.speed_ref = 0.0  # rad/s
         self.load_torque = 0.0  # N.m
+        self._slider_commit_pending = False  # See _schedule_slider_commit
         
         # Control modes
         self.enable_flux_weakening = False
@@ -46,22 +85,30 @@ class MotorControlSimulation:
         self.enable_disturbance_rejection = False
         self.flux_weakening_method = 'voltage'
         
-        # Data storage
-        self.data_history = {
-            'time': [],
-            'id': [],
-            'iq': [],
-            'id_ref': [],
-            'iq_ref': [],
-            'speed': [],
-            'speed_ref': [],
-            'torque': [],
-            'vd': [],
-            'vq': [],
-            'dc_bus_voltage': [],
-            'dc_bus_current': [],
-            'theta_e': []
-        }
+        # Data storage: one ring buffer, a StepSample per row. It starts at 1 s
+        # of samples and doubles on demand up to history_capacity rows
+        self.history_capacity = max(1, int(round(history_time / self.sample_time)))
+        initial_rows = min(self.history_capacity, max(1, int(round(1.0 / self.sample_time))))
+        self._hist = np.empty((initial_rows, len(StepSample._fields)))
+        self._hist_idx = 0  # Next write position
+        self._hist_fill = 0  # Number of valid samples
+        self._hist_count = np.zeros(1, dtype=np.intp)  # Rows published to the plots
+        
+        # Visualization cadence in samples; the plots read the history buffer
+        self._step = 0
+        self._plot_stride = max(1, int(round(0.05 / self.sample_time)))  # 0.05 s
+        self._param_stride = max(1, int(round(0.1 / self.sample_time)))  # 0.1 s
+        self._plotted_count = 0  # History rows shown by the last redraw
+        self._param_plot_pending = False  # Parameter snapshot not drawn yet
+        
+        # Parameter identification inputs (vd, id, vq, iq, wr, Te), identified
+        # one 0.1 s block at a time
+        self._pid_block = np.empty((self._param_stride, 6))
+        self._pid_fill = 0
+        
+        # Simulation tick, scheduled with root.after in the Tk thread
+        self._tick_id = None
+        self._deadline = 0.0
         
         # Create GUI
         self.create_gui()
@@ -158,6 +205,11 @@ class MotorControlSimulation:
         ttk.Checkbutton(options_frame, text="抗干扰控制", 
                        variable=self.disturbance_rejection_var).pack(anchor=tk.W)
         
+        # Mirror the options into plain attributes read by simulation_step
+        self._bind_var(self.flux_weakening_var, 'enable_flux_weakening')
+        self._bind_var(self.param_identification_var, 'enable_parameter_identification')
+        self._bind_var(self.disturbance_rejection_var, 'enable_disturbance_rejection')
+        
         # Flux weakening method
         fw_method_frame = ttk.LabelFrame(control_frame, text="弱磁控制方法", padding=5)
         fw_method_frame.pack(fill=tk.X, pady=5)
@@ -169,6 +221,7 @@ class MotorControlSimulation:
                        value="speed").pack(anchor=tk.W)
         ttk.Radiobutton(fw_method_frame, text="查表法", variable=self.fw_method_var,
                        value="lookup").pack(anchor=tk.W)
+        self._bind_var(self.fw_method_var, 'flux_weakening_method')
         
         # Simulation control
         sim_frame = ttk.LabelFrame(control_frame, text="仿真控制", padding=5)
@@ -184,6 +237,7 @@ class MotorControlSimulation:
         sim_speed_scale = ttk.Scale(sim_frame, from_=0.1, to=5.0, variable=self.sim_speed_var,
                                    orient=tk.HORIZONTAL, length=100)
         sim_speed_scale.pack(side=tk.LEFT)
+        self._bind_var(self.sim_speed_var, 'simulation_speed')
         
         # Motor parameters display
         params_frame = ttk.LabelFrame(control_frame, text="电机参数", padding=5)
@@ -205,13 +259,17 @@ class MotorControlSimulation:
         # Main visualization tab
         main_frame = ttk.Frame(self.notebook)
         self.notebook.add(main_frame, text="主界面")
-        self.main_viz = MotorControlVisualization(main_frame)
+        self.main_viz = MotorControlVisualization(main_frame, blit=True)
+        self.main_viz.bind_buffer(self._hist, self._hist_count, StepSample._fields)
         
         # Parameter visualization tab
         param_frame = ttk.Frame(self.notebook)
         self.notebook.add(param_frame, text="参数视图")
         self.param_viz = ParameterVisualization(param_frame)
         
+        # Only the shown tab is redrawn, so bring the other one up to date on a switch
+        self.notebook.bind('<<NotebookTabChanged>>', lambda event: self._refresh_views())
+        
     def create_status_panel(self):
         """Create status panel"""
         status_frame = ttk.LabelFrame(self.root, text="状态信息", padding=5)
@@ -223,150 +281,210 @@ class MotorControlSimulation:
         self.time_label = ttk.Label(status_frame, text="时间: 0.00 s")
         self.time_label.pack(side=tk.LEFT, padx=20)
         
+    def _bind_var(self, var, attr):
+        """Keep attribute attr in sync with a Tk variable, so the simulation step never polls Tk"""
+        var.trace_add('write', lambda *args: setattr(self, attr, var.get()))
+        
     def update_speed_label(self, value):
         """Update speed label"""
         self.speed_label.config(text=f"{float(value):.0f}")
-        self.speed_ref = float(value) * 2 * np.pi / 60  # Convert RPM to rad/s
+        self._schedule_slider_commit()
         
     def update_load_label(self, value):
         """Update load torque label"""
         self.load_label.config(text=f"{float(value):.1f}")
-        self.load_torque = float(value)
+        self._schedule_slider_commit()
+        
+    def _schedule_slider_commit(self):
+        """Coalesce slider drag events into one reference update per frame"""
+        if not self._slider_commit_pending:
+            self._slider_commit_pending = True
+            self.root.after(16, self._commit_sliders)
+        
+    def _commit_sliders(self):
+        """Apply the latest slider values to the simulation references"""
+        self._slider_commit_pending = False
+        self.speed_ref = self.speed_ref_var.get() * _RPM2RADS  # Convert RPM to rad/s
+        self.load_torque = self.load_torque_var.get()
         
     def update_params_display(self):
         """Update motor parameters display"""
-        params = f"极对数: {self.motor.poles}\n"
-        params += f"定子电阻: {self.motor.Rs:.3f} Ω\n"
-        params += f"d轴电感: {self.motor.Ld:.4f} H\n"
-        params += f"q轴电感: {self.motor.Lq:.4f} H\n"
-        params += f"磁链: {self.motor.flux_linkage:.3f} Wb\n"
-        params += f"转动惯量: {self.motor.J:.4f} kg.m²\n"
-        params += f"摩擦系数: {self.motor.B:.4f} N.m.s\n"
-        params += f"母线电压: {self.motor.dc_bus_voltage:.1f} V\n"
-        params += f"最大电流: {self.motor.max_current:.1f} A"
+        params = self._PARAM_FMT.format_map(vars(self.motor))
         
         self.params_text.delete(1.0, tk.END)
         self.params_text.insert(1.0, params)
         
     def simulation_step(self):
         """Execute one simulation step"""
-        # Get current references
-        self.enable_flux_weakening = self.flux_weakening_var.get()
-        self.enable_parameter_identification = self.param_identification_var.get()
-        self.enable_disturbance_rejection = self.disturbance_rejection_var.get()
-        self.flux_weakening_method = self.fw_method_var.get()
+        # Hot attributes as locals
+        motor = self.motor
+        speed_ref = self.speed_ref
+        wr_prev = motor.wr
         
         # Get three-phase currents from motor
-        ia, ib, ic = self.motor.get_three_phase_currents()
+        ia, ib, ic = motor.get_three_phase_currents()
         
-        # FOC control
-        foc_results = self.foc_controller.update(
+        # FOC control, FOCResult unpacked by position
+        (duty_a, duty_b, duty_c, id_actual, iq_actual,
+         id_ref, iq_ref, vd, vq) = self.foc_controller.update(
             ia, ib, ic, 
-            self.speed_ref, self.motor.wr, 
-            self.motor.theta_e
+            speed_ref, wr_prev, 
+            motor.theta_e
         )
         
         # Apply flux weakening if enabled
         if self.enable_flux_weakening:
-            id_fw = self.flux_weakening.update(
-                self.motor.wr, 
-                foc_results['vd'], 
-                foc_results['vq'],
-                foc_results['iq_ref'],
+            id_ref = self.flux_weakening.update(
+                wr_prev, 
+                vd, 
+                vq,
+                iq_ref,
                 self.flux_weakening_method
             )
-            foc_results['id_ref'] = id_fw
         
         # Apply disturbance rejection if enabled
         if self.enable_disturbance_rejection:
             dr_results = self.disturbance_rejection.update(
-                self.motor.Te, 
-                self.motor.wr, 
-                self.speed_ref,
-                foc_results['id_actual'],
-                foc_results['iq_actual'],
-                foc_results['id_ref'],
-                foc_results['iq_ref']
+                motor.Te, 
+                wr_prev, 
+                speed_ref,
+                id_actual,
+                iq_actual,
+                id_ref,
+                iq_ref
             )
-            foc_results['id_ref'] = dr_results['id_ref_modified']
-            foc_results['iq_ref'] = dr_results['iq_ref_modified']
+            id_ref = dr_results['id_ref_modified']
+            iq_ref = dr_results['iq_ref_modified']
         
-        # Update motor with voltages
-        motor_results = self.motor.update(
-            foc_results['vd'], 
-            foc_results['vq'], 
+        # Update motor with voltages, MotorState unpacked by position
+        _, _, wr, theta_e, Te, speed_rpm = motor.update(
+            vd, 
+            vq, 
             self.load_torque
         )
         
-        # Parameter identification if enabled
+        # Parameter identification if enabled, batched per block
         if self.enable_parameter_identification:
-            self.param_identification.update(
-                foc_results['vd'], 
-                foc_results['id_actual'],
-                foc_results['vq'], 
-                foc_results['iq_actual'],
-                self.motor.wr,
-                motor_results['Te'],
-                self.load_torque
-            )
-            
-            # Update parameter visualization
-            if self.simulation_time % 0.1 < self.sample_time:  # Update every 0.1 seconds
+            self._pid_block[self._pid_fill] = vd, id_actual, vq, iq_actual, wr, Te
+            self._pid_fill += 1
+            if self._pid_fill == self._param_stride:
+                self._identify_block()
+                
+                # Update parameter visualization every 0.1 seconds
                 params = self.param_identification.get_identified_parameters()
                 self.param_viz.update_parameter_data(self.simulation_time, params)
-                self.param_viz.update_plots()
-        
-        # Store data
-        self.data_history['time'].append(self.simulation_time)
-        self.data_history['id'].append(foc_results['id_actual'])
-        self.data_history['iq'].append(foc_results['iq_actual'])
-        self.data_history['id_ref'].append(foc_results['id_ref'])
-        self.data_history['iq_ref'].append(foc_results['iq_ref'])
-        self.data_history['speed'].append(motor_results['speed_rpm'])
-        self.data_history['speed_ref'].append(self.speed_ref * 60 / (2 * np.pi))
-        self.data_history['torque'].append(motor_results['Te'])
-        self.data_history['vd'].append(foc_results['vd'])
-        self.data_history['vq'].append(foc_results['vq'])
-        self.data_history['dc_bus_voltage'].append(self.motor.dc_bus_voltage)
-        self.data_history['dc_bus_current'].append(self.motor.get_dc_bus_current())
-        self.data_history['theta_e'].append(self.motor.theta_e)
-        
-        # Update visualization
-        data = {
-            'time': self.simulation_time,
-            'id': foc_results['id_actual'],
-            'iq': foc_results['iq_actual'],
-            'id_ref': foc_results['id_ref'],
-            'iq_ref': foc_results['iq_ref'],
-            'speed_rpm': motor_results['speed_rpm'],
-            'speed_ref_rpm': self.speed_ref * 60 / (2 * np.pi),
-            'torque': motor_results['Te'],
-            'vd': foc_results['vd'],
-            'vq': foc_results['vq'],
-            'dc_bus_voltage': self.motor.dc_bus_voltage,
-            'dc_bus_current': self.motor.get_dc_bus_current()
-        }
-        
-        self.main_viz.update_data(data)
-        if self.simulation_time % 0.05 < self.sample_time:  # Update every 0.05 seconds
-            self.main_viz.update_plots()
-        
-        # Update time
-        self.simulation_time += self.sample_time
+                self._param_plot_pending = True
+        elif self._pid_fill:
+            self._identify_block()
+        
+        # Store data, in StepSample column order
+        i = self._hist_idx
+        self._hist[i] = (
+            self.simulation_time,
+            id_actual,
+            iq_actual,
+            id_ref,
+            iq_ref,
+            speed_rpm,
+            speed_ref * _RADS2RPM,
+            Te,
+            vd,
+            vq,
+            motor.dc_bus_voltage,
+            motor.get_dc_bus_current(),
+            theta_e
+        )
+        i += 1
+        if i == len(self._hist):
+            if i < self.history_capacity:
+                self._grow_history()
+            else:
+                i = 0
+        self._hist_idx = i
+        if self._hist_fill < self.history_capacity:
+            self._hist_fill += 1
+        
+        # Publish the new samples to the plots every 0.05 s
+        step = self._step + 1
+        self._step = step
+        if step % self._plot_stride == 0:
+            self._hist_count[0] = step
+        
+        # Update time, derived from the step count so it does not accumulate rounding
+        self.simulation_time = step * self.sample_time
+        
+    def _grow_history(self):
+        """Double the (not yet wrapped) history buffer, up to history_capacity rows"""
+        rows = min(2 * len(self._hist), self.history_capacity)
+        hist = np.empty((rows, self._hist.shape[1]))
+        hist[:len(self._hist)] = self._hist
+        self._hist = hist
+        self.main_viz.bind_buffer(self._hist, self._hist_count, StepSample._fields)
+        
+    def _identify_block(self):
+        """Run parameter identification over the collected block of samples"""
+        vd, id, vq, iq, wr, Te = self._pid_block[:self._pid_fill].T
+        self.param_identification.update_batch(vd, id, vq, iq, wr, Te)
+        self._pid_fill = 0
+        
+    def simulation_batch(self, n_steps):
+        """Advance the simulation by n_steps samples in one go"""
+        step = self.simulation_step
+        for _ in range(n_steps):
+            step()
+        
+    def _refresh_views(self):
+        """Show the current time and redraw the shown tab's plots if they have new data"""
         self.time_label.config(text=f"时间: {self.simulation_time:.2f} s")
         
-    def simulation_loop(self):
-        """Main simulation loop"""
-        while self.is_running:
-            start_time = time.time()
-            
-            # Execute simulation step
-            self.simulation_step()
-            
-            # Control simulation speed
-            elapsed = time.time() - start_time
-            sleep_time = max(0, self.sample_time / self.sim_speed_var.get() - elapsed)
-            time.sleep(sleep_time)
+        # Hidden tabs keep their data pending until shown. The main view
+        # coalesces redraws to its max_redraw_rate
+        if self.notebook.index('current') == 0:
+            if self._hist_count[0] != self._plotted_count:
+                self._plotted_count = self._hist_count[0]
+                self.main_viz.request_redraw()
+        elif self._param_plot_pending:
+            self._param_plot_pending = False
+            self.param_viz.update_plots()
+        
+    def _history_rows(self):
+        """Recorded StepSample rows, oldest first"""
+        if self._hist_fill < len(self._hist):
+            return self._hist[:self._hist_fill]
+        return np.roll(self._hist, -self._hist_idx, axis=0)
+        
+    @property
+    def data_history(self):
+        """Recorded samples as a dict of column arrays, oldest first"""
+        hist = self._history_rows()
+        return {key: hist[:, j] for j, key in enumerate(StepSample._fields)}
+        
+    def _tick(self):
+        """
+        Simulation tick in the Tk thread: one batch of steps, then the display
+        Reschedules itself against a monotonic deadline while running
+        """
+        self._tick_id = None
+        if not self.is_running:
+            return
+        
+        self.simulation_batch(self.batch_steps)
+        self._refresh_views()
+        
+        # Control simulation speed
+        self._deadline += self.batch_steps * self.sample_time / self.simulation_speed
+        remaining = self._deadline - time.perf_counter()
+        if remaining < 0:
+            # Running behind, don't build up a backlog to catch up on
+            self._deadline -= remaining
+            remaining = 0.0
+        self._tick_id = self.root.after(int(remaining * 1000), self._tick)
+        
+    def _cancel_tick(self):
+        """Drop a scheduled simulation tick"""
+        if self._tick_id is not None:
+            self.root.after_cancel(self._tick_id)
+            self._tick_id = None
             
     def start_simulation(self):
         """Start the simulation"""
@@ -374,30 +492,31 @@ class MotorControlSimulation:
             self.is_running = True
             self.status_label.config(text="运行中")
             
-            # Start simulation thread
-            self.sim_thread = threading.Thread(target=self.simulation_loop)
-            self.sim_thread.daemon = True
-            self.sim_thread.start()
-            
-            # Start visualization animation
-            self.main_viz.start_animation()
+            # Start simulation ticks
+            self._deadline = time.perf_counter()
+            self._tick_id = self.root.after(0, self._tick)
             
     def pause_simulation(self):
         """Pause the simulation"""
         self.is_running = False
+        self._cancel_tick()
         self.status_label.config(text="暂停")
-        self.main_viz.stop_animation()
         
     def reset_simulation(self):
         """Reset the simulation"""
         self.is_running = False
+        self._cancel_tick()
         self.status_label.config(text="就绪")
-        self.main_viz.stop_animation()
         
         # Reset time and data
         self.simulation_time = 0.0
-        for key in self.data_history:
-            self.data_history[key].clear()
+        self._hist_idx = 0
+        self._hist_fill = 0
+        self._step = 0
+        self._hist_count[0] = 0
+        self._plotted_count = 0
+        self._param_plot_pending = False
+        self._pid_fill = 0
         
         # Reset components
         self.motor.reset_state()
@@ -430,9 +549,7 @@ class MotorControlSimulation:
                 self.foc_controller.load_parameters(filename)
                 self.flux_weakening.load_parameters(filename)
                 self.param_identification.load_parameters(filename)
-                self.disturbance_rejection.disturbance_observer.load_parameters(filename)
-                self.disturbance_rejection.adaptive_controller.load_parameters(filename)
-                self.disturbance_rejection.robust_controller.load_parameters(filename)
+                self.disturbance_rejection.load_parameters(filename)
                 
                 # Update display
                 self.update_params_display()
@@ -484,13 +601,9 @@ class MotorControlSimulation:
         
         if filename:
             try:
-                import pandas as pd
-                
-                # Create DataFrame
-                df = pd.DataFrame(self.data_history)
-                
-                # Save to CSV
-                df.to_csv(filename, index=False)
+                # Save the recorded rows straight to CSV, oldest first
+                np.savetxt(filename, self._history_rows(), fmt='%.12g', delimiter=',',
+                           header=','.join(StepSample._fields), comments='')
                 
                 messagebox.showinfo("成功", "数据导出成功")
             except Exception as e:
@@ -3,15 +3,31 @@ import matplotlib.pyplot as plt
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import time
-import threading
 import json
 import os
+import math
+from typing import NamedTuple
 
 # Import our modules
 from motor_model import PMSMModel
 from foc_control import FOCController
 from flux_weakening import FluxWeakeningController
 from visualization_optimized import OptimizedMotorControlVisualization
+from decimation import minmax_decimate
+
+# Speed unit conversions
+_RPM2RADS = 2 * math.pi / 60.0
+_RADS2RPM = 60.0 / (2 * math.pi)
+
+class LiteSample(NamedTuple):
+    """One recorded simulation step, also the column layout of the history buffer"""
+    time: float
+    id: float
+    iq: float
+    speed: float
+    torque: float
+    vd: float
+    vq: float
 
 class LiteMotorControlSimulation:
     """
@@ -25,9 +41,9 @@ class LiteMotorControlSimulation:
             self.config = json.load(f)
         
         # Initialize components
-        self.motor = PMSMModel(config_file)
-        self.foc_controller = FOCController(config_file)
-        self.flux_weakening = FluxWeakeningController(config_file)
+        self.motor = PMSMModel(config_file, self.config)
+        self.foc_controller = FOCController(config_file, self.config)
+        self.flux_weakening = FluxWeakeningController(config_file, self.config)
         
         # Simulation parameters
         self.simulation_time = 0.0
@@ -38,31 +54,36 @@ class LiteMotorControlSimulation:
         # Visualization parameters
         self.visualization_update_interval = self.config['visualization_update_interval']
         self.data_buffer_size = self.config['data_buffer_size']
+        self.requested_buffer_size = self.data_buffer_size  # Applied between steps
         self.enable_animation = self.config['enable_animation']
         self.fixed_axis = False  # Default to auto-scaling
         
         # Control references
         self.speed_ref = 0.0  # rad/s
         self.load_torque = 0.0  # N.m
+        self._slider_commit_pending = False  # See _schedule_slider_commit
         
         # Control modes
         self.enable_flux_weakening = False
         self.flux_weakening_method = 'voltage'
         
-        # Data storage (limited size for performance)
-        self.data_history = {
-            'time': [],
-            'id': [],
-            'iq': [],
-            'speed': [],
-            'torque': [],
-            'vd': [],
-            'vq': []
-        }
+        # Data storage: preallocated ring buffer, one row per LiteSample field.
+        # Every sample is written twice, at head and head + size, so the
+        # newest data_buffer_size samples are always one contiguous slice.
+        # float32 is plenty for plotted telemetry and halves the data per redraw
+        self._buf = np.empty((len(LiteSample._fields), 2 * self.data_buffer_size), dtype=np.float32)
+        self._head = 0  # Next write position
+        self._count = 0  # Number of valid samples
         
         # Last visualization update time
         self.last_viz_update = 0.0
         
+        # Simulation ticks, scheduled with root.after while running
+        self._tick_id = None
+        self._deadline = 0.0
+        self._frame_count = 0  # Redraws since _fps_start
+        self._fps_start = 0.0
+        
         # Create GUI
         self.create_gui()
         
@@ -143,6 +164,7 @@ class LiteMotorControlSimulation:
         self.flux_weakening_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(options_frame, text="弱磁控制", 
                        variable=self.flux_weakening_var).pack(anchor=tk.W)
+        self._bind_var(self.flux_weakening_var, 'enable_flux_weakening')
         
         # Flux weakening method
         fw_method_frame = ttk.LabelFrame(control_frame, text="弱磁控制方法", padding=5)
@@ -153,6 +175,7 @@ class LiteMotorControlSimulation:
                        value="voltage").pack(anchor=tk.W)
         ttk.Radiobutton(fw_method_frame, text="速度法", variable=self.fw_method_var,
                        value="speed").pack(anchor=tk.W)
+        self._bind_var(self.fw_method_var, 'flux_weakening_method')
         
         # Simulation control
         sim_frame = ttk.LabelFrame(control_frame, text="仿真控制", padding=5)
@@ -168,6 +191,7 @@ class LiteMotorControlSimulation:
         sim_speed_scale = ttk.Scale(sim_frame, from_=0.1, to=2.0, variable=self.sim_speed_var,
                                    orient=tk.HORIZONTAL, length=80)
         sim_speed_scale.pack(side=tk.LEFT)
+        self._bind_var(self.sim_speed_var, 'simulation_speed')
         
         # Performance settings
         perf_frame = ttk.LabelFrame(control_frame, text="性能设置", padding=5)
@@ -178,12 +202,14 @@ class LiteMotorControlSimulation:
         viz_interval_scale = ttk.Scale(perf_frame, from_=0.05, to=0.5, variable=self.viz_interval_var,
                                       orient=tk.HORIZONTAL, length=100)
         viz_interval_scale.grid(row=0, column=1, padx=5)
+        self._bind_var(self.viz_interval_var, 'visualization_update_interval')
         
         self.buffer_size_var = tk.IntVar(value=self.data_buffer_size)
         ttk.Label(perf_frame, text="缓冲区大小:").grid(row=1, column=0, sticky=tk.W)
         buffer_size_scale = ttk.Scale(perf_frame, from_=100, to=1000, variable=self.buffer_size_var,
                                     orient=tk.HORIZONTAL, length=100)
         buffer_size_scale.grid(row=1, column=1, padx=5)
+        self._bind_var(self.buffer_size_var, 'requested_buffer_size')
         
         # Fixed axis option
         self.fixed_axis_var = tk.BooleanVar(value=self.fixed_axis)
@@ -235,11 +261,40 @@ class LiteMotorControlSimulation:
         self.ax_torque.set_ylabel('Torque (N.m)')
         self.ax_torque.grid(True)
         
+        # Persistent data lines, redrawn by blitting in update_plots
+        self.id_line, = self.ax_current.plot([], [], 'b-', label='id')
+        self.iq_line, = self.ax_current.plot([], [], 'r-', label='iq')
+        self.speed_line, = self.ax_speed.plot([], [], 'g-', label='Speed')
+        self.speed_ref_line = self.ax_speed.axhline(y=0.0, color='g', linestyle='--', label='Ref')
+        self.vd_line, = self.ax_voltage.plot([], [], 'b-', label='vd')
+        self.vq_line, = self.ax_voltage.plot([], [], 'r-', label='vq')
+        self.torque_line, = self.ax_torque.plot([], [], 'm-', label='Torque')
+        
+        self._axis_lines = (
+            (self.ax_current, (self.id_line, self.iq_line)),
+            (self.ax_speed, (self.speed_line, self.speed_ref_line)),
+            (self.ax_voltage, (self.vd_line, self.vq_line)),
+            (self.ax_torque, (self.torque_line,)),
+        )
+        # LiteSample columns shown on each axis, in _axis_lines order
+        self._axis_columns = tuple(
+            [LiteSample._fields.index(name) for name in names]
+            for names in (('id', 'iq'), ('speed',), ('vd', 'vq'), ('torque',)))
+        for ax, lines in self._axis_lines:
+            ax.set_autoscale_on(False)
+            ax.legend()
+            for line in lines:
+                line.set_animated(True)
+        self._backgrounds = None  # Cached axis backgrounds for blitting
+        
         # Embed in tkinter
         from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         self.canvas = FigureCanvasTkAgg(self.fig, master=viz_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
+        # A resized canvas invalidates the cached backgrounds
+        self.canvas.mpl_connect('resize_event', self._invalidate_backgrounds)
+        
     def create_status_panel(self):
         """Create status panel"""
         status_frame = ttk.LabelFrame(self.root, text="状态信息", padding=5)
@@ -254,15 +309,33 @@ class LiteMotorControlSimulation:
         self.performance_label = ttk.Label(status_frame, text="性能: 正常")
         self.performance_label.pack(side=tk.LEFT, padx=20)
         
+    def _bind_var(self, var, attr):
+        """Keep attribute attr in sync with a Tk variable, so the simulation step never polls Tk"""
+        var.trace_add('write', lambda *args: setattr(self, attr, var.get()))
+        
     def update_speed_label(self, value):
         """Update speed label"""
-        self.speed_label.config(text=f"{float(value):.0f}")
-        self.speed_ref = float(value) * 2 * np.pi / 60  # Convert RPM to rad/s
+        self._schedule_slider_commit()
         
     def update_load_label(self, value):
         """Update load torque label"""
-        self.load_label.config(text=f"{float(value):.1f}")
-        self.load_torque = float(value)
+        self._schedule_slider_commit()
+        
+    def _schedule_slider_commit(self):
+        """Coalesce slider drag events into one label and reference update per 50 ms"""
+        if not self._slider_commit_pending:
+            self._slider_commit_pending = True
+            self.root.after(50, self._commit_sliders)
+        
+    def _commit_sliders(self):
+        """Apply the latest slider values to the labels and simulation references"""
+        self._slider_commit_pending = False
+        speed_rpm = self.speed_ref_var.get()
+        load_torque = self.load_torque_var.get()
+        self.speed_label.config(text=f"{speed_rpm:.0f}")
+        self.load_label.config(text=f"{load_torque:.1f}")
+        self.speed_ref = speed_rpm * _RPM2RADS  # Convert RPM to rad/s
+        self.load_torque = load_torque
         
     def update_params_display(self):
         """Update motor parameters display"""
@@ -279,12 +352,34 @@ class LiteMotorControlSimulation:
         
     def simulation_step(self):
         """Execute one simulation step"""
-        # Get current settings
-        self.enable_flux_weakening = self.flux_weakening_var.get()
-        self.flux_weakening_method = self.fw_method_var.get()
-        self.visualization_update_interval = self.viz_interval_var.get()
-        self.data_buffer_size = int(self.buffer_size_var.get())
+        self._apply_buffer_size()
+        self._advance()
+        
+        # Update visualization only at specified interval
+        if self.simulation_time - self.last_viz_update >= self.visualization_update_interval:
+            self.update_plots()
+            self.last_viz_update = self.simulation_time
+        
+        self.time_label.config(text=f"时间: {self.simulation_time:.2f} s")
+        
+    def simulation_batch(self, n_steps):
+        """Execute n_steps simulation steps, then refresh the display once"""
+        self._apply_buffer_size()
+        advance = self._advance
+        for _ in range(n_steps):
+            advance()
+        
+        self.update_plots()
+        self.last_viz_update = self.simulation_time
+        self.time_label.config(text=f"时间: {self.simulation_time:.2f} s")
+        
+    def _apply_buffer_size(self):
+        """Resize the history buffer between steps when the slider has moved"""
+        if self.requested_buffer_size != self.data_buffer_size:
+            self._resize_history(int(self.requested_buffer_size))
         
+    def _advance(self):
+        """Advance motor and controllers by one sample, without touching the GUI"""
         # Get three-phase currents from motor
         ia, ib, ic = self.motor.get_three_phase_currents()
         
@@ -299,138 +394,191 @@ class LiteMotorControlSimulation:
         if self.enable_flux_weakening:
             id_fw = self.flux_weakening.update(
                 self.motor.wr, 
-                foc_results['vd'], 
-                foc_results['vq'],
-                foc_results['iq_ref'],
+                foc_results.vd, 
+                foc_results.vq,
+                foc_results.iq_ref,
                 self.flux_weakening_method
             )
-            foc_results['id_ref'] = id_fw
+            foc_results = foc_results._replace(id_ref=id_fw)
         
         # Update motor with voltages
         motor_results = self.motor.update(
-            foc_results['vd'], 
-            foc_results['vq'], 
+            foc_results.vd, 
+            foc_results.vq, 
             self.load_torque
         )
         
-        # Store data (with limited buffer size)
-        self.data_history['time'].append(self.simulation_time)
-        self.data_history['id'].append(foc_results['id_actual'])
-        self.data_history['iq'].append(foc_results['iq_actual'])
-        self.data_history['speed'].append(motor_results['speed_rpm'])
-        self.data_history['torque'].append(motor_results['Te'])
-        self.data_history['vd'].append(foc_results['vd'])
-        self.data_history['vq'].append(foc_results['vq'])
-        
-        # Limit buffer size
-        for key in self.data_history:
-            if len(self.data_history[key]) > self.data_buffer_size:
-                self.data_history[key] = self.data_history[key][-self.data_buffer_size:]
-        
-        # Update visualization only at specified interval
-        if self.simulation_time - self.last_viz_update >= self.visualization_update_interval:
-            self.update_plots()
-            self.last_viz_update = self.simulation_time
+        # Store data, overwriting the oldest sample once the buffer is full
+        head = self._head
+        self._buf[:, head] = (
+            self.simulation_time,
+            foc_results.id_actual,
+            foc_results.iq_actual,
+            motor_results.speed_rpm,
+            motor_results.Te,
+            foc_results.vd,
+            foc_results.vq,
+        )
+        self._buf[:, head + self.data_buffer_size] = self._buf[:, head]
+        self._head = (head + 1) % self.data_buffer_size
+        self._count = min(self._count + 1, self.data_buffer_size)
         
         # Update time
         self.simulation_time += self.sample_time
-        self.time_label.config(text=f"时间: {self.simulation_time:.2f} s")
+        
+    def _ordered_views(self):
+        """Recorded samples per LiteSample field, oldest first, as views (no copy)"""
+        end = self._head + self.data_buffer_size
+        return self._buf[:, end - self._count:end]
+        
+    @property
+    def data_history(self):
+        """Recorded samples as a dict of column arrays, oldest first"""
+        return dict(zip(LiteSample._fields, self._ordered_views()))
+        
+    def _resize_history(self, buffer_size):
+        """Reallocate the history buffer, keeping the newest samples"""
+        columns = self._ordered_views()[:, -buffer_size:]
+        n = columns.shape[1]
+        self._buf = np.empty((len(LiteSample._fields), 2 * buffer_size), dtype=np.float32)
+        self._buf[:, :n] = columns
+        self._buf[:, buffer_size:buffer_size + n] = columns
+        self._count = n
+        self._head = n % buffer_size
+        self.data_buffer_size = buffer_size
         
     def toggle_fixed_axis(self):
         """Toggle fixed axis mode"""
         self.fixed_axis = self.fixed_axis_var.get()
-        self.update_plots()
-        
-    def update_plots(self):
-        """Update plots with current data"""
-        if len(self.data_history['time']) == 0:
-            return
-        
-        # Clear plots
-        self.ax_current.clear()
-        self.ax_speed.clear()
-        self.ax_voltage.clear()
-        self.ax_torque.clear()
-        
-        # Reconfigure plots
-        self.ax_current.set_title('d-q Axis Currents')
-        self.ax_current.set_xlabel('Time (s)')
-        self.ax_current.set_ylabel('Current (A)')
-        self.ax_current.grid(True)
-        
-        self.ax_speed.set_title('Motor Speed')
-        self.ax_speed.set_xlabel('Time (s)')
-        self.ax_speed.set_ylabel('Speed (RPM)')
-        self.ax_speed.grid(True)
-        
-        self.ax_voltage.set_title('d-q Axis Voltages')
-        self.ax_voltage.set_xlabel('Time (s)')
-        self.ax_voltage.set_ylabel('Voltage (V)')
-        self.ax_voltage.grid(True)
-        
-        self.ax_torque.set_title('Electromagnetic Torque')
-        self.ax_torque.set_xlabel('Time (s)')
-        self.ax_torque.set_ylabel('Torque (N.m)')
-        self.ax_torque.grid(True)
-        
-        # Set fixed axis ranges if enabled
         if self.fixed_axis:
             self.ax_current.set_ylim(-25, 25)
             self.ax_speed.set_ylim(-2000, 2000)
             self.ax_voltage.set_ylim(-50, 50)
             self.ax_torque.set_ylim(-15, 15)
+        self._invalidate_backgrounds()
+        self.update_plots()
         
-        # Plot data
-        self.ax_current.plot(self.data_history['time'], self.data_history['id'], 'b-', label='id')
-        self.ax_current.plot(self.data_history['time'], self.data_history['iq'], 'r-', label='iq')
-        self.ax_current.legend()
-        
-        self.ax_speed.plot(self.data_history['time'], self.data_history['speed'], 'g-', label='Speed')
-        speed_ref_rpm = self.speed_ref * 60 / (2 * np.pi)
-        self.ax_speed.axhline(y=speed_ref_rpm, color='g', linestyle='--', label='Ref')
-        self.ax_speed.legend()
+    def _invalidate_backgrounds(self, event=None):
+        """Force a full redraw on the next update"""
+        self._backgrounds = None
         
-        self.ax_voltage.plot(self.data_history['time'], self.data_history['vd'], 'b-', label='vd')
-        self.ax_voltage.plot(self.data_history['time'], self.data_history['vq'], 'r-', label='vq')
-        self.ax_voltage.legend()
+    def _within_limits(self, ax, y_range, t0, t1):
+        """Whether the shown time span and data range lie inside the axis limits"""
+        x0, x1 = ax.get_xlim()
+        if t0 < x0 or t1 > x1:
+            return False
+        if self.fixed_axis:
+            return True
+        y0, y1 = ax.get_ylim()
+        return y0 <= y_range[0] and y_range[1] <= y1
+        
+    def _fit_limits(self, ax, y_range, t0, t1):
+        """
+        Set limits with headroom around the data: 10% of its magnitude in y (unless the
+        axes are fixed) and twice the shown time span in x
+        """
+        if not self.fixed_axis:
+            y_min, y_max = y_range
+            pad = 0.1 * max(y_max - y_min, abs(y_min), abs(y_max)) or 1.0
+            ax.set_ylim(y_min - pad, y_max + pad)
+        ax.set_xlim(t0, t0 + 2 * max(t1 - t0, 1e-3))
         
-        self.ax_torque.plot(self.data_history['time'], self.data_history['torque'], 'm-', label='Torque')
-        self.ax_torque.legend()
+    def update_plots(self):
+        """
+        Update plots with current data
+        Only the data lines are redrawn over cached axis backgrounds; a full
+        redraw happens when the data leaves the current limits
+        """
+        # Nothing to show while the window is minimized or hidden
+        if not self.canvas.get_tk_widget().winfo_viewable():
+            return
         
-        # Redraw canvas
-        self.canvas.draw()
+        views = self._ordered_views()
+        
+        # More samples than pixels: plot min/max pairs per pixel column instead
+        width = int(self.ax_current.bbox.width)
+        if 0 < 2 * width < views.shape[1]:
+            t, id, iq, speed, torque, vd, vq = minmax_decimate(views, width)
+        else:
+            t, id, iq, speed, torque, vd, vq = views
+        self.id_line.set_data(t, id)
+        self.iq_line.set_data(t, iq)
+        self.speed_line.set_data(t, speed)
+        speed_ref_rpm = self.speed_ref * _RADS2RPM
+        self.speed_ref_line.set_ydata([speed_ref_rpm, speed_ref_rpm])
+        self.vd_line.set_data(t, vd)
+        self.vq_line.set_data(t, vq)
+        self.torque_line.set_data(t, torque)
+        
+        if self._count == 0:
+            # Nothing recorded (e.g. after a reset), show the empty axes
+            self._backgrounds = None
+            self.canvas.draw()
+            return
         
-    def simulation_loop(self):
-        """Main simulation loop with performance monitoring"""
-        last_time = time.time()
-        frame_count = 0
-        performance_check_interval = 1.0  # Check performance every second
+        # Data range of every axis from one min/max reduction over the buffer
+        col_min = views.min(axis=1).tolist()
+        col_max = views.max(axis=1).tolist()
+        y_ranges = [(min(col_min[j] for j in cols), max(col_max[j] for j in cols))
+                    for cols in self._axis_columns]
+        y_min, y_max = y_ranges[1]
+        y_ranges[1] = (min(y_min, speed_ref_rpm), max(y_max, speed_ref_rpm))
+        
+        t0, t1 = col_min[0], col_max[0]
+        if self._backgrounds is None or not all(
+                self._within_limits(ax, y_range, t0, t1)
+                for (ax, _), y_range in zip(self._axis_lines, y_ranges)):
+            for (ax, _), y_range in zip(self._axis_lines, y_ranges):
+                self._fit_limits(ax, y_range, t0, t1)
+            self.canvas.draw()
+            self._backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax, _ in self._axis_lines]
+        
+        for (ax, lines), background in zip(self._axis_lines, self._backgrounds):
+            self.canvas.restore_region(background)
+            for line in lines:
+                ax.draw_artist(line)
+            self.canvas.blit(ax.bbox)
+        
+    def _tick(self):
+        """
+        Simulation tick in the Tk thread: one visualization interval worth of
+        steps, one redraw, then reschedule against a monotonic deadline
+        """
+        self._tick_id = None
+        if not self.is_running:
+            return
         
-        while self.is_running:
-            start_time = time.time()
-            
-            # Execute simulation step
-            self.simulation_step()
-            
-            # Control simulation speed
-            elapsed = time.time() - start_time
-            sleep_time = max(0, self.sample_time / self.sim_speed_var.get() - elapsed)
-            time.sleep(sleep_time)
-            
-            # Performance monitoring
-            frame_count += 1
-            current_time = time.time()
-            if current_time - last_time >= performance_check_interval:
-                fps = frame_count / (current_time - last_time)
-                if fps < 10:
-                    self.performance_label.config(text=f"性能: 低 ({fps:.1f} FPS)")
-                elif fps < 20:
-                    self.performance_label.config(text=f"性能: 中 ({fps:.1f} FPS)")
-                else:
-                    self.performance_label.config(text=f"性能: 高 ({fps:.1f} FPS)")
-                
-                frame_count = 0
-                last_time = current_time
+        batch = max(1, int(round(self.visualization_update_interval / self.sample_time)))
+        self.simulation_batch(batch)
+        
+        # Performance monitoring (frames are redraws), checked every second
+        self._frame_count += 1
+        now = time.perf_counter()
+        if now - self._fps_start >= 1.0:
+            fps = self._frame_count / (now - self._fps_start)
+            if fps < 10:
+                self.performance_label.config(text=f"性能: 低 ({fps:.1f} FPS)")
+            elif fps < 20:
+                self.performance_label.config(text=f"性能: 中 ({fps:.1f} FPS)")
+            else:
+                self.performance_label.config(text=f"性能: 高 ({fps:.1f} FPS)")
+            self._frame_count = 0
+            self._fps_start = now
+        
+        # Control simulation speed
+        self._deadline += batch * self.sample_time / self.simulation_speed
+        remaining = self._deadline - now
+        if remaining < 0:
+            # Running behind, don't build up a backlog to catch up on
+            self._deadline -= remaining
+            remaining = 0.0
+        self._tick_id = self.root.after(int(remaining * 1000), self._tick)
+        
+    def _cancel_tick(self):
+        """Drop a scheduled simulation tick"""
+        if self._tick_id is not None:
+            self.root.after_cancel(self._tick_id)
+            self._tick_id = None
             
     def start_simulation(self):
         """Start the simulation"""
@@ -438,26 +586,28 @@ class LiteMotorControlSimulation:
             self.is_running = True
             self.status_label.config(text="运行中")
             
-            # Start simulation thread
-            self.sim_thread = threading.Thread(target=self.simulation_loop)
-            self.sim_thread.daemon = True
-            self.sim_thread.start()
+            # Start simulation ticks
+            self._deadline = self._fps_start = time.perf_counter()
+            self._frame_count = 0
+            self._tick_id = self.root.after(0, self._tick)
             
     def pause_simulation(self):
         """Pause the simulation"""
         self.is_running = False
+        self._cancel_tick()
         self.status_label.config(text="暂停")
         
     def reset_simulation(self):
         """Reset the simulation"""
         self.is_running = False
+        self._cancel_tick()
         self.status_label.config(text="就绪")
         
         # Reset time and data
         self.simulation_time = 0.0
         self.last_viz_update = 0.0
-        for key in self.data_history:
-            self.data_history[key].clear()
+        self._head = 0
+        self._count = 0
         
         # Reset components
         self.motor.reset_state()
@@ -540,13 +690,9 @@ class LiteMotorControlSimulation:
         
         if filename:
             try:
-                import pandas as pd
-                
-                # Create DataFrame
-                df = pd.DataFrame(self.data_history)
-                
-                # Save to CSV
-                df.to_csv(filename, index=False)
+                # Save the recorded samples straight to CSV, oldest first
+                np.savetxt(filename, self._ordered_views().T, fmt='%.7g', delimiter=',',
+                           header=','.join(LiteSample._fields), comments='')
                 
                 messagebox.showinfo("成功", "数据导出成功")
             except Exception as e:
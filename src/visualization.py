@@ -1,11 +1,40 @@
+import math
+from operator import itemgetter
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-import matplotlib.animation as animation
-from collections import deque
 import tkinter as tk
 from tkinter import ttk
+from numba_compat import njit
+from decimation import minmax_decimate
+
+# update_data keys, one row of the sample buffer each, and the matching get_plot_data names
+_DATA_KEYS = ('time', 'id', 'iq', 'id_ref', 'iq_ref', 'speed_rpm', 'speed_ref_rpm',
+              'dc_bus_voltage', 'dc_bus_current', 'torque', 'vd', 'vq')
+_PLOT_NAMES = ('time', 'id', 'iq', 'id_ref', 'iq_ref', 'speed', 'speed_ref',
+               'dc_bus_voltage', 'dc_bus_current', 'torque', 'vd', 'vq')
+_get_sample = itemgetter(*_DATA_KEYS)
+# Samples in the phasor plot's current trajectory
+_TRAJ_LEN = 100
+# update_parameter_data keys, rows 1.. of the parameter buffer after time
+_PARAM_KEYS = ('Rs', 'Ld', 'Lq', 'flux', 'J', 'B')
+
+@njit(cache=True, fastmath=True)
+def _polar_append(id_new, iq_new, traj, head):
+    """
+    Write the polar form of the current samples into the mirrored (angle,
+    magnitude) ring traj starting at slot head, in one pass
+    """
+    n = traj.shape[1] // 2
+    for k in range(id_new.shape[0]):
+        slot = (head + k) % n
+        angle = math.atan2(iq_new[k], id_new[k])
+        magnitude = math.hypot(id_new[k], iq_new[k])
+        traj[0, slot] = angle
+        traj[1, slot] = magnitude
+        traj[0, slot + n] = angle
+        traj[1, slot + n] = magnitude
 
 class MotorControlVisualization:
     """
@@ -13,24 +42,42 @@ class MotorControlVisualization:
     Provides plots for DC bus voltage, id, iq currents, and other parameters
     """
     
-    def __init__(self, master=None, buffer_size=1000):
-        """Initialize visualization system"""
+    def __init__(self, master=None, buffer_size=1000, blit=False, max_redraw_rate=30, decimation=1,
+                 persist_path=None):
+        """
+        Initialize visualization system
+        blit: redraw only the data lines on fixed axis limits, see _blit
+        max_redraw_rate: redraws per second at most, see request_redraw
+        decimation: update_data samples averaged into each buffered sample
+        persist_path: file to memory-map the sample buffer to, for buffers too
+        long to keep resident
+        """
         self.master = master
         self.buffer_size = buffer_size
-        
-        # Data buffers
-        self.time_buffer = deque(maxlen=buffer_size)
-        self.id_buffer = deque(maxlen=buffer_size)
-        self.iq_buffer = deque(maxlen=buffer_size)
-        self.id_ref_buffer = deque(maxlen=buffer_size)
-        self.iq_ref_buffer = deque(maxlen=buffer_size)
-        self.speed_buffer = deque(maxlen=buffer_size)
-        self.speed_ref_buffer = deque(maxlen=buffer_size)
-        self.dc_bus_voltage_buffer = deque(maxlen=buffer_size)
-        self.dc_bus_current_buffer = deque(maxlen=buffer_size)
-        self.torque_buffer = deque(maxlen=buffer_size)
-        self.vd_buffer = deque(maxlen=buffer_size)
-        self.vq_buffer = deque(maxlen=buffer_size)
+        self.blit = blit
+        self.max_redraw_rate = max_redraw_rate
+        self.decimation = decimation
+        
+        # Data buffer for update_data: one row per _DATA_KEYS entry. Every sample
+        # is written at head and head + buffer_size, so the newest samples are
+        # always one contiguous slice
+        shape = (len(_DATA_KEYS), 2 * buffer_size)
+        if persist_path is None:
+            self._buf = np.zeros(shape, dtype=np.float32)
+        else:
+            self._buf = np.memmap(persist_path, dtype=np.float32, mode='w+', shape=shape)
+        self._head = 0  # Next write position
+        self._filled = 0  # Number of valid samples
+        self._written = 0  # Samples buffered since the last clear
+        self._acc = np.zeros(len(_DATA_KEYS))  # Sum of the samples not buffered yet
+        self._acc_count = 0
+        
+        # Current trajectory as (angle, magnitude) rows, mirrored like _buf and
+        # extended only by the samples added since the last redraw
+        self._traj = np.zeros((2, 2 * _TRAJ_LEN), dtype=np.float32)
+        self._traj_head = 0
+        self._traj_filled = 0
+        self._traj_count = 0  # Sample count at the last trajectory update
         
         # Create matplotlib figure
         self.fig = Figure(figsize=(14, 8), dpi=100)
@@ -47,14 +94,49 @@ class MotorControlVisualization:
         # Initialize plots
         self.init_plots()
         
+        # Data lines per axis, the only artists redrawn when blitting
+        self._axis_lines = (
+            (self.ax_current, (self.id_line, self.iq_line, self.id_ref_line, self.iq_ref_line)),
+            (self.ax_voltage, (self.vd_line, self.vq_line)),
+            (self.ax_speed, (self.speed_line, self.speed_ref_line)),
+            (self.ax_dc_bus, (self.dc_voltage_line, self.dc_current_line)),
+            (self.ax_torque, (self.torque_line,)),
+            (self.ax_phasor, (self.current_phasor, self.current_trajectory))
+        )
+        self._lines_by_axis = dict(self._axis_lines)
+        # get_plot_data column of each time-series line, see update_plots
+        self._plot_table = (
+            (self.id_line, 'id'), (self.iq_line, 'iq'),
+            (self.id_ref_line, 'id_ref'), (self.iq_ref_line, 'iq_ref'),
+            (self.vd_line, 'vd'), (self.vq_line, 'vq'),
+            (self.speed_line, 'speed'), (self.speed_ref_line, 'speed_ref'),
+            (self.dc_voltage_line, 'dc_bus_voltage'), (self.dc_current_line, 'dc_bus_current'),
+            (self.torque_line, 'torque'),
+        )
+        self._backgrounds = None  # Cached axis backgrounds for blitting
+        self._save_bbox = None  # (figure size, bbox) from _tight_save_bbox
+        for ax, lines in self._axis_lines:
+            # Limits are always set explicitly, see _rescale and _blit
+            ax.set_autoscale_on(False)
+            for line in lines:
+                line.set_animated(blit)
+        
         # Create canvas if master is provided
         if master:
             self.canvas = FigureCanvasTkAgg(self.fig, master=master)
             self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            if blit:
+                # A resized canvas invalidates the cached backgrounds
+                self.canvas.mpl_connect('resize_event', self._invalidate_backgrounds)
         
-        # Animation
-        self.animation = None
+        # Simulation history buffer, see bind_buffer
+        self.hist = None
+        
+        # Animation, redrawn from the Tk event loop
+        self._animation_id = None  # Pending _animate callback
+        self.animation_interval = None
         self.is_animating = False
+        self._redraw_id = None  # Pending request_redraw callback
         
     def init_plots(self):
         """Initialize all plots"""
@@ -112,123 +194,277 @@ class MotorControlVisualization:
         
     def update_data(self, data):
         """Update data buffers with new measurements"""
-        current_time = data.get('time', 0)
-        
-        # Update buffers
-        self.time_buffer.append(current_time)
-        self.id_buffer.append(data.get('id', 0))
-        self.iq_buffer.append(data.get('iq', 0))
-        self.id_ref_buffer.append(data.get('id_ref', 0))
-        self.iq_ref_buffer.append(data.get('iq_ref', 0))
-        self.speed_buffer.append(data.get('speed_rpm', 0))
-        self.speed_ref_buffer.append(data.get('speed_ref_rpm', 0))
-        self.dc_bus_voltage_buffer.append(data.get('dc_bus_voltage', 0))
-        self.dc_bus_current_buffer.append(data.get('dc_bus_current', 0))
-        self.torque_buffer.append(data.get('torque', 0))
-        self.vd_buffer.append(data.get('vd', 0))
-        self.vq_buffer.append(data.get('vq', 0))
+        try:
+            sample = _get_sample(data)
+        except KeyError:
+            # Missing measurements are recorded as 0
+            sample = [data.get(key, 0) for key in _DATA_KEYS]
+        if self.decimation > 1:
+            # Buffer the mean of every decimation samples
+            self._acc += sample
+            self._acc_count += 1
+            if self._acc_count < self.decimation:
+                return
+            sample = self._acc / self._acc_count
+            self._acc[:] = 0.0
+            self._acc_count = 0
+        
+        # Update buffer
+        head = self._head
+        self._buf[:, head] = sample
+        self._buf[:, head + self.buffer_size] = self._buf[:, head]
+        self._head = (head + 1) % self.buffer_size
+        self._filled = min(self._filled + 1, self.buffer_size)
+        self._written += 1
+        
+        # While animating, the plots redraw on their own timer
+        if not self.is_animating:
+            self.request_redraw()
+        
+    def request_redraw(self):
+        """
+        Schedule update_plots after 1/max_redraw_rate seconds; requests made
+        before it runs are coalesced into that one redraw
+        """
+        if self._redraw_id is None and hasattr(self, 'canvas'):
+            self._redraw_id = self.master.after(int(1000 / self.max_redraw_rate), self._redraw)
+        
+    def _redraw(self):
+        """Run a requested redraw"""
+        self._redraw_id = None
+        self.update_plots()
+        
+    def bind_buffer(self, hist, count, fields):
+        """
+        Plot straight from a simulation history ring buffer instead of update_data
+        hist: (capacity, n_fields) sample rows, fields: column names of hist
+        count: one-element array holding the number of rows written so far
+        """
+        self.hist = hist
+        self.hist_count = count
+        self.hist_columns = {name: j for j, name in enumerate(fields)}
+        
+    def get_plot_data(self):
+        """Last buffer_size samples as a dict of arrays, from the bound buffer or update_data's"""
+        if self.hist is None:
+            end = self._head + self.buffer_size
+            return dict(zip(_PLOT_NAMES, self._buf[:, end - self._filled:end]))
+        
+        # Read the newest rows of the ring buffer in place
+        n = int(self.hist_count[0])
+        m = min(n, self.buffer_size, len(self.hist))
+        start = (n - m) % len(self.hist)
+        if start + m <= len(self.hist):
+            rows = self.hist[start:start + m]
+        else:
+            rows = np.take(self.hist, np.arange(start, start + m), axis=0, mode='wrap')
+        return {name: rows[:, j] for name, j in self.hist_columns.items()}
         
     def update_plots(self, frame=None):
         """Update all plots with current data"""
-        if len(self.time_buffer) == 0:
+        data = self.get_plot_data()
+        if len(data['time']) == 0:
             return []
+        # The phasor plot needs the newest raw samples
+        id_array, iq_array = data['id'], data['iq']
+        
+        # More than two samples per pixel column only adds rasterizing work
+        width = int(self.ax_current.bbox.width)
+        if 0 < 2 * width < len(data['time']):
+            data = dict(zip(data, minmax_decimate(np.array(list(data.values())), width)))
+        time_array = data['time']
+        
+        # Update the time-series plots
+        for line, name in self._plot_table:
+            line.set_data(time_array, data[name])
         
-        time_array = np.array(self.time_buffer)
-        
-        # Update current plot
-        self.id_line.set_data(time_array, np.array(self.id_buffer))
-        self.iq_line.set_data(time_array, np.array(self.iq_buffer))
-        self.id_ref_line.set_data(time_array, np.array(self.id_ref_buffer))
-        self.iq_ref_line.set_data(time_array, np.array(self.iq_ref_buffer))
-        self.ax_current.relim()
-        self.ax_current.autoscale_view()
-        
-        # Update voltage plot
-        self.vd_line.set_data(time_array, np.array(self.vd_buffer))
-        self.vq_line.set_data(time_array, np.array(self.vq_buffer))
-        self.ax_voltage.relim()
-        self.ax_voltage.autoscale_view()
-        
-        # Update speed plot
-        self.speed_line.set_data(time_array, np.array(self.speed_buffer))
-        self.speed_ref_line.set_data(time_array, np.array(self.speed_ref_buffer))
-        self.ax_speed.relim()
-        self.ax_speed.autoscale_view()
-        
-        # Update DC bus plot
-        self.dc_voltage_line.set_data(time_array, np.array(self.dc_bus_voltage_buffer))
-        self.dc_current_line.set_data(time_array, np.array(self.dc_bus_current_buffer))
-        self.ax_dc_bus.relim()
-        self.ax_dc_bus.autoscale_view()
-        
-        # Update torque plot
-        self.torque_line.set_data(time_array, np.array(self.torque_buffer))
-        self.ax_torque.relim()
-        self.ax_torque.autoscale_view()
-        
-        # Update phasor diagram
-        if len(self.id_buffer) > 0:
-            # Current phasor
-            current_magnitude = np.sqrt(self.id_buffer[-1]**2 + self.iq_buffer[-1]**2)
-            current_angle = np.arctan2(self.iq_buffer[-1], self.id_buffer[-1])
-            self.current_phasor.set_data([current_angle], [current_magnitude])
-            
-            # Current trajectory (last N points)
-            trajectory_length = min(100, len(self.id_buffer))
-            if trajectory_length > 1:
-                id_traj = np.array(list(self.id_buffer)[-trajectory_length:])
-                iq_traj = np.array(list(self.iq_buffer)[-trajectory_length:])
-                traj_magnitude = np.sqrt(id_traj**2 + iq_traj**2)
-                traj_angle = np.arctan2(iq_traj, id_traj)
-                self.current_trajectory.set_data(traj_angle, traj_magnitude)
-            
-            self.ax_phasor.relim()
-            self.ax_phasor.autoscale_view()
+        # Update phasor diagram: current phasor and trajectory (last N points)
+        traj_angle, traj_magnitude = self._update_trajectory(id_array, iq_array)
+        self.current_phasor.set_data(traj_angle[-1:], traj_magnitude[-1:])
+        if len(traj_angle) > 1:
+            self.current_trajectory.set_data(traj_angle, traj_magnitude)
+        
+        for ax, _ in self._axis_lines:
+            self._rescale(ax)
         
         # Redraw canvas if available
         if hasattr(self, 'canvas'):
-            self.canvas.draw()
+            if self.blit:
+                self._blit()
+            else:
+                self.canvas.draw()
         
         return [self.id_line, self.iq_line, self.id_ref_line, self.iq_ref_line,
                 self.vd_line, self.vq_line, self.speed_line, self.speed_ref_line,
                 self.dc_voltage_line, self.dc_current_line, self.torque_line,
                 self.current_phasor, self.current_trajectory]
     
+    def _update_trajectory(self, id_array, iq_array):
+        """
+        Convert the samples added since the last call to polar form and append
+        them to the trajectory ring; returns the (angle, magnitude) views
+        """
+        count = self._written if self.hist is None else int(self.hist_count[0])
+        new = count - self._traj_count
+        if new < 0:
+            # The data was cleared or the simulation reset
+            self._traj_head = self._traj_filled = 0
+            new = count
+        new = min(new, len(id_array), _TRAJ_LEN)
+        self._traj_count = count
+        
+        if new > 0:
+            _polar_append(id_array[-new:], iq_array[-new:], self._traj, self._traj_head)
+            self._traj_head = (self._traj_head + new) % _TRAJ_LEN
+            self._traj_filled = min(self._traj_filled + new, _TRAJ_LEN)
+        
+        end = self._traj_head + _TRAJ_LEN
+        return self._traj[:, end - self._traj_filled:end]
+        
+    def _rescale(self, ax):
+        """
+        Follow the line data without relim/autoscale_view: x spans the data and
+        y is refit with 5% headroom only when the data leaves the limits or
+        needs less than half of them; blitting keeps fixed limits instead
+        """
+        if self.blit:
+            return
+        data = [line.get_data() for line in self._lines_by_axis[ax] if len(line.get_data()[1]) > 0]
+        if not data:
+            return
+        polar = ax.name == 'polar'
+        y_min = 0.0 if polar else min(float(np.min(y)) for _, y in data)
+        y_max = max(float(np.max(y)) for _, y in data)
+        pad = 0.05 * max(y_max - y_min, abs(y_min), abs(y_max)) or 1.0
+        lo = y_min if polar else y_min - pad
+        y0, y1 = ax.get_ylim()
+        if y_min < y0 or y_max > y1 or y_max + pad - lo < 0.5 * (y1 - y0):
+            ax.set_ylim(lo, y_max + pad)
+        
+        # The polar theta axis always covers the full circle
+        if polar:
+            return
+        # Time is ascending, all lines of an axis share it
+        x = data[0][0]
+        if x[-1] > x[0]:
+            ax.set_xlim(x[0], x[-1])
+    
+    def _invalidate_backgrounds(self, event=None):
+        """Force a full redraw on the next update"""
+        self._backgrounds = None
+    
+    def _within_limits(self, ax, lines):
+        """Whether all line data lies inside the current axis limits"""
+        y0, y1 = ax.get_ylim()
+        x0, x1 = ax.get_xlim()
+        for line in lines:
+            x, y = line.get_data()
+            if len(y) == 0:
+                continue
+            if np.min(y) < y0 or np.max(y) > y1:
+                return False
+            # The polar theta axis always covers the full circle
+            if ax.name != 'polar' and (np.min(x) < x0 or np.max(x) > x1):
+                return False
+        return True
+    
+    def _fit_limits(self, ax, lines):
+        """
+        Set fixed limits with headroom around the line data: 10% in y and
+        twice the shown time span in x, so redraws can blit for a while
+        """
+        data = [line.get_data() for line in lines if len(line.get_data()[1]) > 0]
+        if not data:
+            return
+        # Reduce the float32 views line by line instead of joining them as float64
+        y_min = min(float(np.min(y)) for _, y in data)
+        y_max = max(float(np.max(y)) for _, y in data)
+        pad = 0.1 * (y_max - y_min) or 0.1 * abs(y_max) or 1.0
+        if ax.name == 'polar':
+            ax.set_ylim(0, y_max + pad)
+            return
+        ax.set_ylim(y_min - pad, y_max + pad)
+        # All lines of an axis share the time data
+        x = data[0][0]
+        x_min = float(np.min(x))
+        ax.set_xlim(x_min, x_min + 2 * max(float(np.max(x)) - x_min, 1e-3))
+    
+    def _blit(self):
+        """
+        Redraw only the data lines over cached axis backgrounds
+        Falls back to a full redraw when data leaves the fixed limits
+        """
+        if self._backgrounds is None or not all(
+                self._within_limits(ax, lines) for ax, lines in self._axis_lines):
+            for ax, lines in self._axis_lines:
+                self._fit_limits(ax, lines)
+            self.canvas.draw()
+            self._backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax, _ in self._axis_lines]
+        
+        for (ax, lines), background in zip(self._axis_lines, self._backgrounds):
+            self.canvas.restore_region(background)
+            for line in lines:
+                ax.draw_artist(line)
+            self.canvas.blit(ax.bbox)
+    
     def start_animation(self, interval=50):
         """Start real-time animation"""
         if not self.is_animating:
-            self.animation = animation.FuncAnimation(
-                self.fig, self.update_plots, interval=interval, blit=False
-            )
+            self.animation_interval = interval
             self.is_animating = True
+            if hasattr(self, 'canvas'):
+                self._animation_id = self.master.after(interval, self._animate)
+    
+    def _animate(self):
+        """Redraw one animation frame and schedule the next"""
+        self.update_plots()
+        self._animation_id = self.master.after(self.animation_interval, self._animate)
     
     def stop_animation(self):
         """Stop real-time animation"""
-        if self.animation:
-            self.animation.event_source.stop()
-            self.is_animating = False
+        if self._animation_id is not None:
+            self.master.after_cancel(self._animation_id)
+            self._animation_id = None
+        self.is_animating = False
     
     def clear_data(self):
         """Clear all data buffers"""
-        self.time_buffer.clear()
-        self.id_buffer.clear()
-        self.iq_buffer.clear()
-        self.id_ref_buffer.clear()
-        self.iq_ref_buffer.clear()
-        self.speed_buffer.clear()
-        self.speed_ref_buffer.clear()
-        self.dc_bus_voltage_buffer.clear()
-        self.dc_bus_current_buffer.clear()
-        self.torque_buffer.clear()
-        self.vd_buffer.clear()
-        self.vq_buffer.clear()
+        self._head = 0
+        self._filled = 0
+        self._written = 0
+        self._acc[:] = 0.0
+        self._acc_count = 0
+        if isinstance(self._buf, np.memmap):
+            self._buf.flush()
         
         # Clear plots
         self.update_plots()
     
+    def _tight_save_bbox(self):
+        """
+        Tight figure bbox for savefig, measured once per figure size instead of
+        on every save; 'tight' when the canvas has no renderer to measure with
+        """
+        size = tuple(self.fig.get_size_inches())
+        if self._save_bbox is None or self._save_bbox[0] != size:
+            if not hasattr(self.fig.canvas, 'get_renderer'):
+                return 'tight'
+            bbox = self.fig.get_tightbbox(self.fig.canvas.get_renderer())
+            self._save_bbox = (size, bbox.padded(0.1))
+        return self._save_bbox[1]
+    
     def save_figure(self, filename):
         """Save current figure to file"""
-        self.fig.savefig(filename, dpi=150, bbox_inches='tight')
+        # Animated (blitted) lines are skipped by a normal draw
+        lines = [line for _, axis_lines in self._axis_lines for line in axis_lines]
+        for line in lines:
+            line.set_animated(False)
+        self.fig.savefig(filename, dpi=150, bbox_inches=self._tight_save_bbox())
+        for line in lines:
+            line.set_animated(self.blit)
+        self._backgrounds = None
+        if isinstance(self._buf, np.memmap):
+            self._buf.flush()
 
 
 class ParameterVisualization:
@@ -236,20 +472,17 @@ class ParameterVisualization:
     Visualization system for parameter identification and adaptive control
     """
     
-    def __init__(self, master=None):
+    def __init__(self, master=None, buffer_size=1000):
         """Initialize parameter visualization"""
         self.master = master
+        self.buffer_size = buffer_size
         
-        # Data buffers
-        self.param_buffers = {
-            'Rs': deque(maxlen=1000),
-            'Ld': deque(maxlen=1000),
-            'Lq': deque(maxlen=1000),
-            'flux': deque(maxlen=1000),
-            'J': deque(maxlen=1000),
-            'B': deque(maxlen=1000)
-        }
-        self.time_buffer = deque(maxlen=1000)
+        # Data buffer: time, then one row per _PARAM_KEYS entry, mirrored like
+        # MotorControlVisualization._buf. Parameters missing from an update are NaN
+        self._buf = np.full((1 + len(_PARAM_KEYS), 2 * buffer_size), np.nan, dtype=np.float32)
+        self._head = 0  # Next write position
+        self._filled = 0  # Number of valid samples
+        self._received = set()  # Parameters seen since the last clear
         
         # Create matplotlib figure
         self.fig = Figure(figsize=(12, 8), dpi=100)
@@ -319,42 +552,46 @@ class ParameterVisualization:
     
     def update_parameter_data(self, time, parameters):
         """Update parameter data"""
-        self.time_buffer.append(time)
-        
-        for param, value in parameters.items():
-            if param in self.param_buffers:
-                self.param_buffers[param].append(value)
+        sample = [time] + [parameters.get(key, np.nan) for key in _PARAM_KEYS]
+        self._buf[:, self._head] = sample
+        self._buf[:, self._head + self.buffer_size] = sample
+        self._head = (self._head + 1) % self.buffer_size
+        self._filled = min(self._filled + 1, self.buffer_size)
+        self._received.update(key for key in parameters if key in _PARAM_KEYS)
     
     def update_plots(self):
         """Update all parameter plots"""
-        if len(self.time_buffer) == 0:
+        if self._filled == 0:
             return
         
-        time_array = np.array(self.time_buffer)
+        # Newest samples as views into the mirrored buffer
+        end = self._head + self.buffer_size
+        time_array, rs, ld, lq, flux, j, b = self._buf[:, end - self._filled:end]
+        received = self._received
         
         # Update resistance plot
-        if len(self.param_buffers['Rs']) > 0:
-            self.rs_line.set_data(time_array, np.array(self.param_buffers['Rs']))
+        if 'Rs' in received:
+            self.rs_line.set_data(time_array, rs)
             self.ax_resistance.relim()
             self.ax_resistance.autoscale_view()
         
         # Update inductance plot
-        if len(self.param_buffers['Ld']) > 0 and len(self.param_buffers['Lq']) > 0:
-            self.ld_line.set_data(time_array, np.array(self.param_buffers['Ld']))
-            self.lq_line.set_data(time_array, np.array(self.param_buffers['Lq']))
+        if 'Ld' in received and 'Lq' in received:
+            self.ld_line.set_data(time_array, ld)
+            self.lq_line.set_data(time_array, lq)
             self.ax_inductance.relim()
             self.ax_inductance.autoscale_view()
         
         # Update flux linkage plot
-        if len(self.param_buffers['flux']) > 0:
-            self.flux_line.set_data(time_array, np.array(self.param_buffers['flux']))
+        if 'flux' in received:
+            self.flux_line.set_data(time_array, flux)
             self.ax_flux.relim()
             self.ax_flux.autoscale_view()
         
         # Update mechanical parameters plot
-        if len(self.param_buffers['J']) > 0 and len(self.param_buffers['B']) > 0:
-            self.j_line.set_data(time_array, np.array(self.param_buffers['J']))
-            self.b_line.set_data(time_array, np.array(self.param_buffers['B']))
+        if 'J' in received and 'B' in received:
+            self.j_line.set_data(time_array, j)
+            self.b_line.set_data(time_array, b)
             self.ax_mechanical.relim()
             self.ax_mechanical.autoscale_view()
         
@@ -364,9 +601,9 @@ class ParameterVisualization:
     
     def clear_data(self):
         """Clear all data buffers"""
-        self.time_buffer.clear()
-        for buffer in self.param_buffers.values():
-            buffer.clear()
+        self._head = 0
+        self._filled = 0
+        self._received.clear()
         
         # Clear plots
         self.update_plots()
\ No newline at end of file
@@ -1,24 +1,40 @@
+from time import monotonic
+from operator import itemgetter
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-import matplotlib.animation as animation
-from collections import deque
 import tkinter as tk
 from tkinter import ttk
 
+# update_data keys, one row of the sample buffer each
+_DATA_KEYS = ('time', 'id', 'iq', 'id_ref', 'iq_ref', 'speed_rpm', 'speed_ref_rpm',
+              'dc_bus_voltage', 'dc_bus_current', 'torque', 'vd', 'vq')
+_MINIMAL_KEYS = ('time', 'id', 'iq', 'speed_rpm')
+_get_sample = itemgetter(*_DATA_KEYS)
+_get_minimal_sample = itemgetter(*_MINIMAL_KEYS)
+
 class OptimizedMotorControlVisualization:
     """
     Optimized visualization system for motor control with performance options
     """
     
-    def __init__(self, master=None, buffer_size=500, update_interval=0.1, enable_animation=False, fixed_axis=False):
-        """Initialize optimized visualization system"""
+    def __init__(self, master=None, buffer_size=500, update_interval=0.1, enable_animation=False, fixed_axis=False,
+                 blit=False, max_redraw_rate=30, noise_floor=0.0):
+        """
+        Initialize optimized visualization system
+        blit: redraw only the data lines over cached axis backgrounds, see _blit
+        max_redraw_rate: redraws per second at most, see request_redraw
+        noise_floor: measurement change below which samples are merged, see update_data
+        """
         self.master = master
         self.buffer_size = buffer_size
         self.update_interval = update_interval
         self.enable_animation = enable_animation
         self.fixed_axis = fixed_axis
+        self.blit = blit
+        self.max_redraw_rate = max_redraw_rate
+        self.noise_floor = noise_floor
         
         # Fixed axis ranges for better visualization
         self.current_limits = [-25, 25]  # Current range in Amperes
@@ -26,23 +42,21 @@ class OptimizedMotorControlVisualization:
         self.speed_limits = [-2000, 2000]  # Speed range in RPM
         self.torque_limits = [-15, 15]  # Torque range in N.m
         
-        # Data buffers (smaller size for performance)
-        self.time_buffer = deque(maxlen=buffer_size)
-        self.id_buffer = deque(maxlen=buffer_size)
-        self.iq_buffer = deque(maxlen=buffer_size)
-        self.id_ref_buffer = deque(maxlen=buffer_size)
-        self.iq_ref_buffer = deque(maxlen=buffer_size)
-        self.speed_buffer = deque(maxlen=buffer_size)
-        self.speed_ref_buffer = deque(maxlen=buffer_size)
-        self.dc_bus_voltage_buffer = deque(maxlen=buffer_size)
-        self.dc_bus_current_buffer = deque(maxlen=buffer_size)
-        self.torque_buffer = deque(maxlen=buffer_size)
-        self.vd_buffer = deque(maxlen=buffer_size)
-        self.vq_buffer = deque(maxlen=buffer_size)
+        # Data buffer (smaller size for performance): one row per _DATA_KEYS
+        # entry. Every sample is written at head and head + buffer_size, so the
+        # newest samples are always one contiguous slice
+        self._buf = np.zeros((len(_DATA_KEYS), 2 * buffer_size), dtype=np.float32)
+        self._head = 0  # Next write position
+        self._filled = 0  # Number of valid samples
+        self._written = 0  # Samples buffered since the last clear
+        self._plotted = -1  # _written when the lines were last given data
+        self._last_row = np.zeros(len(_DATA_KEYS), dtype=np.float32)  # Last sample that changed
+        self._holding = False  # Newest sample is within noise_floor of _last_row
         
         # Performance tracking
         self.last_update_time = 0
-        self.update_counter = 0
+        self.update_counter = 0  # Redraws since last_fps_time
+        self.last_fps_time = monotonic()
         self.fps = 0
         
         # Create matplotlib figure with optimized settings
@@ -59,14 +73,43 @@ class OptimizedMotorControlVisualization:
         # Initialize plots
         self.init_plots()
         
+        # Data lines per axis, the only artists redrawn when blitting
+        self._axis_lines = (
+            (self.ax_current, (self.id_line, self.iq_line, self.id_ref_line, self.iq_ref_line)),
+            (self.ax_voltage, (self.vd_line, self.vq_line)),
+            (self.ax_speed, (self.speed_line, self.speed_ref_line)),
+            (self.ax_torque, (self.torque_line,)),
+        )
+        self._lines_by_axis = dict(self._axis_lines)
+        # Buffer row of each line, see update_plots
+        self._plot_table = tuple((line, _DATA_KEYS.index(key)) for line, key in (
+            (self.id_line, 'id'), (self.iq_line, 'iq'),
+            (self.id_ref_line, 'id_ref'), (self.iq_ref_line, 'iq_ref'),
+            (self.vd_line, 'vd'), (self.vq_line, 'vq'),
+            (self.speed_line, 'speed_rpm'), (self.speed_ref_line, 'speed_ref_rpm'),
+            (self.torque_line, 'torque'),
+        ))
+        self._backgrounds = None  # Cached axis backgrounds for blitting
+        self._save_bbox = None  # (figure size, bbox) from _tight_save_bbox
+        for ax, lines in self._axis_lines:
+            # Limits are always set explicitly, see _rescale and _blit
+            ax.set_autoscale_on(False)
+            for line in lines:
+                line.set_animated(blit)
+        
         # Create canvas if master is provided
         if master:
             self.canvas = FigureCanvasTkAgg(self.fig, master=master)
             self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            if blit:
+                # A resized canvas invalidates the cached backgrounds
+                self.canvas.mpl_connect('resize_event', self._invalidate_backgrounds)
         
-        # Animation (optional)
-        self.animation = None
+        # Animation (optional), redrawn from the Tk event loop
+        self._animation_id = None  # Pending _animate callback
+        self.animation_interval = None
         self.is_animating = False
+        self._redraw_id = None  # Pending request_redraw callback
         
     def init_plots(self):
         """Initialize all plots with performance optimizations"""
@@ -108,104 +151,195 @@ class OptimizedMotorControlVisualization:
         self.ax_torque.legend(loc='upper right', fontsize=8)
         
     def update_data(self, data):
-        """Update data buffers with new measurements"""
+        """
+        Update data buffers with new measurements
+        While every measurement stays within noise_floor of the last sample that
+        changed, the newest sample is replaced in place instead of appended, so
+        an idle motor extends one flat segment rather than filling the buffer
+        """
         current_time = data.get('time', 0)
         
         # Only update if enough time has passed (for performance)
         if current_time - self.last_update_time < self.update_interval:
             return False
         
-        # Update buffers
-        self.time_buffer.append(current_time)
-        self.id_buffer.append(data.get('id', 0))
-        self.iq_buffer.append(data.get('iq', 0))
-        self.id_ref_buffer.append(data.get('id_ref', 0))
-        self.iq_ref_buffer.append(data.get('iq_ref', 0))
-        self.speed_buffer.append(data.get('speed_rpm', 0))
-        self.speed_ref_buffer.append(data.get('speed_ref_rpm', 0))
-        self.dc_bus_voltage_buffer.append(data.get('dc_bus_voltage', 0))
-        self.dc_bus_current_buffer.append(data.get('dc_bus_current', 0))
-        self.torque_buffer.append(data.get('torque', 0))
-        self.vd_buffer.append(data.get('vd', 0))
-        self.vq_buffer.append(data.get('vq', 0))
+        try:
+            sample = _get_sample(data)
+        except KeyError:
+            # Missing measurements are recorded as 0
+            sample = [data.get(key, 0) for key in _DATA_KEYS]
+        quiet = (self.noise_floor > 0 and self._filled > 0 and
+                 np.all(np.abs(np.subtract(sample[1:], self._last_row[1:])) < self.noise_floor))
+        
+        # Update buffer
+        if quiet and self._holding:
+            head = (self._head - 1) % self.buffer_size
+        else:
+            head = self._head
+            self._head = (head + 1) % self.buffer_size
+            self._filled = min(self._filled + 1, self.buffer_size)
+            if not quiet:
+                self._last_row[:] = sample
+            self._holding = quiet
+        self._buf[:, head] = sample
+        self._buf[:, head + self.buffer_size] = self._buf[:, head]
+        self._written += 1
         
         self.last_update_time = current_time
-        self.update_counter += 1
+        
+        # While animating, the plots redraw on their own timer
+        if not self.is_animating:
+            self.request_redraw()
         
         return True
         
+    def request_redraw(self):
+        """
+        Schedule update_plots after 1/max_redraw_rate seconds; requests made
+        before it runs are coalesced into that one redraw
+        """
+        if self._redraw_id is None and hasattr(self, 'canvas'):
+            self._redraw_id = self.master.after(int(1000 / self.max_redraw_rate), self._redraw)
+        
+    def _redraw(self):
+        """Run a requested redraw"""
+        self._redraw_id = None
+        self.update_plots()
+        
+    def get_plot_data(self):
+        """Buffered samples, oldest first, as one view per _DATA_KEYS entry (no copy)"""
+        end = self._head + self.buffer_size
+        return self._buf[:, end - self._filled:end]
+        
     def update_plots(self, frame=None):
         """Update all plots with current data"""
-        if len(self.time_buffer) == 0:
+        if self._filled == 0:
             return []
         
-        # Calculate FPS for performance monitoring
-        import time
-        current_time = time.time()
-        if hasattr(self, 'last_fps_time'):
-            dt = current_time - self.last_fps_time
-            if dt > 0:
-                self.fps = self.update_counter / dt
-        self.last_fps_time = current_time
-        self.update_counter = 0
-        
-        time_array = np.array(self.time_buffer)
-        
-        # Update current plot
-        self.id_line.set_data(time_array, np.array(self.id_buffer))
-        self.iq_line.set_data(time_array, np.array(self.iq_buffer))
-        self.id_ref_line.set_data(time_array, np.array(self.id_ref_buffer))
-        self.iq_ref_line.set_data(time_array, np.array(self.iq_ref_buffer))
-        
-        if self.fixed_axis:
-            self.ax_current.set_ylim(self.current_limits)
-        else:
-            self.ax_current.relim()
-            self.ax_current.autoscale_view()
-        
-        # Update voltage plot
-        self.vd_line.set_data(time_array, np.array(self.vd_buffer))
-        self.vq_line.set_data(time_array, np.array(self.vq_buffer))
-        
-        if self.fixed_axis:
-            self.ax_voltage.set_ylim(self.voltage_limits)
-        else:
-            self.ax_voltage.relim()
-            self.ax_voltage.autoscale_view()
-        
-        # Update speed plot
-        self.speed_line.set_data(time_array, np.array(self.speed_buffer))
-        self.speed_ref_line.set_data(time_array, np.array(self.speed_ref_buffer))
-        
-        if self.fixed_axis:
-            self.ax_speed.set_ylim(self.speed_limits)
-        else:
-            self.ax_speed.relim()
-            self.ax_speed.autoscale_view()
-        
-        # Update torque plot
-        self.torque_line.set_data(time_array, np.array(self.torque_buffer))
-        
-        if self.fixed_axis:
-            self.ax_torque.set_ylim(self.torque_limits)
-        else:
-            self.ax_torque.relim()
-            self.ax_torque.autoscale_view()
+        # Calculate FPS for performance monitoring, smoothed over 0.5 s windows
+        self.update_counter += 1
+        now = monotonic()
+        dt = now - self.last_fps_time
+        if dt > 0.5:
+            rate = self.update_counter / dt
+            self.fps = 0.9 * self.fps + 0.1 * rate if self.fps else rate
+            self.last_fps_time = now
+            self.update_counter = 0
+        
+        # set_data copies and re-validates both arrays, so lines only get
+        # data when samples arrived since the last frame (timer frames while
+        # paused or between samples leave them as they are)
+        if self._written != self._plotted:
+            self._plotted = self._written
+            data = self.get_plot_data()
+            time_array = data[0]
+            for line, row in self._plot_table:
+                line.set_data(time_array, data[row])
+        
+        limits = (self.current_limits, self.voltage_limits, self.speed_limits, self.torque_limits)
+        for (ax, _), ax_limits in zip(self._axis_lines, limits):
+            self._rescale(ax, ax_limits)
         
         # Redraw canvas if available
         if hasattr(self, 'canvas'):
-            self.canvas.draw_idle()  # Use draw_idle for better performance
+            if self.blit:
+                self._blit()
+            else:
+                self.canvas.draw_idle()  # Use draw_idle for better performance
         
         return [self.id_line, self.iq_line, self.id_ref_line, self.iq_ref_line,
                 self.vd_line, self.vq_line, self.speed_line, self.speed_ref_line,
                 self.torque_line]
     
+    def _rescale(self, ax, limits):
+        """
+        Apply the fixed y range, and follow the line data without
+        relim/autoscale_view: x spans the data, y (unless fixed) is refit with
+        5% headroom only when the data leaves the limits or needs less than
+        half of them; blitting fits its own limits in _blit instead
+        """
+        if self.fixed_axis:
+            ax.set_ylim(limits)
+        if self.blit:
+            return
+        data = [line.get_data() for line in self._lines_by_axis[ax] if len(line.get_data()[1]) > 0]
+        if not data:
+            return
+        if not self.fixed_axis:
+            y_min = min(float(np.min(y)) for _, y in data)
+            y_max = max(float(np.max(y)) for _, y in data)
+            pad = 0.05 * max(y_max - y_min, abs(y_min), abs(y_max)) or 1.0
+            y0, y1 = ax.get_ylim()
+            if y_min < y0 or y_max > y1 or 2 * pad + y_max - y_min < 0.5 * (y1 - y0):
+                ax.set_ylim(y_min - pad, y_max + pad)
+        # Time is ascending, all lines of an axis share it
+        x = data[0][0]
+        if x[-1] > x[0]:
+            ax.set_xlim(x[0], x[-1])
+    
+    def _invalidate_backgrounds(self, event=None):
+        """Force a full redraw on the next update"""
+        self._backgrounds = None
+    
+    def _within_limits(self, ax, lines):
+        """Whether all line data lies inside the current axis limits"""
+        x0, x1 = ax.get_xlim()
+        y0, y1 = ax.get_ylim()
+        for line in lines:
+            x, y = line.get_data()
+            if len(y) == 0:
+                continue
+            if np.min(x) < x0 or np.max(x) > x1:
+                return False
+            if not self.fixed_axis and (np.min(y) < y0 or np.max(y) > y1):
+                return False
+        return True
+    
+    def _fit_limits(self, ax, lines):
+        """
+        Set limits with headroom around the line data: 10% of its magnitude in y
+        (unless the axes are fixed) and twice the shown time span in x
+        """
+        data = [line.get_data() for line in lines if len(line.get_data()[1]) > 0]
+        if not data:
+            return
+        if not self.fixed_axis:
+            # Reduce the float32 views line by line instead of joining them as float64
+            y_min = min(float(np.min(y)) for _, y in data)
+            y_max = max(float(np.max(y)) for _, y in data)
+            pad = 0.1 * max(y_max - y_min, abs(y_min), abs(y_max)) or 1.0
+            ax.set_ylim(y_min - pad, y_max + pad)
+        # All lines of an axis share the time data
+        x = data[0][0]
+        x_min = float(np.min(x))
+        ax.set_xlim(x_min, x_min + 2 * max(float(np.max(x)) - x_min, 1e-3))
+    
+    def _blit(self):
+        """
+        Redraw only the data lines over cached axis backgrounds
+        Falls back to a full redraw when data leaves the current limits
+        """
+        if self._backgrounds is None or not all(
+                self._within_limits(ax, lines) for ax, lines in self._axis_lines):
+            for ax, lines in self._axis_lines:
+                self._fit_limits(ax, lines)
+            self.canvas.draw()
+            self._backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax, _ in self._axis_lines]
+        
+        for (ax, lines), background in zip(self._axis_lines, self._backgrounds):
+            self.canvas.restore_region(background)
+            for line in lines:
+                ax.draw_artist(line)
+            self.canvas.blit(ax.bbox)
+    
     def set_fixed_axis(self, fixed=True):
         """Enable or disable fixed axis mode"""
         self.fixed_axis = fixed
+        self._backgrounds = None
     
     def set_axis_limits(self, current=None, voltage=None, speed=None, torque=None):
         """Set custom axis limits"""
+        self._backgrounds = None
         if current is not None:
             self.current_limits = current
         if voltage is not None:
@@ -218,44 +352,63 @@ class OptimizedMotorControlVisualization:
     def start_animation(self, interval=100):
         """Start real-time animation (if enabled)"""
         if self.enable_animation and not self.is_animating:
-            self.animation = animation.FuncAnimation(
-                self.fig, self.update_plots, interval=interval, blit=False
-            )
+            self.animation_interval = interval
             self.is_animating = True
+            if hasattr(self, 'canvas'):
+                self._animation_id = self.master.after(interval, self._animate)
+    
+    def _animate(self):
+        """Redraw one animation frame and schedule the next"""
+        self.update_plots()
+        self._animation_id = self.master.after(self.animation_interval, self._animate)
     
     def stop_animation(self):
         """Stop real-time animation"""
-        if self.animation:
-            self.animation.event_source.stop()
-            self.is_animating = False
+        if self._animation_id is not None:
+            self.master.after_cancel(self._animation_id)
+            self._animation_id = None
+        self.is_animating = False
     
     def clear_data(self):
         """Clear all data buffers"""
-        self.time_buffer.clear()
-        self.id_buffer.clear()
-        self.iq_buffer.clear()
-        self.id_ref_buffer.clear()
-        self.iq_ref_buffer.clear()
-        self.speed_buffer.clear()
-        self.speed_ref_buffer.clear()
-        self.dc_bus_voltage_buffer.clear()
-        self.dc_bus_current_buffer.clear()
-        self.torque_buffer.clear()
-        self.vd_buffer.clear()
-        self.vq_buffer.clear()
+        self._head = 0
+        self._filled = 0
+        self._written = 0
+        self._plotted = -1
+        self._holding = False
         
         # Clear plots
         self.update_plots()
     
+    def _tight_save_bbox(self):
+        """
+        Tight figure bbox for savefig, measured once per figure size instead of
+        on every save; 'tight' when the canvas has no renderer to measure with
+        """
+        size = tuple(self.fig.get_size_inches())
+        if self._save_bbox is None or self._save_bbox[0] != size:
+            if not hasattr(self.fig.canvas, 'get_renderer'):
+                return 'tight'
+            bbox = self.fig.get_tightbbox(self.fig.canvas.get_renderer())
+            self._save_bbox = (size, bbox.padded(0.1))
+        return self._save_bbox[1]
+    
     def save_figure(self, filename):
         """Save current figure to file"""
-        self.fig.savefig(filename, dpi=100, bbox_inches='tight')
+        # Animated (blitted) lines are skipped by a normal draw
+        lines = [line for _, axis_lines in self._axis_lines for line in axis_lines]
+        for line in lines:
+            line.set_animated(False)
+        self.fig.savefig(filename, dpi=100, bbox_inches=self._tight_save_bbox())
+        for line in lines:
+            line.set_animated(self.blit)
+        self._backgrounds = None
     
     def get_performance_info(self):
         """Get performance information"""
         return {
             'fps': self.fps,
-            'buffer_size': len(self.time_buffer),
+            'buffer_size': self._filled,
             'max_buffer_size': self.buffer_size
         }
 
@@ -270,11 +423,10 @@ class MinimalVisualization:
         self.master = master
         self.buffer_size = buffer_size
         
-        # Data buffers (minimal size)
-        self.time_buffer = deque(maxlen=buffer_size)
-        self.id_buffer = deque(maxlen=buffer_size)
-        self.iq_buffer = deque(maxlen=buffer_size)
-        self.speed_buffer = deque(maxlen=buffer_size)
+        # Data buffer (minimal size), mirrored as in OptimizedMotorControlVisualization
+        self._buf = np.zeros((len(_MINIMAL_KEYS), 2 * buffer_size), dtype=np.float32)
+        self._head = 0  # Next write position
+        self._filled = 0  # Number of valid samples
         
         # Create matplotlib figure with minimal settings
         self.fig = Figure(figsize=(8, 4), dpi=60)
@@ -287,6 +439,19 @@ class MinimalVisualization:
         # Initialize plots
         self.init_plots()
         
+        # Lines per axis and the buffer row of each line, as in
+        # OptimizedMotorControlVisualization
+        self._axis_lines = (
+            (self.ax_current, (self.id_line, self.iq_line)),
+            (self.ax_speed, (self.speed_line,)),
+        )
+        self._plot_table = tuple((line, _MINIMAL_KEYS.index(key)) for line, key in (
+            (self.id_line, 'id'), (self.iq_line, 'iq'), (self.speed_line, 'speed_rpm'),
+        ))
+        for ax, _ in self._axis_lines:
+            # Limits are always set explicitly, see _rescale
+            ax.set_autoscale_on(False)
+        
         # Create canvas if master is provided
         if master:
             self.canvas = FigureCanvasTkAgg(self.fig, master=master)
@@ -313,39 +478,52 @@ class MinimalVisualization:
     
     def update_data(self, data):
         """Update data buffers"""
-        current_time = data.get('time', 0)
-        
-        self.time_buffer.append(current_time)
-        self.id_buffer.append(data.get('id', 0))
-        self.iq_buffer.append(data.get('iq', 0))
-        self.speed_buffer.append(data.get('speed_rpm', 0))
+        head = self._head
+        try:
+            sample = _get_minimal_sample(data)
+        except KeyError:
+            # Missing measurements are recorded as 0
+            sample = [data.get(key, 0) for key in _MINIMAL_KEYS]
+        self._buf[:, head] = sample
+        self._buf[:, head + self.buffer_size] = self._buf[:, head]
+        self._head = (head + 1) % self.buffer_size
+        self._filled = min(self._filled + 1, self.buffer_size)
     
     def update_plots(self):
         """Update minimal plots"""
-        if len(self.time_buffer) == 0:
+        if self._filled == 0:
             return
         
-        time_array = np.array(self.time_buffer)
-        
-        # Update current plot
-        self.id_line.set_data(time_array, np.array(self.id_buffer))
-        self.iq_line.set_data(time_array, np.array(self.iq_buffer))
-        self.ax_current.relim()
-        self.ax_current.autoscale_view()
-        
-        # Update speed plot
-        self.speed_line.set_data(time_array, np.array(self.speed_buffer))
-        self.ax_speed.relim()
-        self.ax_speed.autoscale_view()
+        end = self._head + self.buffer_size
+        data = self._buf[:, end - self._filled:end]
+        time_array = data[0]
+        for line, row in self._plot_table:
+            line.set_data(time_array, data[row])
+        for ax, lines in self._axis_lines:
+            self._rescale(ax, lines)
         
         # Redraw canvas
         if hasattr(self, 'canvas'):
             self.canvas.draw_idle()
     
+    def _rescale(self, ax, lines):
+        """
+        Follow the line data without relim/autoscale_view, with the same
+        hysteresis as OptimizedMotorControlVisualization._rescale
+        """
+        y = [line.get_data()[1] for line in lines]
+        y_min = min(float(np.min(values)) for values in y)
+        y_max = max(float(np.max(values)) for values in y)
+        pad = 0.05 * max(y_max - y_min, abs(y_min), abs(y_max)) or 1.0
+        y0, y1 = ax.get_ylim()
+        if y_min < y0 or y_max > y1 or 2 * pad + y_max - y_min < 0.5 * (y1 - y0):
+            ax.set_ylim(y_min - pad, y_max + pad)
+        x = lines[0].get_data()[0]
+        if x[-1] > x[0]:
+            ax.set_xlim(x[0], x[-1])
+    
     def clear_data(self):
         """Clear all data buffers"""
-        self.time_buffer.clear()
-        self.id_buffer.clear()
-        self.iq_buffer.clear()
-        self.speed_buffer.clear()
+        self._head = 0
+        self._filled = 0
         self.update_plots()
\ No newline at end of file
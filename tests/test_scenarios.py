@@ -1,7 +1,10 @@
+import math
+import json
 import numpy as np
 import matplotlib.pyplot as plt
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -12,13 +15,114 @@ from flux_weakening import FluxWeakeningController
 from self_learning import MotorParameterIdentification
 from disturbance_rejection import DisturbanceRejectionController
 
+_RPM2RADS = 2 * math.pi / 60.0
+_RADS2RPM = 60.0 / (2 * math.pi)
+
+# Samples per plotted trace at most, a few per pixel column of the result figures
+_PLOT_POINTS = 4000
+
+# Default motor parameters, for the controller checks that vary them
+_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', 'config', 'motor_params.json')
+
+
+def _config_params(**overrides):
+    """The default motor parameters as a fresh dict, with overrides applied"""
+    with open(_CONFIG_PATH, 'r') as f:
+        return dict(json.load(f), **overrides)
+
+
+def test_salient_flux_weakening():
+    """Interior PMSM (Ld < Lq): finite MTPA references, lookup matches the batch MTPA"""
+    fw = FluxWeakeningController(params=_config_params(Ld=0.0015, Lq=0.003))
+    wr, torque_ref = 0.5 * fw.base_speed, 2.0
+    id_ref, iq_ref = fw.get_optimal_current_references(wr, torque_ref)
+    assert math.isfinite(id_ref) and math.isfinite(iq_ref), (id_ref, iq_ref)
+    assert id_ref < 0.0 < iq_ref, (id_ref, iq_ref)
+    assert math.hypot(id_ref, iq_ref) <= fw.max_current * (1 + 1e-12)
+    id_batch, iq_batch = fw.get_optimal_current_references_batch([wr], [torque_ref])
+    np.testing.assert_allclose([id_batch[0], iq_batch[0]], [id_ref, iq_ref], rtol=1e-12)
+    
+    # The lookup table interpolates the batch MTPA over (wr, iq_ref)
+    id_lut = fw.update(wr, 0.0, 0.0, 0.0, 'lookup')
+    id_zero, _ = fw.get_optimal_current_references_batch([wr], [0.0])
+    np.testing.assert_allclose(id_lut, id_zero[0], rtol=1e-9, atol=1e-12)
+    assert np.isfinite(fw._id_fw_table).all()
+    
+    # Reverse saliency (Ld > Lq) still constructs, only the MTPA refuses it
+    reverse = FluxWeakeningController(params=_config_params(Ld=0.0024, Lq=0.002))
+    assert reverse.update(wr, 0.0, 0.0, 0.0, 'speed') == 0.0
+    try:
+        reverse.update(wr, 0.0, 0.0, 0.0, 'lookup')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("reverse saliency lookup did not raise ValueError")
+
+
+def test_flux_weakening_reload():
+    """Reloading parameters must rebuild the flux weakening lookup table"""
+    params = _config_params()
+    weakened = _config_params(flux_linkage=0.8 * params['flux_linkage'])
+    fw = FluxWeakeningController(params=params)
+    wr, iq_ref = 2.0 * fw.base_speed, 0.5 * fw.max_current
+    
+    id_before = fw.update(wr, 0.0, 0.0, iq_ref, 'lookup')
+    fw.load_parameters(_CONFIG_PATH, weakened)
+    id_after = fw.update(wr, 0.0, 0.0, iq_ref, 'lookup')
+    id_fresh = FluxWeakeningController(params=weakened).update(wr, 0.0, 0.0, iq_ref, 'lookup')
+    
+    assert not math.isclose(id_after, id_before, rel_tol=1e-6), \
+        "lookup table not rebuilt on parameter reload"
+    np.testing.assert_allclose(id_after, id_fresh, rtol=1e-12,
+                               err_msg="reloaded lookup table differs from a fresh controller's")
+
+
+# Controller checks without figures, run by run_all_tests after the scenarios
+_CHECKS = (test_salient_flux_weakening, test_flux_weakening_reload)
+
+
+def _run_test(name, test_duration, dpi):
+    """
+    Run one test scenario on a fresh TestScenarios
+    Module level so a worker process of run_all_tests can call it
+    """
+    tests = TestScenarios(dpi=dpi)
+    tests.test_duration = test_duration
+    getattr(tests, name)()
+    tests.cleanup()
+
+
 class TestScenarios:
     """
     Test scenarios for validating motor control algorithms
     """
     
-    def __init__(self):
-        """Initialize test scenarios"""
+    # Test methods run by run_all_tests, in order
+    TESTS = ('run_speed_control_test', 'run_flux_weakening_test',
+             'run_parameter_identification_test', 'run_disturbance_rejection_test')
+    
+    def __init__(self, interactive=False, dpi=100):
+        """
+        Initialize test scenarios
+        interactive: show each result figure; otherwise it is only saved,
+        rendered with the non-interactive Agg backend
+        dpi: resolution of the saved result figures
+        """
+        self.interactive = interactive
+        self.dpi = dpi
+        if not interactive:
+            plt.switch_backend('Agg')
+        self._fig = None  # Result figure reused by every test, see _result_figure
+        self._lines = {}  # test name -> (num_steps, {signal: Line2D}) shown by self._fig
+        
+        # Result figures go next to this file, whatever the working directory
+        self._results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(self._results_dir, exist_ok=True)
+        # savefig of the last result figure, overlapped with the next test's loop
+        self._saver = ThreadPoolExecutor(max_workers=1)
+        self._pending_save = None
+        
         self.motor = PMSMModel()
         self.foc_controller = FOCController()
         self.flux_weakening = FluxWeakeningController()
@@ -29,6 +133,67 @@ class TestScenarios:
         self.sample_time = self.motor.sample_time
         self.test_duration = 2.0  # seconds
         
+    def _result_figure(self, figsize, nrows, ncols):
+        """
+        Clear the shared result figure for a test and lay out its axes
+        Returns the figure and its axes, in subplot order
+        """
+        self._wait_for_save()
+        if self._fig is None or not plt.fignum_exists(self._fig.number):
+            # First test, or the previous figure window was closed
+            self._fig = plt.figure(figsize=figsize)
+        else:
+            self._fig.clear()
+            self._fig.set_size_inches(figsize)
+        self._lines.clear()
+        return self._fig, self._fig.subplots(nrows, ncols, squeeze=False).ravel()
+        
+    def _replot(self, name, num_steps, t, series):
+        """
+        Re-run of test `name` while the shared result figure still shows its
+        plots: move the new series into the cached lines and rescale
+        Returns False when the plots have to be built with _result_figure
+        """
+        self._wait_for_save()
+        cached = self._lines.get(name)
+        if cached is None or cached[0] != num_steps or not plt.fignum_exists(self._fig.number):
+            return False
+        for signal, line in cached[1].items():
+            line.set_data(t, series[signal])
+        for ax in self._fig.axes:
+            # relim only covers lines, the hlines collections keep their extent
+            ax.relim()
+            for collection in ax.collections:
+                ax.update_datalim(collection.get_datalim(ax.transData))
+            ax.autoscale_view()
+        return True
+        
+    def _save_result(self, filename):
+        """
+        Save the result figure to the results directory; unless interactive,
+        it is written in the background until the figure is used again
+        """
+        path = os.path.join(self._results_dir, filename)
+        if self.interactive:
+            self._fig.savefig(path, dpi=self.dpi)
+            plt.show()
+        else:
+            self._pending_save = self._saver.submit(self._fig.savefig, path, dpi=self.dpi)
+        
+    def _wait_for_save(self):
+        """Wait for the background savefig, if any; re-raises its errors"""
+        if self._pending_save is not None:
+            future, self._pending_save = self._pending_save, None
+            future.result()
+        
+    def cleanup(self):
+        """Close the shared result figure"""
+        self._wait_for_save()
+        if self._fig is not None:
+            plt.close(self._fig)
+            self._fig = None
+            self._lines.clear()
+        
     def run_speed_control_test(self):
         """Test speed control performance"""
         print("Running speed control test...")
@@ -37,82 +202,90 @@ class TestScenarios:
         self.motor.reset_state()
         self.foc_controller.reset()
         
-        # Test parameters
-        speed_ref_profile = []
-        time_points = []
-        speed_actual = []
-        torque_output = []
-        id_actual = []
-        iq_actual = []
-        
-        # Generate speed reference profile
+        # Test parameters, one preallocated log entry per step
         num_steps = int(self.test_duration / self.sample_time)
-        for i in range(num_steps):
-            t = i * self.sample_time
-            time_points.append(t)
-            
-            # Speed reference: step changes
-            if t < 0.5:
-                speed_ref = 0
-            elif t < 1.0:
-                speed_ref = 100 * 2 * np.pi / 60  # 100 RPM
-            elif t < 1.5:
-                speed_ref = 500 * 2 * np.pi / 60  # 500 RPM
-            else:
-                speed_ref = 1000 * 2 * np.pi / 60  # 1000 RPM
-                
-            speed_ref_profile.append(speed_ref)
-            
+        time_points = np.arange(num_steps) * self.sample_time
+        speed_actual = np.empty(num_steps)
+        torque_output = np.empty(num_steps)
+        id_actual = np.empty(num_steps)
+        iq_actual = np.empty(num_steps)
+        
+        # Speed reference profile: step changes to 100, 500 and 1000 RPM
+        speed_ref_profile = np.select(
+            [time_points < 0.5, time_points < 1.0, time_points < 1.5],
+            [0.0, 100 * _RPM2RADS, 500 * _RPM2RADS],
+            default=1000 * _RPM2RADS
+        )
+        
+        # Bind the per-step calls to locals and unpack their results once
+        motor = self.motor
+        get_currents = motor.get_three_phase_currents
+        foc_update = self.foc_controller.update
+        motor_update = motor.update
+        
+        for i, speed_ref in enumerate(speed_ref_profile.tolist()):
             # Get three-phase currents
-            ia, ib, ic = self.motor.get_three_phase_currents()
+            ia, ib, ic = get_currents()
             
             # FOC control
-            foc_results = self.foc_controller.update(
-                ia, ib, ic, speed_ref, self.motor.wr, self.motor.theta_e
+            _, _, _, id_a, iq_a, _, _, vd, vq = foc_update(
+                ia, ib, ic, speed_ref, motor.wr, motor.theta_e
             )
             
             # Update motor
-            motor_results = self.motor.update(
-                foc_results['vd'], foc_results['vq'], 0.0
-            )
+            _, _, _, _, Te, speed_rpm = motor_update(vd, vq, 0.0)
             
             # Store results
-            speed_actual.append(motor_results['speed_rpm'])
-            torque_output.append(motor_results['Te'])
-            id_actual.append(foc_results['id_actual'])
-            iq_actual.append(foc_results['iq_actual'])
-        
-        # Plot results
-        plt.figure(figsize=(12, 8))
-        
-        plt.subplot(3, 1, 1)
-        plt.plot(time_points, [s * 60 / (2 * np.pi) for s in speed_ref_profile], 'r--', label='Speed Reference')
-        plt.plot(time_points, speed_actual, 'b-', label='Actual Speed')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Speed (RPM)')
-        plt.title('Speed Control Test')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(3, 1, 2)
-        plt.plot(time_points, torque_output, 'g-')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Torque (N.m)')
-        plt.title('Electromagnetic Torque')
-        plt.grid(True)
-        
-        plt.subplot(3, 1, 3)
-        plt.plot(time_points, id_actual, 'b-', label='id')
-        plt.plot(time_points, iq_actual, 'r-', label='iq')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Current (A)')
-        plt.title('d-q Axis Currents')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.tight_layout()
-        plt.savefig('../tests/results/speed_control_test.png', dpi=150)
-        plt.show()
+            speed_actual[i] = speed_rpm
+            torque_output[i] = Te
+            id_actual[i] = id_a
+            iq_actual[i] = iq_a
+        
+        # Plot results, thinned to _PLOT_POINTS samples per trace
+        stride = max(1, num_steps // _PLOT_POINTS)
+        t = time_points[::stride]
+        series = {
+            'speed_ref': (speed_ref_profile * _RADS2RPM)[::stride],
+            'speed': speed_actual[::stride],
+            'torque': torque_output[::stride],
+            'id': id_actual[::stride],
+            'iq': iq_actual[::stride],
+        }
+        if not self._replot('speed_control', num_steps, t, series):
+            fig, axes = self._result_figure((12, 8), 3, 1)
+            lines = {}
+            
+            ax = axes[0]
+            ax.set_prop_cycle(color=['r', 'b'], linestyle=['--', '-'])
+            lines['speed_ref'], lines['speed'] = ax.plot(
+                t, np.column_stack([series['speed_ref'], series['speed']]),
+                label=['Speed Reference', 'Actual Speed'])
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Speed (RPM)')
+            ax.set_title('Speed Control Test')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[1]
+            lines['torque'], = ax.plot(t, series['torque'], 'g-')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Torque (N.m)')
+            ax.set_title('Electromagnetic Torque')
+            ax.grid(True)
+            
+            ax = axes[2]
+            ax.set_prop_cycle(color=['b', 'r'])
+            lines['id'], lines['iq'] = ax.plot(t, np.column_stack([series['id'], series['iq']]),
+                                               label=['id', 'iq'])
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Current (A)')
+            ax.set_title('d-q Axis Currents')
+            ax.legend()
+            ax.grid(True)
+            
+            fig.tight_layout()
+            self._lines['speed_control'] = (num_steps, lines)
+        self._save_result('speed_control_test.png')
         
         print("Speed control test completed. Results saved to tests/results/speed_control_test.png")
         
@@ -125,90 +298,105 @@ class TestScenarios:
         self.foc_controller.reset()
         self.flux_weakening.reset()
         
-        # Test parameters
-        time_points = []
-        speed_actual = []
-        id_actual = []
-        iq_actual = []
-        id_fw = []
-        voltage_magnitude = []
+        # Test parameters, one preallocated log entry per step
+        num_steps = int(self.test_duration / self.sample_time)
+        time_points = np.arange(num_steps) * self.sample_time
+        speed_actual = np.empty(num_steps)
+        id_actual = np.empty(num_steps)
+        iq_actual = np.empty(num_steps)
+        id_fw = np.empty(num_steps)
+        vd_log = np.empty(num_steps)
+        vq_log = np.empty(num_steps)
         
         # High speed test
-        num_steps = int(self.test_duration / self.sample_time)
-        speed_ref = 2000 * 2 * np.pi / 60  # 2000 RPM (above base speed)
+        speed_ref = 2000 * _RPM2RADS  # 2000 RPM (above base speed)
+        
+        # Bind the per-step calls to locals and unpack their results once
+        motor = self.motor
+        get_currents = motor.get_three_phase_currents
+        foc_update = self.foc_controller.update
+        fw_update = self.flux_weakening.update
+        motor_update = motor.update
         
         for i in range(num_steps):
-            t = i * self.sample_time
-            time_points.append(t)
-            
             # Get three-phase currents
-            ia, ib, ic = self.motor.get_three_phase_currents()
+            ia, ib, ic = get_currents()
             
             # FOC control
-            foc_results = self.foc_controller.update(
-                ia, ib, ic, speed_ref, self.motor.wr, self.motor.theta_e
+            wr = motor.wr
+            _, _, _, id_a, iq_a, _, iq_ref, vd, vq = foc_update(
+                ia, ib, ic, speed_ref, wr, motor.theta_e
             )
             
             # Apply flux weakening
-            id_fw_value = self.flux_weakening.update(
-                self.motor.wr, foc_results['vd'], foc_results['vq'],
-                foc_results['iq_ref'], 'voltage'
-            )
+            id_fw[i] = fw_update(wr, vd, vq, iq_ref, 'voltage')
             
             # Update motor with flux weakening
-            motor_results = self.motor.update(
-                foc_results['vd'], foc_results['vq'], 0.0
-            )
+            speed_actual[i] = motor_update(vd, vq, 0.0).speed_rpm
             
             # Store results
-            speed_actual.append(motor_results['speed_rpm'])
-            id_actual.append(foc_results['id_actual'])
-            iq_actual.append(foc_results['iq_actual'])
-            id_fw.append(id_fw_value)
-            voltage_magnitude.append(np.sqrt(foc_results['vd']**2 + foc_results['vq']**2))
-        
-        # Plot results
-        plt.figure(figsize=(12, 10))
-        
-        plt.subplot(4, 1, 1)
-        plt.plot(time_points, speed_actual, 'b-')
-        plt.axhline(y=speed_ref * 60 / (2 * np.pi), color='r', linestyle='--', label='Speed Reference')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Speed (RPM)')
-        plt.title('Flux Weakening Test - Speed')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(4, 1, 2)
-        plt.plot(time_points, id_actual, 'b-', label='id')
-        plt.plot(time_points, iq_actual, 'r-', label='iq')
-        plt.plot(time_points, id_fw, 'g--', label='id_fw')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Current (A)')
-        plt.title('d-q Axis Currents')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(4, 1, 3)
-        plt.plot(time_points, voltage_magnitude, 'g-')
-        v_max = self.motor.dc_bus_voltage / np.sqrt(3)
-        plt.axhline(y=v_max, color='r', linestyle='--', label='Voltage Limit')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Voltage (V)')
-        plt.title('Voltage Magnitude')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(4, 1, 4)
-        plt.plot(time_points, id_fw, 'g-')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Flux Weakening Current (A)')
-        plt.title('d-axis Flux Weakening Current')
-        plt.grid(True)
-        
-        plt.tight_layout()
-        plt.savefig('../tests/results/flux_weakening_test.png', dpi=150)
-        plt.show()
+            id_actual[i] = id_a
+            iq_actual[i] = iq_a
+            vd_log[i] = vd
+            vq_log[i] = vq
+        
+        voltage_magnitude = np.hypot(vd_log, vq_log)
+        
+        # Plot results, thinned to _PLOT_POINTS samples per trace
+        stride = max(1, num_steps // _PLOT_POINTS)
+        t = time_points[::stride]
+        series = {
+            'speed': speed_actual[::stride],
+            'id': id_actual[::stride],
+            'iq': iq_actual[::stride],
+            'id_fw': id_fw[::stride],
+            'voltage': voltage_magnitude[::stride],
+            'id_fw_current': id_fw[::stride],
+        }
+        if not self._replot('flux_weakening', num_steps, t, series):
+            fig, axes = self._result_figure((12, 10), 4, 1)
+            lines = {}
+            
+            ax = axes[0]
+            lines['speed'], = ax.plot(t, series['speed'], 'b-')
+            ax.axhline(y=speed_ref * _RADS2RPM, color='r', linestyle='--', label='Speed Reference')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Speed (RPM)')
+            ax.set_title('Flux Weakening Test - Speed')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[1]
+            ax.set_prop_cycle(color=['b', 'r', 'g'], linestyle=['-', '-', '--'])
+            lines['id'], lines['iq'], lines['id_fw'] = ax.plot(
+                t, np.column_stack([series['id'], series['iq'], series['id_fw']]),
+                label=['id', 'iq', 'id_fw'])
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Current (A)')
+            ax.set_title('d-q Axis Currents')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[2]
+            lines['voltage'], = ax.plot(t, series['voltage'], 'g-')
+            v_max = self.motor.dc_bus_voltage / np.sqrt(3)
+            ax.axhline(y=v_max, color='r', linestyle='--', label='Voltage Limit')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Voltage (V)')
+            ax.set_title('Voltage Magnitude')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[3]
+            lines['id_fw_current'], = ax.plot(t, series['id_fw_current'], 'g-')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Flux Weakening Current (A)')
+            ax.set_title('d-axis Flux Weakening Current')
+            ax.grid(True)
+            
+            fig.tight_layout()
+            self._lines['flux_weakening'] = (num_steps, lines)
+        self._save_result('flux_weakening_test.png')
         
         print("Flux weakening test completed. Results saved to tests/results/flux_weakening_test.png")
         
@@ -221,12 +409,13 @@ class TestScenarios:
         self.foc_controller.reset()
         self.param_identification.reset()
         
-        # Test parameters
-        time_points = []
-        rs_identified = []
-        ld_identified = []
-        lq_identified = []
-        flux_identified = []
+        # Test parameters, one preallocated log entry per step
+        num_steps = int(self.test_duration / self.sample_time)
+        time_points = np.arange(num_steps) * self.sample_time
+        rs_identified = np.empty(num_steps)
+        ld_identified = np.empty(num_steps)
+        lq_identified = np.empty(num_steps)
+        flux_identified = np.empty(num_steps)
         
         # Introduce parameter variations
         original_rs = self.motor.Rs
@@ -237,91 +426,105 @@ class TestScenarios:
         self.motor.flux_linkage *= 0.9  # 10% decrease in flux linkage
         
         # Parameter identification test
-        num_steps = int(self.test_duration / self.sample_time)
-        speed_ref = 500 * 2 * np.pi / 60  # 500 RPM
+        speed_ref = 500 * _RPM2RADS  # 500 RPM
+        
+        # Bind the per-step calls to locals and unpack their results once
+        motor = self.motor
+        get_currents = motor.get_three_phase_currents
+        foc_update = self.foc_controller.update
+        motor_update = motor.update
+        pid_update = self.param_identification.update
+        get_params = self.param_identification.get_identified_parameters
         
         for i in range(num_steps):
-            t = i * self.sample_time
-            time_points.append(t)
-            
             # Get three-phase currents
-            ia, ib, ic = self.motor.get_three_phase_currents()
+            ia, ib, ic = get_currents()
             
             # FOC control
-            foc_results = self.foc_controller.update(
-                ia, ib, ic, speed_ref, self.motor.wr, self.motor.theta_e
+            _, _, _, id_a, iq_a, _, _, vd, vq = foc_update(
+                ia, ib, ic, speed_ref, motor.wr, motor.theta_e
             )
             
             # Update motor
-            motor_results = self.motor.update(
-                foc_results['vd'], foc_results['vq'], 0.0
-            )
+            _, _, wr, _, Te, _ = motor_update(vd, vq, 0.0)
             
             # Parameter identification
-            self.param_identification.update(
-                foc_results['vd'], foc_results['id_actual'],
-                foc_results['vq'], foc_results['iq_actual'],
-                self.motor.wr, motor_results['Te'], 0.0
-            )
+            pid_update(vd, id_a, vq, iq_a, wr, Te, 0.0)
             
             # Get identified parameters
-            params = self.param_identification.get_identified_parameters()
-            rs_identified.append(params['Rs'])
-            ld_identified.append(params['Ld'])
-            lq_identified.append(params['Lq'])
-            flux_identified.append(params['flux_linkage'])
+            params = get_params()
+            rs_identified[i] = params['Rs']
+            ld_identified[i] = params['Ld']
+            lq_identified[i] = params['Lq']
+            flux_identified[i] = params['flux_linkage']
         
         # Restore original parameters
         self.motor.Rs = original_rs
         self.motor.flux_linkage = original_flux
         
-        # Plot results
-        plt.figure(figsize=(12, 8))
-        
-        plt.subplot(2, 2, 1)
-        plt.plot(time_points, rs_identified, 'b-')
-        plt.axhline(y=original_rs, color='r', linestyle='--', label='True Rs')
-        plt.axhline(y=self.motor.Rs, color='g', linestyle='--', label='Actual Rs')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Resistance (Ω)')
-        plt.title('Stator Resistance Identification')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(2, 2, 2)
-        plt.plot(time_points, ld_identified, 'b-', label='Ld')
-        plt.plot(time_points, lq_identified, 'r-', label='Lq')
-        plt.axhline(y=self.motor.Ld, color='b', linestyle='--', alpha=0.5)
-        plt.axhline(y=self.motor.Lq, color='r', linestyle='--', alpha=0.5)
-        plt.xlabel('Time (s)')
-        plt.ylabel('Inductance (H)')
-        plt.title('d-q Axis Inductance Identification')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(2, 2, 3)
-        plt.plot(time_points, flux_identified, 'g-')
-        plt.axhline(y=original_flux, color='r', linestyle='--', label='True Flux')
-        plt.axhline(y=self.motor.flux_linkage, color='g', linestyle='--', label='Actual Flux')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Flux Linkage (Wb)')
-        plt.title('Flux Linkage Identification')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(2, 2, 4)
-        plt.plot(time_points, np.array(rs_identified) / original_rs, 'b-', label='Rs Error')
-        plt.plot(time_points, np.array(flux_identified) / original_flux, 'g-', label='Flux Error')
-        plt.axhline(y=1.0, color='k', linestyle='--', alpha=0.5)
-        plt.xlabel('Time (s)')
-        plt.ylabel('Parameter Ratio')
-        plt.title('Parameter Identification Error')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.tight_layout()
-        plt.savefig('../tests/results/parameter_identification_test.png', dpi=150)
-        plt.show()
+        # Plot results, thinned to _PLOT_POINTS samples per trace
+        stride = max(1, num_steps // _PLOT_POINTS)
+        t = time_points[::stride]
+        series = {
+            'rs': rs_identified[::stride],
+            'ld': ld_identified[::stride],
+            'lq': lq_identified[::stride],
+            'flux': flux_identified[::stride],
+        }
+        # Parameter ratios, only over the plotted samples
+        series['rs_ratio'] = series['rs'] / original_rs
+        series['flux_ratio'] = series['flux'] / original_flux
+        if not self._replot('parameter_identification', num_steps, t, series):
+            fig, axes = self._result_figure((12, 8), 2, 2)
+            lines = {}
+            
+            ax = axes[0]
+            lines['rs'], = ax.plot(t, series['rs'], 'b-')
+            ax.axhline(y=original_rs, color='r', linestyle='--', label='True Rs')
+            ax.axhline(y=self.motor.Rs, color='g', linestyle='--', label='Actual Rs')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Resistance (Ω)')
+            ax.set_title('Stator Resistance Identification')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[1]
+            ax.set_prop_cycle(color=['b', 'r'])
+            lines['ld'], lines['lq'] = ax.plot(t, np.column_stack([series['ld'], series['lq']]),
+                                               label=['Ld', 'Lq'])
+            ax.hlines([self.motor.Ld, self.motor.Lq], time_points[0], time_points[-1],
+                      colors=['b', 'r'], linestyles='--', alpha=0.5)
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Inductance (H)')
+            ax.set_title('d-q Axis Inductance Identification')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[2]
+            lines['flux'], = ax.plot(t, series['flux'], 'g-')
+            ax.axhline(y=original_flux, color='r', linestyle='--', label='True Flux')
+            ax.axhline(y=self.motor.flux_linkage, color='g', linestyle='--', label='Actual Flux')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Flux Linkage (Wb)')
+            ax.set_title('Flux Linkage Identification')
+            ax.legend()
+            ax.grid(True)
+            
+            ax = axes[3]
+            ax.set_prop_cycle(color=['b', 'g'])
+            lines['rs_ratio'], lines['flux_ratio'] = ax.plot(
+                t, np.column_stack([series['rs_ratio'], series['flux_ratio']]),
+                label=['Rs Error', 'Flux Error'])
+            ax.axhline(y=1.0, color='k', linestyle='--', alpha=0.5)
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Parameter Ratio')
+            ax.set_title('Parameter Identification Error')
+            ax.legend()
+            ax.grid(True)
+            
+            fig.tight_layout()
+            self._lines['parameter_identification'] = (num_steps, lines)
+        self._save_result('parameter_identification_test.png')
         
         print("Parameter identification test completed. Results saved to tests/results/parameter_identification_test.png")
         
@@ -333,134 +536,122 @@ class TestScenarios:
         self.motor.reset_state()
         self.foc_controller.reset()
         self.disturbance_rejection.reset()
+        self.disturbance_rejection.set_control_mode('observer')
         
-        # Test parameters
-        time_points = []
-        speed_actual_no_dr = []
-        speed_actual_with_dr = []
-        load_torque = []
-        disturbance_estimate = []
+        # Test parameters, one preallocated log entry per step
+        num_steps = int(self.test_duration / self.sample_time)
+        time_points = np.arange(num_steps) * self.sample_time
+        speed_actual = np.empty(num_steps)
+        disturbance_estimate = np.empty(num_steps)
         
         # Speed reference
-        speed_ref = 1000 * 2 * np.pi / 60  # 1000 RPM
-        
-        # Test without disturbance rejection
-        num_steps = int(self.test_duration / self.sample_time)
-        for i in range(num_steps):
-            t = i * self.sample_time
-            time_points.append(t)
-            
-            # Apply load torque disturbance
-            if 0.5 < t < 1.5:
-                load = 5.0  # 5 N.m load
-            else:
-                load = 0.0
-                
-            load_torque.append(load)
-            
+        speed_ref = 1000 * _RPM2RADS  # 1000 RPM
+        
+        # Load torque disturbance: 5 N.m between 0.5 s and 1.5 s
+        load_torque = np.where((time_points > 0.5) & (time_points < 1.5), 5.0, 0.0)
+        
+        # The disturbance rejection output is only observed: FOCController.update
+        # offers no way to apply the modified references, so the motor runs on
+        # the plain FOC outputs
+        # Bind the per-step calls to locals and unpack their results once
+        motor = self.motor
+        get_currents = motor.get_three_phase_currents
+        foc_update = self.foc_controller.update
+        dr_update = self.disturbance_rejection.update
+        motor_update = motor.update
+        
+        for i, load in enumerate(load_torque.tolist()):
             # Get three-phase currents
-            ia, ib, ic = self.motor.get_three_phase_currents()
+            ia, ib, ic = get_currents()
             
-            # FOC control without disturbance rejection
-            foc_results = self.foc_controller.update(
-                ia, ib, ic, speed_ref, self.motor.wr, self.motor.theta_e
-            )
-            
-            # Update motor
-            motor_results = self.motor.update(
-                foc_results['vd'], foc_results['vq'], load
+            # FOC control
+            wr = motor.wr
+            _, _, _, id_a, iq_a, id_ref, iq_ref, vd, vq = foc_update(
+                ia, ib, ic, speed_ref, wr, motor.theta_e
             )
             
-            speed_actual_no_dr.append(motor_results['speed_rpm'])
-        
-        # Reset motor and test with disturbance rejection
-        self.motor.reset_state()
-        self.foc_controller.reset()
-        self.disturbance_rejection.reset()
-        self.disturbance_rejection.set_control_mode('observer')
-        
-        for i in range(num_steps):
-            t = i * self.sample_time
-            
-            # Apply same load torque disturbance
-            if 0.5 < t < 1.5:
-                load = 5.0  # 5 N.m load
-            else:
-                load = 0.0
+            # Apply disturbance rejection
+            dr_results = dr_update(motor.Te, wr, speed_ref, id_a, iq_a, id_ref, iq_ref)
             
-            # Get three-phase currents
-            ia, ib, ic = self.motor.get_three_phase_currents()
+            # Update motor
+            speed_actual[i] = motor_update(vd, vq, load).speed_rpm
+            disturbance_estimate[i] = dr_results['disturbance_estimate']
+        
+        # Plot results, thinned to _PLOT_POINTS samples per trace
+        stride = max(1, num_steps // _PLOT_POINTS)
+        t = time_points[::stride]
+        series = {
+            'speed': speed_actual[::stride],
+            'load': load_torque[::stride],
+            'disturbance': disturbance_estimate[::stride],
+        }
+        if not self._replot('disturbance_rejection', num_steps, t, series):
+            fig, axes = self._result_figure((12, 8), 3, 1)
+            lines = {}
             
-            # FOC control
-            foc_results = self.foc_controller.update(
-                ia, ib, ic, speed_ref, self.motor.wr, self.motor.theta_e
-            )
+            ax = axes[0]
+            ax.axhline(y=speed_ref * _RADS2RPM, color='k', linestyle='--', label='Speed Reference')
+            lines['speed'], = ax.plot(t, series['speed'], 'b-', label='Actual Speed (observer not applied)')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Speed (RPM)')
+            ax.set_title('Disturbance Rejection Test - Speed')
+            ax.legend()
+            ax.grid(True)
             
-            # Apply disturbance rejection
-            dr_results = self.disturbance_rejection.update(
-                self.motor.Te, self.motor.wr, speed_ref,
-                foc_results['id_actual'], foc_results['iq_actual'],
-                foc_results['id_ref'], foc_results['iq_ref']
-            )
+            ax = axes[1]
+            lines['load'], = ax.plot(t, series['load'], 'g-')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Load Torque (N.m)')
+            ax.set_title('Load Torque Disturbance')
+            ax.grid(True)
             
-            # Update motor with modified current references
-            # Note: In a real implementation, the controller would use the modified references
-            motor_results = self.motor.update(
-                foc_results['vd'], foc_results['vq'], load
-            )
+            ax = axes[2]
+            lines['disturbance'], = ax.plot(t, series['disturbance'], 'm-')
+            ax.set_xlabel('Time (s)')
+            ax.set_ylabel('Disturbance Estimate (N.m)')
+            ax.set_title('Disturbance Observer Output')
+            ax.grid(True)
             
-            speed_actual_with_dr.append(motor_results['speed_rpm'])
-            disturbance_estimate.append(dr_results['disturbance_estimate'])
-        
-        # Plot results
-        plt.figure(figsize=(12, 8))
-        
-        plt.subplot(3, 1, 1)
-        plt.plot(time_points, [speed_ref * 60 / (2 * np.pi)] * len(time_points), 'k--', label='Speed Reference')
-        plt.plot(time_points, speed_actual_no_dr, 'r-', label='Without Disturbance Rejection')
-        plt.plot(time_points, speed_actual_with_dr, 'b-', label='With Disturbance Rejection')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Speed (RPM)')
-        plt.title('Disturbance Rejection Test - Speed')
-        plt.legend()
-        plt.grid(True)
-        
-        plt.subplot(3, 1, 2)
-        plt.plot(time_points, load_torque, 'g-')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Load Torque (N.m)')
-        plt.title('Load Torque Disturbance')
-        plt.grid(True)
-        
-        plt.subplot(3, 1, 3)
-        plt.plot(time_points, disturbance_estimate, 'm-')
-        plt.xlabel('Time (s)')
-        plt.ylabel('Disturbance Estimate (N.m)')
-        plt.title('Disturbance Observer Output')
-        plt.grid(True)
-        
-        plt.tight_layout()
-        plt.savefig('../tests/results/disturbance_rejection_test.png', dpi=150)
-        plt.show()
+            fig.tight_layout()
+            self._lines['disturbance_rejection'] = (num_steps, lines)
+        self._save_result('disturbance_rejection_test.png')
         
         print("Disturbance rejection test completed. Results saved to tests/results/disturbance_rejection_test.png")
         
-    def run_all_tests(self):
-        """Run all test scenarios"""
-        # Create results directory
-        os.makedirs('../tests/results', exist_ok=True)
-        
+    def run_all_tests(self, parallel=None):
+        """
+        Run all test scenarios
+        parallel: run each test in a worker process, defaults to True unless
+        interactive
+        """
         print("Running all test scenarios...")
-        self.run_speed_control_test()
-        self.run_flux_weakening_test()
-        self.run_parameter_identification_test()
-        self.run_disturbance_rejection_test()
+        if parallel is None:
+            # Figures can only be shown from this process
+            parallel = not self.interactive
+        
+        if parallel:
+            # The tests share no state and save separate figures, so each runs
+            # in its own process; worker errors are re-raised by result()
+            with ProcessPoolExecutor(max_workers=len(self.TESTS)) as pool:
+                futures = [pool.submit(_run_test, name, self.test_duration, self.dpi)
+                           for name in self.TESTS]
+                for future in futures:
+                    future.result()
+        else:
+            for name in self.TESTS:
+                getattr(self, name)()
+            self._wait_for_save()
+        
+        print("Running controller checks...")
+        for check in _CHECKS:
+            check()
         print("All tests completed successfully!")
 
 
 if __name__ == "__main__":
-    # Create test scenarios
-    tests = TestScenarios()
+    # Create test scenarios, --show displays each result figure
+    tests = TestScenarios(interactive='--show' in sys.argv)
     
     # Run all tests
-    tests.run_all_tests()
\ No newline at end of file
+    tests.run_all_tests()
+    tests.cleanup()
\ No newline at end of file